@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A class-sized burst against a rate-limited mock, with and without admission control.
+
+``--learners`` sessions start together, as a class does when the teacher
+says "go". Each session makes one grading call (``ri_qualities``) and then
+one freeform chat stream (``roles_chat``). The mock answers 429 beyond
+``--limit`` requests per ``--window`` seconds, and the run is repeated:
+
+- ``direct``: ``LLMRouter`` alone (its retries and breaker, no admission);
+- ``admission``: the same router behind an ``AdmissionController`` set to
+  ``--headroom`` of the mock's limit (on the same shortened clock) and
+  ``--concurrency``. Requests reach the upstream with uneven delays, so
+  the limiter needs a little headroom below the real limit.
+
+Prints errors, 429s seen by the mock and latency percentiles for both call
+kinds. With admission, grading calls should get ahead of the chat streams,
+and no learner should see an error.
+
+    python -m benchmarks.admission_bench --learners 60 --limit 40 --window 5
+"""
+
+import argparse
+import threading
+import time
+
+from openai import OpenAI
+
+from core import admission
+from core.admission import AdmissionController
+from core.llm_router import LLMRouter, Provider
+from core.model_profiles import request_options
+from evaluation.mock_llm_server import MockLLMServer
+
+GRADE = [{"role": "user", "content": "Reply in JSON. Learner's qualities: patient, organised, caring."}]
+CHAT = [{"role": "user", "content": "How do I balance my shop and my children's school runs?"}]
+
+
+def percentile(values, pct: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else float("nan")
+
+
+def learner(router, sid: str, results: dict, lock: threading.Lock):
+    with admission.session(sid):
+        for kind, call_site, messages, stream in (("grade", "ri_qualities", GRADE, False),
+                                                  ("chat", "roles_chat", CHAT, True)):
+            started = time.perf_counter()
+            try:
+                response = router.create(messages=messages, stream=stream, call_site=call_site,
+                                         **request_options(call_site, "mock-model"))
+                if stream:
+                    for _ in response:
+                        pass
+                outcome = "ok"
+            except Exception as e:
+                outcome = type(e).__name__
+            with lock:
+                results[kind].append((time.perf_counter() - started, outcome))
+
+
+def run(mode: str, args) -> dict:
+    with MockLLMServer(latency=args.latency, token_delay=0.002, rate_limit=args.limit,
+                       rate_window=args.window) as server:
+        client = OpenAI(api_key="mock", base_url=server.base_url, max_retries=0)
+        controller = None
+        if mode == "admission":
+            controller = AdmissionController(rpm=args.limit * args.headroom, tpm=0, concurrency=args.concurrency,
+                                             timeout=args.timeout, period=args.window)
+        router = LLMRouter([Provider("openai", client)], hedging=False, admission=controller)
+        results = {"grade": [], "chat": []}
+        lock = threading.Lock()
+        threads = [threading.Thread(target=learner, args=(router, f"s{i}", results, lock))
+                   for i in range(args.learners)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        router.close()
+        return {"results": results, "wall": wall, "rejected": server.settings.rate_limited}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--learners", type=int, default=60)
+    parser.add_argument("--limit", type=int, default=40, help="mock requests per window")
+    parser.add_argument("--window", type=float, default=5.0, help="mock rate window, seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=60.0, help="admission timeout")
+    parser.add_argument("--headroom", type=float, default=0.9, help="fraction of the mock's limit to admit")
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'errors':>7} {'429s':>5} {'grade p50':>9} {'grade p95':>9} "
+          f"{'chat p50':>9} {'chat p95':>9} {'wall s':>7}")
+    for mode in ("direct", "admission"):
+        run_stats = run(mode, args)
+        results = run_stats["results"]
+        errors = sum(outcome != "ok" for calls in results.values() for _, outcome in calls)
+        grade = [seconds for seconds, outcome in results["grade"] if outcome == "ok"]
+        chat = [seconds for seconds, outcome in results["chat"] if outcome == "ok"]
+        print(f"{mode:>10} {errors:>7} {run_stats['rejected']:>5} {percentile(grade, 0.5):>9.2f} "
+              f"{percentile(grade, 0.95):>9.2f} {percentile(chat, 0.5):>9.2f} {percentile(chat, 0.95):>9.2f} "
+              f"{run_stats['wall']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Case lookups: precomputed ``CaseIndex`` vs a linear scan of the text.
+
+The scan keeps the cases whose text (lowercased once, up front) contains
+every query word, which is what a plain "find in corpus" does. The index
+answers through ``CaseIndex.lookup``. Both run over the corpus repeated ``--scale``
+times (each copy's names and citations made unique), to show how each one
+grows with the corpus. Prints the mean microseconds per query, the build
+time, and whether the index's top hit is among the scan's matches.
+
+    python -m benchmarks.case_index_bench --scale 1,10,100 --repeat 200
+"""
+
+import argparse
+import re
+import time
+
+from core.case_index import CaseIndex, parse_cases
+from core.retrieval import CORPUS_PATH
+
+QUERIES = [
+    "Raja Muhammad Owais",
+    "2022 SCMR 2123",
+    "PLD 2011 Lah 423",
+    "SC 2024 khula",
+    "LHC custody",
+    "inheritance daughters share",
+    "dower maintenance",
+    "Nadia Jabeen",
+]
+
+
+def scaled_corpus(text: str, scale: int) -> str:
+    """The corpus ``scale`` times; copy n > 0 gets " n" appended to names and citation numbers."""
+    copies = [text]
+    for n in range(1, scale):
+        copy = re.sub(r"^(\s*\*\s+[^(]+?) v\. ", lambda m: f"{m.group(1)} {n} v. ", text, flags=re.M)
+        copies.append(re.sub(r"\b(SCMR|CLC|MLD|Lah|SC|FSC|IHC) (\d+)\b", lambda m: f"{m.group(1)} {m.group(2)}{n}", copy))
+    return "\n\n".join(copies)
+
+
+def linear_scan(texts, query: str):
+    words = query.lower().split()
+    return [i for i, text in enumerate(texts) if all(word in text for word in words)]
+
+
+def mean_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            fn(query)
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="1,10,100", help="corpus copies to index")
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the query list")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        text = f.read()
+
+    print(f"{'copies':>6} {'cases':>6} {'build ms':>9} {'index us':>9} {'scan us':>9} {'agree':>6}")
+    for scale in (int(s) for s in args.scale.split(",")):
+        start = time.perf_counter()
+        index = CaseIndex(parse_cases(scaled_corpus(text, scale)))
+        build_ms = (time.perf_counter() - start) * 1000
+        texts = [f"{c.title} ({c.court} {c.year}, {', '.join(c.citations)}) {c.summary}".lower() for c in index.cases]
+
+        agree = 0
+        for query in QUERIES:
+            hits = index.lookup(query, k=1)
+            agree += bool(hits) and hits[0][0].id in linear_scan(texts, query)
+        index_us = mean_us(lambda q: index.lookup(q, k=5), args.repeat)
+        scan_us = mean_us(lambda q: linear_scan(texts, q), max(1, args.repeat // scale))
+        print(f"{scale:>6} {len(index.cases):>6} {build_ms:>9.1f} {index_us:>9.1f} {scan_us:>9.1f} "
+              f"{agree:>3}/{len(QUERIES)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rerun time of the Reflection tab as the transcript grows.
+
+Drives ``render_solutions`` (stage 6, no input, so no LLM call) with Streamlit's
+AppTest at 10, 100 and 1,000 messages, once with the windowed renderer and
+once with the old draw-everything loop, and prints the mean rerun time.
+
+    python -m benchmarks.chat_history_bench --runs 20
+"""
+
+import argparse
+import time
+
+from streamlit.testing.v1 import AppTest
+
+APP = '''
+import streamlit as st
+from core import chat_view
+from tabs import solutions
+
+MODE = {mode!r}
+N = {n}
+
+if "messages" not in st.session_state:
+    history = [{{"role": "system", "content": solutions.SYSTEM_PROMPT}}]
+    for i in range(N):
+        role = "user" if i % 2 else "assistant"
+        history.append({{"role": role, "content": f"Message {{i}}: " + "Balancing work and family takes practice. " * 4}})
+    st.session_state.messages = {{"Reflection": history}}
+    st.session_state.openai_model = "bench"
+    st.session_state.attribution_stage = 6
+
+# The pre-windowing renderer: every message, every rerun
+def display_all(tab_name):
+    for msg in st.session_state.messages[tab_name]:
+        if msg["role"] != "system":
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"])
+    return st.container()
+
+# tabs.solutions stays imported between AppTests, so set the renderer every time
+solutions.display_chat_history_solutions = display_all if MODE == "full" else chat_view.render_history
+
+solutions.render_solutions(client=None)
+'''
+
+
+def time_reruns(mode: str, n: int, runs: int) -> float:
+    at = AppTest.from_string(APP.format(mode=mode, n=n), default_timeout=60)
+    at.run()  # first run builds the session
+    start = time.perf_counter()
+    for _ in range(runs):
+        at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'windowed ms':>12} {'full ms':>9}")
+    for n in args.sizes:
+        windowed = time_reruns("windowed", n, args.runs)
+        full = time_reruns("full", n, args.runs)
+        print(f"{n:>9} {windowed:>12.1f} {full:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Event log: cost of ``emit`` on the rerun path, and a report over millions of events.
+
+1. Times ``event_log.emit``: the queue put a rerun pays per event. The
+   queued batches are written between the timed bursts.
+2. Writes ``--events`` synthetic lesson events (sessions walking a six-step
+   flow, with drop-off, off-topic turns, grades and LLM calls) into rotated,
+   gzipped JSONL segments in a temporary directory.
+3. Runs the streaming report over them and prints its time and the growth
+   in peak RSS, so memory can be checked against the size of the log.
+
+    python -m benchmarks.event_log_bench --events 1000000
+"""
+
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+
+from core import event_log
+
+STEPS = ("success", "attribution", "stable", "success_analysis", "failure", "freeform")
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def synthetic_events(total: int, seed: int = 7):
+    rng = random.Random(seed)
+    now = 1.7e9
+    count = 0
+    session = 0
+    while count < total:
+        session += 1
+        sid = f"{session:032x}"
+        yield {"t": now, "e": "stage", "s": sid, "flow": "reflection", "step": STEPS[0], "index": 0}
+        count += 1
+        for index, step in enumerate(STEPS):
+            now += rng.uniform(5, 60)
+            for _ in range(rng.randint(1, 3)):
+                label = "off_topic" if rng.random() < 0.15 else "answer"
+                ms = rng.lognormvariate(7, 0.5)
+                yield {"t": now, "e": "llm", "s": "", "call_site": step, "stage": f"reflection/{step}",
+                       "outcome": "ok" if rng.random() > 0.01 else "APITimeoutError", "ms": round(ms * 0.8, 1)}
+                turn = {"t": now, "e": "turn", "s": sid, "flow": "reflection", "step": step, "label": label,
+                        "ms": round(ms)}
+                if step in ("success", "failure"):
+                    turn["is_correct"] = rng.random() < 0.7
+                yield turn
+                count += 2
+                if label == "answer":
+                    break
+            if index + 1 == len(STEPS) or rng.random() < 0.12:
+                break  # the learner leaves
+            yield {"t": now, "e": "stage", "s": sid, "flow": "reflection", "step": STEPS[index + 1],
+                   "index": index + 1, "prev": step, "label": "answer"}
+            count += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--emits", type=int, default=50_000, help="emit calls to time")
+    parser.add_argument("--rotate-mb", type=float, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # 1. emit on the hot path; the writes happen between the timed bursts
+        event_log._writer = event_log.JSONLWriter(os.path.join(directory, "emit"))
+        event_log._writer_started = True
+        elapsed = 0.0
+        for burst in range(0, args.emits, 10_000):
+            started = time.perf_counter()
+            for i in range(burst, min(args.emits, burst + 10_000)):
+                event_log.emit("turn", "s", flow="reflection", step="success", label="answer", is_correct=True, ms=i)
+            elapsed += time.perf_counter() - started
+            event_log.flush()
+        per_emit = elapsed / args.emits * 1e6
+        print(f"emit: {per_emit:.2f} us per event ({event_log.stats()['dropped']} dropped)")
+
+        # 2. a large log
+        log_dir = os.path.join(directory, "log")
+        writer = event_log.JSONLWriter(log_dir, rotate_bytes=int(args.rotate_mb * 1024 * 1024))
+        started = time.perf_counter()
+        batch = []
+        for event in synthetic_events(args.events):
+            batch.append(event)
+            if len(batch) == 5000:
+                writer.write(batch)
+                batch = []
+        writer.write(batch)
+        writer.close()
+        size = sum(os.path.getsize(path) for path in event_log.segments(log_dir))
+        print(f"write: {args.events} events in {time.perf_counter() - started:.1f} s, "
+              f"{len(event_log.segments(log_dir))} segments, {size / 1e6:.1f} MB gzipped")
+
+        # 3. the streaming report
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        summary = event_log.build_report(log_dir).to_dict()
+        seconds = time.perf_counter() - started
+        print(f"report: {summary['events']} events, {summary['sessions']} sessions in {seconds:.1f} s "
+              f"({summary['events'] / seconds / 1e3:.0f}k events/s), peak RSS +{peak_rss_mb() - rss_before:.1f} MB")
+        for row in summary["flows"]["reflection"]:
+            print(f"  {row['step']:>16} sessions {row['sessions']:>6} stopped {row['stopped_here']:>6} "
+                  f"off-topic {row['off_topic_rate']} turn p95 {row['turn_p95_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
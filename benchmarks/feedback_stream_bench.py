@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time to first visible feedback: streamed JSON vs the blocking call.
+
+Runs the success-reflection and qualities grading calls against the local
+mock server (or a real endpoint with ``--base-url``), once with
+``stream=False`` + ``json.loads`` and once streamed through
+``FeedbackParser``, with the response cache off. Reports when the learner
+would first see feedback text and when the full result (with
+``is_correct``) was ready.
+
+    python -m benchmarks.feedback_stream_bench --latency 0.4 --token-delay 0.03
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+os.environ["ZARA_CACHE_DISABLED"] = "1"
+
+from core.json_stream import FeedbackStream  # noqa: E402
+from core.llm_clients import ClientRegistry  # noqa: E402
+from evaluation.mock_llm_server import MockLLMServer  # noqa: E402
+from tabs import identifying_stressors, solutions  # noqa: E402
+
+CALLS = {
+    "success_reflection": lambda client, model, stream: solutions.evaluate_with_prompt_solutions(
+        client, "I sold all my eid suits on time because I planned early", "success_reflection", model, stream
+    ),
+    "ri_qualities": lambda client, model, stream: identifying_stressors.evaluate_qualities(
+        client, "Mother, Businesswoman", "patience, planning, hard work", model, stream
+    ),
+}
+
+
+def run_blocking(call, client, model):
+    started = time.perf_counter()
+    result = call(client, model, None)
+    done = time.perf_counter() - started
+    return done, done, result
+
+
+def run_streamed(call, client, model):
+    stream = FeedbackStream()
+    holder = {}
+
+    def work():
+        try:
+            holder["result"] = call(client, model, stream)
+            holder["done"] = time.perf_counter()
+        finally:
+            stream.finish((holder.get("result") or {}).get("feedback"))
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=work)
+    thread.start()
+    first = None
+    for _ in stream.deltas():
+        if first is None:
+            first = time.perf_counter() - started
+    thread.join()
+    return first, holder["done"] - started, holder["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="real OpenAI-compatible endpoint instead of the mock")
+    parser.add_argument("--model", default="o4-mini-2025-04-16")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.4, help="mock time before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="mock delay per token")
+    args = parser.parse_args()
+
+    mock = None
+    if args.base_url:
+        base_url, api_key = args.base_url, os.getenv("OPENAI_API_KEY", "")
+    else:
+        mock = MockLLMServer(latency=args.latency, token_delay=args.token_delay).start()
+        base_url, api_key = mock.base_url, "mock-key"
+    registry = ClientRegistry(api_key, openai_base_url=base_url)
+
+    try:
+        print(f"{'call site':<20} {'mode':<9} {'first visible ms':>17} {'complete ms':>12}")
+        for name, call in CALLS.items():
+            for mode, runner in (("blocking", run_blocking), ("stream", run_streamed)):
+                firsts, totals = [], []
+                for _ in range(args.rounds):
+                    first, total, result = runner(call, registry.router, args.model)
+                    assert "is_correct" in result, result
+                    firsts.append(first * 1000)
+                    totals.append(total * 1000)
+                print(f"{name:<20} {mode:<9} {statistics.median(firsts):>17.0f} {statistics.median(totals):>12.0f}")
+    finally:
+        registry.close()
+        if mock:
+            mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless walk through the lesson flows, and per-rerun dispatch cost.
+
+First drives ``REFLECTION_FLOW`` and ``ROLES_FLOW`` end to end on plain
+dicts (no Streamlit server, stub evaluators) and checks the transcripts
+match the scripted order. Then times one rerun's flow work (enter the
+current step, look up its row) against the old ladder's "was the opening
+message already sent?" transcript scan, for growing transcripts.
+
+    python -m benchmarks.flow_bench
+"""
+
+import argparse
+import copy
+import time
+
+from core.intent_router import ANSWER, NO, OFF_TOPIC, YES
+from tabs import identifying_stressors as roles
+from tabs import solutions
+
+
+def _stub(flow, feedback="(feedback)"):
+    """Same flow with evaluators replaced by a constant reply."""
+    stubbed = copy.copy(flow)
+    stubbed.evaluators = {name: (lambda *args: {"feedback": feedback}) for name in flow.evaluators}
+    return stubbed
+
+
+def play(flow, inputs):
+    """Run ``(text, label)`` inputs through ``flow``; returns the session and transcript."""
+    session, messages = {}, []
+    flow.enter(session, messages)
+    for text, label in inputs:
+        step = flow.current(session)
+        flow.begin(session, messages, text)
+        evaluation = flow.evaluators[step.evaluate](None, text, None, flow.values(session)) if step.evaluate else None
+        flow.apply(session, messages, label, evaluation, open_ended_reply="(open-ended reply)")
+    return session, messages
+
+
+def check_flows():
+    flow = _stub(solutions.REFLECTION_FLOW)
+    session, messages = play(flow, [
+        ("I sold all my suits before eid", ANSWER),
+        ("what is the weather today", OFF_TOPIC),
+        ("my planning", ANSWER),
+        ("no", NO),
+        ("my patience", ANSWER),
+        ("the electricity went out", ANSWER),
+    ])
+    expected = [
+        solutions.msg_success_prompt, "I sold all my suits before eid", "(feedback)", solutions.msg_attribution_prompt,
+        "what is the weather today", "(open-ended reply)",
+        "my planning", solutions.msg_stable_internal_question,
+        "no", solutions.msg_rethink_prompt,
+        "my patience", "(feedback)", solutions.msg_failure_prompt,
+        "the electricity went out", "(feedback)", solutions.msg_final_encouragement,
+    ]
+    assert [m["content"] for m in messages] == expected, "reflection flow (rethink path) diverged"
+    assert flow.current(session).name == "freeform"
+
+    _, messages = play(flow, [("I planned early", ANSWER), ("planning", ANSWER), ("yes", YES)])
+    assert [m["content"] for m in messages][-3:] == [
+        "yes", solutions.msg_perfect_response, solutions.msg_failure_prompt,
+    ], "reflection flow (yes path) diverged"
+
+    flow = _stub(roles.ROLES_FLOW)
+    session, messages = play(flow, [("Mother, Businesswoman", ANSWER), ("patience, planning", ANSWER)])
+    assert [m["content"] for m in messages] == [
+        roles.msg_357, roles.msg_358, "Mother, Businesswoman", roles.msg_358A,
+        "patience, planning", "(feedback)", roles.msg_360,
+    ], "roles flow diverged"
+    assert session["ri_roles"] == "Mother, Businesswoman" and flow.current(session).name == "freeform"
+    print("flows: reflection and roles transcripts match the script")
+
+
+def time_per_rerun(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000", help="transcript lengths")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    check_flows()
+
+    flow = solutions.REFLECTION_FLOW
+    print(f"{'messages':>9} {'flow µs/rerun':>14} {'old scan µs/rerun':>18}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        # A long freeform transcript, the point where the old scan is most expensive
+        messages = [{"role": "assistant" if i % 2 else "user", "content": f"message {i}"} for i in range(size)]
+        session = {flow.stage_key: 0, flow.emitted_key: 1}
+
+        def rerun_flow():
+            flow.enter(session, messages)
+            flow.current(session)
+
+        def rerun_old():
+            any(m["content"] == solutions.msg_success_prompt for m in messages if m["role"] == "assistant")
+
+        rounds = max(5, args.rounds * 100 // max(size, 100))
+        print(f"{size:>9} {time_per_rerun(rerun_flow, args.rounds):>14.2f} {time_per_rerun(rerun_old, rounds):>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
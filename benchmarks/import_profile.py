@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cold-start import profile of the app, per phase and per module.
+
+Starts a fresh interpreter with ``-X importtime`` (``--runs`` times, medians
+reported) that imports ``main`` the way ``streamlit run`` does and then
+loads every registered tab in radio order, so each tab's row is what picking
+it adds on top of the startup. The last row is the LLM clients (openai,
+httpx), which ``main`` imports after the topic radio is drawn. For every phase it prints the wall time and
+the modules with the most import time of their own, grouped by top-level
+package (first-party modules are listed individually).
+
+``--budget-ms`` / ``--tab-budget-ms`` turn it into a gate: exit status 1
+when the startup or any tab goes over, so a new module that drags in a heavy
+dependency at startup shows up in CI.
+
+    python -m benchmarks.import_profile --runs 3 --top 8 --budget-ms 2500
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_PARTY = {"main", "core", "tabs", "evaluation", "benchmarks"}
+STARTUP = "startup (import main)"
+CLIENTS = "LLM clients (first render)"
+
+# Phase markers go to stderr, interleaved with -X importtime's own lines
+PROFILED = f'''
+import json, sys, time
+def mark(tag, name, seconds=0.0):
+    sys.stderr.write("@" + tag + " " + json.dumps([name, seconds]) + "\\n")
+mark("begin", {STARTUP!r})
+t = time.perf_counter()
+import main
+mark("end", {STARTUP!r}, time.perf_counter() - t)
+import tabs
+for label in tabs.labels():
+    mark("begin", "tab " + repr(label))
+    t = time.perf_counter()
+    tabs.load(label)
+    mark("end", "tab " + repr(label), time.perf_counter() - t)
+mark("begin", {CLIENTS!r})
+t = time.perf_counter()
+import core.llm_clients
+mark("end", {CLIENTS!r}, time.perf_counter() - t)
+'''
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def package_of(module: str) -> str:
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] in FIRST_PARTY else parts[0]
+
+
+def profile_once(python: str) -> dict:
+    """phase -> {"wall_ms", "modules", "self_ms": {package: ms}} for one cold start."""
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", PROFILED],
+        cwd=ROOT, env={**os.environ, "PYTHONPATH": ROOT}, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    phases = {}
+    current = None
+    for line in proc.stderr.splitlines():
+        if line.startswith("@"):
+            tag, payload = line[1:].split(" ", 1)
+            name, seconds = json.loads(payload)
+            if tag == "begin":
+                current = phases[name] = {"wall_ms": 0.0, "modules": 0, "self_ms": defaultdict(float)}
+            else:
+                phases[name]["wall_ms"] = seconds * 1000
+                current = None
+            continue
+        match = _LINE.match(line)
+        if match and current is not None:
+            current["modules"] += 1
+            current["self_ms"][package_of(match.group(4))] += int(match.group(1)) / 1000
+    return phases
+
+
+def merge(runs):
+    """Median of each figure across runs."""
+    merged = {}
+    for name in runs[0]:
+        packages = {package for run in runs for package in run[name]["self_ms"]}
+        merged[name] = {
+            "wall_ms": statistics.median(run[name]["wall_ms"] for run in runs),
+            "modules": statistics.median(run[name]["modules"] for run in runs),
+            "self_ms": {
+                package: statistics.median(run[name]["self_ms"].get(package, 0.0) for run in runs)
+                for package in packages
+            },
+        }
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold starts to take the median of")
+    parser.add_argument("--top", type=int, default=8, help="packages listed per phase")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--out", help="write the profile as JSON")
+    parser.add_argument("--budget-ms", type=float, help="fail if the startup takes longer")
+    parser.add_argument("--tab-budget-ms", type=float, help="fail if loading any tab takes longer")
+    args = parser.parse_args()
+
+    profile = merge([profile_once(args.python) for _ in range(args.runs)])
+
+    print(f"{'phase':<40} {'wall ms':>8} {'modules':>8}")
+    for name, phase in profile.items():
+        print(f"{name:<40} {phase['wall_ms']:>8.0f} {phase['modules']:>8.0f}")
+    for name, phase in profile.items():
+        print(f"\n{name}: self time by package")
+        ranked = sorted(phase["self_ms"].items(), key=lambda item: -item[1])
+        if not ranked:
+            print("  (no new imports)")
+        for package, ms in ranked[:args.top]:
+            print(f"  {package:<38} {ms:>8.1f} ms")
+        rest = sum(ms for _, ms in ranked[args.top:])
+        if rest:
+            print(f"  {f'({len(ranked) - args.top} more)':<38} {rest:>8.1f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+
+    failures = []
+    if args.budget_ms is not None and profile[STARTUP]["wall_ms"] > args.budget_ms:
+        failures.append(f"startup {profile[STARTUP]['wall_ms']:.0f} ms > {args.budget_ms:.0f} ms")
+    if args.tab_budget_ms is not None:
+        failures.extend(
+            f"{name} {phase['wall_ms']:.0f} ms > {args.tab_budget_ms:.0f} ms"
+            for name, phase in profile.items()
+            if name not in (STARTUP, CLIENTS) and phase["wall_ms"] > args.tab_budget_ms
+        )
+    for failure in failures:
+        print(f"over budget: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ingestion throughput: pages/sec and peak RSS of ``core.ingest`` by worker count.
+
+Generates ``--files`` text PDFs of ``--pages`` pages each (a minimal
+hand-written PDF, so no PDF writer library is needed) in a temporary
+directory. Each worker count then ingests them into a fresh copy of the
+corpus with an empty manifest. Each count runs in its own process so that
+peak RSS is per run.
+
+    python -m benchmarks.ingest_bench --files 8 --pages 120 --workers 1,2,4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from core.retrieval import CORPUS_PATH
+
+SENTENCES = [
+    "The petitioner seeks custody of the minor under the Guardians and Wards Act, 1890.",
+    "Maintenance of the wife and children is the duty of the husband under Muslim law.",
+    "The learned Family Court dissolved the marriage on the ground of khula.",
+    "The welfare of the minor is the paramount consideration in matters of custody.",
+    "Dower once fixed is a debt payable by the husband and cannot be withheld.",
+]
+
+
+def write_pdf(path: str, doc: int, pages: int):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = [f"Document {doc}, page {page}, paragraph {n}. {SENTENCES[(page + n) % len(SENTENCES)]}" for n in range(6)]
+        text = "BT /F1 10 Tf 50 750 Td 14 TL " + " ".join(f"({line}) ' ()'" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(text)} >>\nstream\n{text}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {pages} >>"
+
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def run(source: str, workers: int, scratch: str) -> dict:
+    corpus = os.path.join(scratch, f"corpus-{workers}.txt")
+    shutil.copy(CORPUS_PATH, corpus)
+    code = ("import json, sys; from core.ingest import ingest; "
+            f"print(json.dumps(ingest({source!r}, {corpus!r}, {workers}, "
+            f"manifest_path={os.path.join(scratch, f'manifest-{workers}.json')!r})))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=120, help="pages per PDF")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to compare")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        source = os.path.join(scratch, "judgments")
+        os.makedirs(source)
+        for doc in range(args.files):
+            write_pdf(os.path.join(source, f"judgment-{doc}.pdf"), doc, args.pages)
+
+        print(f"{'workers':>7} {'pages':>6} {'passages':>8} {'seconds':>8} {'pages/s':>8} {'rss MB':>7} {'worker MB':>9}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            s = run(source, workers, scratch)
+            print(f"{workers:>7} {s['pages']:>6} {s['passages']:>8} {s['seconds']:>8} {s['pages_per_second']:>8} "
+                  f"{s['peak_rss_mb']:>7} {s['peak_worker_rss_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
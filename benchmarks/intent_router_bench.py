@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy and latency of the local intent router on the labelled fixtures.
+
+Compares the router against the old keyword scan
+(``is_off_topic_question_solutions`` before the router) and reports how many
+inputs would still need an LLM call.
+
+    python -m benchmarks.intent_router_bench
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+from core.intent_router import ANSWER, EXPECT_YES_NO, NO, OFF_TOPIC, YES, route
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "evaluation", "intent_fixtures.jsonl")
+
+_OLD_KEYWORDS = [
+    "what is", "how to", "tell me about", "explain", "why", "when",
+    "stress management", "money management", "digital literacy", "branding",
+    "marriage", "politics", "religion", "weather", "food", "prayer", "namaz",
+    "health", "doctor", "medicine",
+]
+
+
+def old_route(text: str, expect: str) -> str:
+    """The pre-router behaviour: keyword scan, then ``"yes"/"haan" in text`` at stage 3."""
+    lower = text.lower()
+    if any(keyword in lower for keyword in _OLD_KEYWORDS):
+        return OFF_TOPIC
+    if expect == EXPECT_YES_NO:
+        return YES if ("yes" in lower or "haan" in lower) else NO
+    return ANSWER
+
+
+def load_fixtures(path: str = FIXTURES):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--rounds", type=int, default=200, help="timing repetitions per input")
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    correct = old_correct = llm_calls = 0
+    confusion = Counter()
+    timings = []
+
+    for item in fixtures:
+        result = route(item["text"], item["expect"])
+        confusion[(item["label"], result.label)] += 1
+        correct += result.label == item["label"]
+        llm_calls += result.needs_llm
+        old_correct += old_route(item["text"], item["expect"]) == item["label"]
+        if args.show_errors and result.label != item["label"]:
+            print(f"  expected {item['label']:<9} got {result.label:<9} {item['text']!r}")
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            route(item["text"], item["expect"])
+        timings.append((time.perf_counter() - start) / args.rounds * 1e6)
+
+    timings.sort()
+    n = len(fixtures)
+    print(f"fixtures            {n}")
+    print(f"router accuracy     {correct / n:.1%}")
+    print(f"old keyword scan    {old_correct / n:.1%}")
+    print(f"needs LLM           {llm_calls} ({llm_calls / n:.1%})")
+    print(f"latency p50         {timings[n // 2]:.1f} µs")
+    print(f"latency p99         {timings[min(n - 1, int(n * 0.99))]:.1f} µs")
+    print(f"latency max         {timings[-1]:.1f} µs")
+    print("confusion (expected -> routed):")
+    for (expected, got), count in sorted(confusion.items()):
+        print(f"  {expected:<9} -> {got:<9} {count}")
+
+
+if __name__ == "__main__":
+    main()
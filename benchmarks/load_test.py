@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-session load test: simulated learners through the real app.
+
+Each simulated learner is a Streamlit ``AppTest`` of ``main.py`` (its own
+session, sharing the process-wide clients, caches and job pool the way real
+sessions do) that walks the Reflection lesson from the first step to a
+freeform question, or the roles lesson from the role picker to a freeform
+question. All LLM calls go to a local mock (``evaluation.mock_llm_server``)
+with the configured latency and per-token delay; the response cache is off
+unless ``--cache`` is given.
+
+For each concurrency level the test reports rerun latency percentiles (one
+``AppTest.run``, i.e. one script rerun), turn latency (input to finished
+reply, including the reruns that poll the job pool), turns per second, peak
+process RSS per session and errors, and names the first level whose rerun
+p95 is ``--degrade-factor`` times the single-session p95.
+
+As a regression gate it exits with status 1 when any learner fails, when the
+top level's rerun p95 exceeds ``--max-p95-ms``, or when a level is more than
+``--tolerance`` times slower than in a ``--baseline`` written earlier with
+``--out``::
+
+    python -m benchmarks.load_test --levels 1 4 16 --out load.json
+    python -m benchmarks.load_test --levels 1 4 16 --baseline load.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "main.py")
+
+REFLECTION_SCRIPT = [
+    ("radio", "Reflection "),
+    ("chat", "I sold all my eid suits on time because I planned my week early"),
+    ("chat", "my planning and patience"),
+    ("chat", "no"),
+    ("chat", "my patience with difficult customers"),
+    ("chat", "the electricity went out for two days and I missed an order"),
+    ("chat", "How can I balance my stitching orders with the school run?"),
+]
+ROLES_SCRIPT = [
+    ("radio", "Identifying the right person"),
+    ("multiselect", ["Mother", "Businesswoman"]),
+    ("text", "patience, planning, hard work"),
+    ("chat", "How do I ask my sister-in-law for help with the children?"),
+]
+# lesson -> (inputs, tab name, stage key, final stage)
+SCRIPTS = {
+    "reflection": (REFLECTION_SCRIPT, "Reflection", "attribution_stage", 5),
+    "roles": (ROLES_SCRIPT, "Identifying the right person", "ri_stage", 2),
+}
+
+
+def rss_mb() -> float:
+    """Current resident set size (falls back to the peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def share_app_test_runtime():
+    """Let AppTests run in parallel threads.
+
+    ``AppTest.run`` installs a mock ``Runtime`` singleton for the length of a
+    run and clears it afterwards, which breaks any other session's run in
+    flight. Keep the first one installed for the whole load test instead
+    (it only carries in-memory managers). Every run also gets one shared
+    script cache, as on a real server, so ``main.py`` is compiled once
+    rather than in parallel threads. Secrets are set once for the process
+    rather than swapped per run.
+    """
+    import streamlit as st
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class _KeepInstance(type(Runtime)):
+        def __setattr__(cls, name, value):
+            if name != "_instance":
+                super().__setattr__(name, value)
+            elif value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    app_test.Runtime = _KeepInstance("SharedRuntime", (Runtime,), {})
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    st.secrets = Secrets()
+    st.secrets._secrets = {"GROQ_KEY": "load-test"}
+
+
+def percentile(values, pct: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else float("nan")
+
+
+# -----------------------------
+# One simulated learner
+# -----------------------------
+class Learner:
+    def __init__(self, lesson: str, poll: float, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.script, self.tab_name, self.stage_key, self.final_stage = SCRIPTS[lesson]
+        self.poll = poll
+        self.timeout = timeout
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.reruns = []
+        self.turns = []
+        self.error = None
+
+    def _run(self, element=None):
+        started = time.perf_counter()
+        (element.run() if element is not None else self.at.run())
+        self.reruns.append(time.perf_counter() - started)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+    def _pending(self) -> bool:
+        session = self.at.session_state
+        return "pending_turns" in session and bool(session["pending_turns"])
+
+    def _act(self, kind: str, value):
+        at = self.at
+        if kind == "radio":
+            self._run(at.radio[0].set_value(value))
+        elif kind == "multiselect":
+            self._run(at.multiselect[0].set_value(value))
+        elif kind == "text":
+            self._run(at.text_input[0].set_value(value))
+        else:
+            self._run(at.chat_input[0].set_value(value))
+
+    def _check(self):
+        """The lesson ended at its last step with Zara answering the freeform question."""
+        session = self.at.session_state
+        if session[self.stage_key] != self.final_stage:
+            raise AssertionError(f"{self.stage_key} is {session[self.stage_key]}, expected {self.final_stage}")
+        last = session["messages"][self.tab_name][-1]
+        if last["role"] != "assistant" or last["content"].startswith("⚠️"):
+            raise AssertionError(f"no reply to the freeform question: {last['content'][:80]!r}")
+
+    def play(self):
+        try:
+            self._run()
+            for kind, value in self.script:
+                started = time.perf_counter()
+                self._act(kind, value)
+                # The app's fragment reruns every poll interval until the jobs are done
+                deadline = started + self.timeout
+                while self._pending():
+                    if time.perf_counter() > deadline:
+                        raise TimeoutError(f"turn {value!r} still pending")
+                    time.sleep(self.poll)
+                    self._run()
+                if kind != "radio":
+                    self.turns.append(time.perf_counter() - started)
+            self._check()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+
+# -----------------------------
+# One concurrency level
+# -----------------------------
+def run_level(sessions: int, lessons, poll: float, timeout: float) -> dict:
+    gc.collect()
+    baseline_rss = rss_mb()
+    peak = [baseline_rss]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(0.05):
+            peak[0] = max(peak[0], rss_mb())
+
+    learners = [Learner(lessons[i % len(lessons)], poll, timeout) for i in range(sessions)]
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    threads = [threading.Thread(target=learner.play) for learner in learners]
+    sampler.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    peak[0] = max(peak[0], rss_mb())
+
+    reruns = [s * 1000 for learner in learners for s in learner.reruns]
+    turns = [s * 1000 for learner in learners for s in learner.turns]
+    errors = [learner.error for learner in learners if learner.error]
+    return {
+        "sessions": sessions,
+        "reruns": len(reruns),
+        "rerun_p50_ms": round(percentile(reruns, 0.5), 1),
+        "rerun_p95_ms": round(percentile(reruns, 0.95), 1),
+        "rerun_p99_ms": round(percentile(reruns, 0.99), 1),
+        "turn_p50_ms": round(statistics.median(turns), 1) if turns else None,
+        "turn_p95_ms": round(percentile(turns, 0.95), 1),
+        "turns_per_s": round(len(turns) / wall, 2),
+        "rss_per_session_mb": round((peak[0] - baseline_rss) / sessions, 2),
+        "errors": errors,
+    }
+
+
+def check_gate(results, args) -> list:
+    failures = []
+    for level in results:
+        if level["errors"]:
+            failures.append(f"{level['sessions']} sessions: {len(level['errors'])} failed ({level['errors'][0]})")
+    if args.max_p95_ms and results[-1]["rerun_p95_ms"] > args.max_p95_ms:
+        failures.append(f"rerun p95 {results[-1]['rerun_p95_ms']} ms > {args.max_p95_ms} ms")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {level["sessions"]: level for level in json.load(f)["levels"]}
+        for level in results:
+            before = baseline.get(level["sessions"])
+            if before and level["rerun_p95_ms"] > before["rerun_p95_ms"] * args.tolerance:
+                failures.append(
+                    f"{level['sessions']} sessions: rerun p95 {level['rerun_p95_ms']} ms vs "
+                    f"{before['rerun_p95_ms']} ms in the baseline"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="concurrent sessions")
+    parser.add_argument("--lessons", default="reflection,roles", help="lessons the learners alternate between")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock time before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="mock delay per token")
+    parser.add_argument("--no-stream", action="store_true", help="grade with blocking calls (ZARA_STREAM_FEEDBACK=0)")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on")
+    parser.add_argument("--poll", type=float, default=0.4, help="seconds between polling reruns")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per rerun and per turn")
+    parser.add_argument("--degrade-factor", type=float, default=2.0)
+    parser.add_argument("--out", help="write the results as JSON (a later --baseline)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed p95 slowdown vs the baseline")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if the top level's rerun p95 is above this")
+    args = parser.parse_args()
+
+    # Settings are read at import, so the app's modules must see them first
+    from evaluation.mock_llm_server import MockLLMServer
+
+    mock = MockLLMServer(latency=args.latency, token_delay=args.token_delay).start()
+    os.environ.update(
+        OPENAI_API_KEY="load-test",
+        OPENAI_BASE_URL=mock.base_url,
+        ZARA_GROQ_BASE_URL=mock.base_url,
+        ZARA_STREAM_FEEDBACK="0" if args.no_stream else "1",
+    )
+    if not args.cache:
+        os.environ["ZARA_CACHE_DISABLED"] = "1"
+    sys.path.insert(0, ROOT)
+    share_app_test_runtime()
+
+    lessons = args.lessons.split(",")
+    results = []
+    try:
+        # Imports, the client registry and the intent model are built on the first run
+        warmup = Learner(lessons[0], args.poll, args.timeout)
+        warmup.play()
+        if warmup.error:
+            sys.exit(f"warm-up learner failed: {warmup.error}")
+
+        print(f"{'sessions':>8} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'turn p50':>9} "
+              f"{'turn p95':>9} {'turns/s':>8} {'MB/sess':>8} {'errors':>7}")
+        for sessions in args.levels:
+            level = run_level(sessions, lessons, args.poll, args.timeout)
+            results.append(level)
+            print(f"{sessions:>8} {level['reruns']:>7} {level['rerun_p50_ms']:>8} {level['rerun_p95_ms']:>8} "
+                  f"{level['rerun_p99_ms']:>8} {level['turn_p50_ms']:>9} {level['turn_p95_ms']:>9} "
+                  f"{level['turns_per_s']:>8} {level['rss_per_session_mb']:>8} {len(level['errors']):>7}")
+    finally:
+        mock.stop()
+
+    reference = results[0]["rerun_p95_ms"]
+    degraded = next((level["sessions"] for level in results
+                     if level["rerun_p95_ms"] > reference * args.degrade_factor), None)
+    if degraded:
+        print(f"rerun p95 passes {args.degrade_factor}x the first level's at {degraded} sessions")
+    else:
+        print(f"rerun p95 stays under {args.degrade_factor}x the first level's up to {results[-1]['sessions']} sessions")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "levels": results, "degrades_at": degraded}, f, indent=2)
+
+    failures = check_gate(results, args)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
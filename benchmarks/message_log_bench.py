@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bytes per session: transcripts as lists of dicts vs ``MessageLog``.
+
+Builds ``--sessions`` transcripts of 10, 100 and 1,000 messages shaped like a
+Reflection session (system prompt, then scripted line / learner input /
+generated reply) and reports the memory they retain, measured with
+tracemalloc, per session. Two cases:
+
+- live: the scripted texts are the module constants, as in a session that
+  ran the lesson in this process;
+- restored: every text is decoded from the session store's JSON, so each
+  session holds its own copies of the system prompt and scripted lines
+  unless they are interned.
+
+Also times one ``build_context`` call on each representation.
+
+    python -m benchmarks.message_log_bench --sessions 50
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from core.context_builder import build_context
+from core.message_log import MessageLog
+from tabs import solutions
+
+SCRIPTED = sorted(solutions.SCRIPTED_MESSAGES_SOLUTIONS)
+
+
+def transcript(n: int, session: int):
+    messages = [{"role": "system", "content": solutions.SYSTEM_PROMPT}]
+    for i in range(n - 1):
+        if i % 3 == 0:
+            messages.append({"role": "assistant", "content": SCRIPTED[i // 3 % len(SCRIPTED)]})
+        elif i % 3 == 1:
+            messages.append({"role": "user", "content": f"Session {session}, turn {i}: I planned my stock early."})
+        else:
+            messages.append({"role": "assistant", "content": f"Session {session}, turn {i}: "
+                                                             + "That shows real planning. " * 6})
+    return messages
+
+
+def retained_bytes(build, sessions: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(s) for s in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / sessions
+
+
+def context_ms(history, runs: int = 20) -> float:
+    system = [{"role": "system", "content": "prompt"}]
+    start = time.perf_counter()
+    for _ in range(runs):
+        build_context(system, history, solutions.SCRIPTED_MESSAGES_SOLUTIONS)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="messages per transcript")
+    parser.add_argument("--sessions", type=int, default=50, help="transcripts built per measurement")
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'case':<9} {'list B/session':>15} {'log B/session':>14} {'saved':>6} "
+          f"{'ctx list ms':>12} {'ctx log ms':>11}")
+    for n in (int(size) for size in args.sizes.split(",")):
+        stored = [json.dumps(transcript(n, s)) for s in range(args.sessions)]
+        cases = {
+            "live": (lambda s: transcript(n, s), lambda s: MessageLog(transcript(n, s))),
+            "restored": (lambda s: json.loads(stored[s]), lambda s: MessageLog(json.loads(stored[s]))),
+        }
+        for case, (as_list, as_log) in cases.items():
+            list_bytes = retained_bytes(as_list, args.sessions)
+            log_bytes = retained_bytes(as_log, args.sessions)
+            print(f"{n:>8} {case:<9} {list_bytes:>15,.0f} {log_bytes:>14,.0f} {1 - log_bytes / list_bytes:>6.0%} "
+                  f"{context_ms(as_list(0)):>12.2f} {context_ms(as_log(0)):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A/B comparison of model profiles on recorded stage inputs.
+
+Replays the learner inputs in ``evaluation/intent_fixtures.jsonl`` through
+the grading and intent call sites once per profile (every replayed call site
+is pointed at that profile with ``model_profiles.assign``) and reports, side
+by side: latency, prompt / completion / reasoning tokens, estimated cost and
+how often the reply parsed into the JSON the call site needs.
+
+Runs against the local mock by default (which charges reasoning tokens per
+effort); pass ``--base-url`` for a real endpoint. Extra profiles to compare
+come from the ``ZARA_MODEL_PROFILES`` file.
+
+    python -m benchmarks.profile_bench --profiles default,grading,classify --limit 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["ZARA_CACHE_DISABLED"] = "1"
+
+from benchmarks.intent_router_bench import FIXTURES, load_fixtures  # noqa: E402
+from core import model_profiles  # noqa: E402
+from core.intent_router import EXPECT_YES_NO  # noqa: E402
+from core.llm_clients import ClientRegistry  # noqa: E402
+from evaluation.mock_llm_server import MockLLMServer  # noqa: E402
+from tabs.solutions import INTENT_CLASSIFIER_PROMPT, STAGE_PROMPTS_SOLUTIONS  # noqa: E402
+
+# USD per 1M tokens (input, output); reasoning tokens bill as output
+PRICES = {
+    "o4-mini": (1.10, 4.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+
+
+def price_for(model: str):
+    # Longest prefix, so dated snapshots ("o4-mini-2025-04-16") match
+    for name in sorted(PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return PRICES[name]
+    return None
+
+
+def build_cases(fixtures, limit: int):
+    """(call site, messages, key the JSON reply must have) for each replayed input."""
+    cases = []
+    for item in fixtures[:limit]:
+        text = item["text"]
+        expected = "a yes/no question" if item["expect"] == EXPECT_YES_NO else "for a personal story or cause"
+        cases.append(("intent", INTENT_CLASSIFIER_PROMPT.messages(expected=expected, user_input=text), "label"))
+        if item["expect"] != EXPECT_YES_NO:
+            for call_site in ("success_reflection", "attribution_analysis"):
+                cases.append((call_site, STAGE_PROMPTS_SOLUTIONS[call_site].messages(user_input=text), "feedback"))
+    return cases
+
+
+def run_case(client, model: str, case):
+    call_site, messages, required_key = case
+    options = model_profiles.request_options(call_site, model)
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(messages=messages, stream=False, call_site=call_site, **options)
+    except Exception:
+        return {"seconds": time.perf_counter() - started, "ok": False, "valid": False, "model": options["model"]}
+    seconds = time.perf_counter() - started
+    try:
+        valid = required_key in json.loads(response.choices[0].message.content.strip())
+    except (ValueError, TypeError, AttributeError):
+        valid = False
+    usage = response.usage.model_dump() if response.usage is not None else {}
+    details = usage.get("completion_tokens_details") or {}
+    return {
+        "seconds": seconds,
+        "ok": True,
+        "valid": valid,
+        "model": options["model"],
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "reasoning_tokens": details.get("reasoning_tokens") or 0,
+    }
+
+
+def summarize(results):
+    ok = [r for r in results if r["ok"]]
+    latencies = sorted(r["seconds"] * 1000 for r in ok)
+    cost = 0.0
+    for r in ok:
+        price = price_for(r["model"])
+        if price is None:
+            cost = float("nan")
+            break
+        cost += (r["prompt_tokens"] * price[0] + r["completion_tokens"] * price[1]) / 1e6
+    return {
+        "calls": len(results),
+        "p50_ms": statistics.median(latencies) if latencies else float("nan"),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else float("nan"),
+        "prompt": sum(r["prompt_tokens"] for r in ok),
+        "completion": sum(r["completion_tokens"] for r in ok),
+        "reasoning": sum(r["reasoning_tokens"] for r in ok),
+        "cost_per_1k": cost / len(results) * 1000 if results else float("nan"),
+        "json_valid": sum(r["valid"] for r in results) / len(results) if results else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="default,grading,classify", help="comma-separated profile names")
+    parser.add_argument("--base-url", help="real OpenAI-compatible endpoint instead of the mock")
+    parser.add_argument("--model", default="o4-mini-2025-04-16", help="session model (for profiles without one)")
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--limit", type=int, default=20, help="recorded inputs to replay")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock time before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="mock delay per (reasoning) token")
+    args = parser.parse_args()
+
+    mock = None
+    if args.base_url:
+        base_url, api_key = args.base_url, os.getenv("OPENAI_API_KEY", "")
+    else:
+        mock = MockLLMServer(latency=args.latency, token_delay=args.token_delay).start()
+        base_url, api_key = mock.base_url, "mock-key"
+    registry = ClientRegistry(api_key, openai_base_url=base_url)
+    cases = build_cases(load_fixtures(args.fixtures), args.limit)
+    call_sites = {call_site for call_site, _, _ in cases}
+
+    try:
+        print(f"{len(cases)} calls per profile over {', '.join(sorted(call_sites))}")
+        print(f"{'profile':<12} {'p50 ms':>8} {'p95 ms':>8} {'prompt':>8} {'output':>8} {'reason':>8} "
+              f"{'$/1k calls':>11} {'json ok':>8}")
+        for name in args.profiles.split(","):
+            for call_site in call_sites:
+                model_profiles.assign(call_site, name)
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                results = list(pool.map(lambda case: run_case(registry.router, args.model, case), cases))
+            s = summarize(results)
+            print(f"{name:<12} {s['p50_ms']:>8.0f} {s['p95_ms']:>8.0f} {s['prompt']:>8} {s['completion']:>8} "
+                  f"{s['reasoning']:>8} {s['cost_per_1k']:>11.3f} {s['json_valid']:>8.1%}")
+    finally:
+        registry.close()
+        if mock:
+            mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-provider router against two local mock servers with injected faults.
+
+Starts one mock as "openai" and one as "groq", then for each scenario sends
+the same concurrent load straight to the OpenAI mock (SDK retries off, as a
+baseline) and through ``LLMRouter`` (priority policy, so OpenAI stays the
+primary and hedging / failover are what make the difference):
+
+- ``tail``: 10% of OpenAI requests take 3 s (hedging after p95);
+- ``flaky``: 40% of OpenAI requests fail with 503 (retries + failover);
+- ``outage``: every OpenAI request fails (breaker opens, probes half-open).
+
+    python -m benchmarks.router_bench --requests 200 --concurrency 16
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from core.llm_router import LLMRouter, Provider
+from evaluation.mock_llm_server import MockLLMServer
+
+SCENARIOS = {
+    "tail": {"slow_rate": 0.1, "slow_latency": 3.0},
+    "flaky": {"fail_rate": 0.4},
+    "outage": {"fail_rate": 1.0},
+}
+MESSAGES = [{"role": "user", "content": "How do I balance my shop and my children's school runs?"}]
+
+
+def percentile(values, pct: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else float("nan")
+
+
+def run_load(create, requests: int, concurrency: int):
+    def one(_):
+        started = time.perf_counter()
+        try:
+            create(model="mock-model", messages=MESSAGES, stream=False, timeout=10)
+            return time.perf_counter() - started, True
+        except Exception:
+            return time.perf_counter() - started, False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    ok = [seconds for seconds, success in results if success]
+    return {
+        "success": len(ok) / requests,
+        "p50_ms": percentile(ok, 0.5) * 1000,
+        "p95_ms": percentile(ok, 0.95) * 1000,
+        "p99_ms": percentile(ok, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.15, help="normal mock latency (both providers)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    args = parser.parse_args()
+
+    print(f"{'scenario':<8} {'path':<7} {'success':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  providers")
+    for name in args.scenarios.split(","):
+        faults = SCENARIOS[name]
+        with MockLLMServer(latency=args.latency, token_delay=0, **faults) as openai_mock, \
+                MockLLMServer(latency=args.latency * 1.3, token_delay=0) as groq_mock:
+            direct = OpenAI(api_key="mock", base_url=openai_mock.base_url, max_retries=0)
+            router = LLMRouter(
+                [
+                    Provider("openai", OpenAI(api_key="mock", base_url=openai_mock.base_url, max_retries=0)),
+                    Provider("groq", OpenAI(api_key="mock", base_url=groq_mock.base_url, max_retries=0),
+                             model="llama-3.3-70b-versatile"),
+                ],
+                policy="priority",
+            )
+            for path, create in (("direct", direct.chat.completions.create), ("router", router.create)):
+                result = run_load(create, args.requests, args.concurrency)
+                providers = ""
+                if path == "router":
+                    providers = "  ".join(
+                        f"{p}: {s['requests']} req, {s['failures']} fail, {s['hedges']} hedged, "
+                        f"{s['backup_wins']} won by backup, breaker {s['breaker']}"
+                        for p, s in router.stats().items()
+                    )
+                print(f"{name:<8} {path:<7} {result['success']:>8.1%} {result['p50_ms']:>8.0f} "
+                      f"{result['p95_ms']:>8.0f} {result['p99_ms']:>8.0f}  {providers}")
+            router.close()
+
+
+if __name__ == "__main__":
+    main()
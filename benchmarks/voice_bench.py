@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-of-speech-to-text latency: incremental vs whole-utterance transcription.
+
+Plays synthetic utterances (bursts of shaped noise for words, short gaps
+inside a phrase, longer pauses between phrases, low background noise) into
+a ``VoiceSession`` in real time, 20 ms per frame, the way the WebRTC
+callback does. The transcriber is a ``StubTranscriber`` with a fixed
+per-request overhead plus a per-audio-second cost, to stand in for a cloud
+speech-to-text call. Reports, per mode, the latency from the last speech
+frame to the full text and from the end-of-utterance decision to the text.
+
+    python -m benchmarks.voice_bench --utterances 6 --overhead 0.3 --per-second 0.1
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from core.voice import FRAME_BYTES, FRAME_MS, SAMPLE_RATE, StubTranscriber, VoiceSession
+
+
+def synth_utterance(rng, phrases: int) -> bytes:
+    """``phrases`` phrases of 3-6 words, then a second of room noise."""
+    parts = []
+
+    def noise(ms, amplitude):
+        return rng.normal(0, amplitude, SAMPLE_RATE * ms // 1000)
+
+    for _ in range(phrases):
+        for _ in range(rng.integers(3, 7)):
+            n = SAMPLE_RATE * int(rng.integers(180, 400)) // 1000
+            envelope = np.sin(np.linspace(0, np.pi, n))
+            parts.append(rng.normal(0, 4000, n) * envelope)
+            parts.append(noise(int(rng.integers(40, 120)), 40))
+        parts.append(noise(int(rng.integers(350, 500)), 40))
+    parts.append(noise(1000, 40))
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16).tobytes()
+
+
+def play(session: VoiceSession, pcm: bytes):
+    """Feed ``pcm`` frame by frame at real-time pace."""
+    start = time.perf_counter()
+    for i, offset in enumerate(range(0, len(pcm), FRAME_BYTES)):
+        delay = start + i * FRAME_MS / 1000 - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        session.feed(pcm[offset:offset + FRAME_BYTES])
+
+
+def percentile(values, pct: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=6)
+    parser.add_argument("--phrases", type=int, default=3, help="phrases per utterance")
+    parser.add_argument("--overhead", type=float, default=0.3, help="stub seconds per request")
+    parser.add_argument("--per-second", type=float, default=0.1, help="stub seconds per audio second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    utterances = [synth_utterance(rng, args.phrases) for _ in range(args.utterances)]
+    seconds = sum(len(pcm) for pcm in utterances) / (2 * SAMPLE_RATE)
+    print(f"{args.utterances} utterances, {seconds:.1f} s of audio; stub: {args.overhead:.2f} s "
+          f"+ {args.per_second:.2f} s per audio second")
+    print(f"{'mode':<12} {'segments':>9} {'eos p50 ms':>11} {'eos p95 ms':>11} {'cut p50 ms':>11}")
+    for incremental in (False, True):
+        transcriber = StubTranscriber(overhead=args.overhead, seconds_per_audio_second=args.per_second)
+        session = VoiceSession(transcriber, incremental=incremental)
+        results = []
+        for pcm in utterances:
+            play(session, pcm)
+            deadline = time.perf_counter() + 30
+            while not session.ready() and time.perf_counter() < deadline:
+                time.sleep(0.005)
+            while (utterance := session.pop()) is not None:
+                results.append(utterance)
+        name = "incremental" if incremental else "whole"
+        print(f"{name:<12} {sum(u.segments for u in results) / max(1, len(results)):>9.1f} "
+              f"{percentile([u.latency * 1000 for u in results], 0.5):>11.0f} "
+              f"{percentile([u.latency * 1000 for u in results], 0.95):>11.0f} "
+              f"{percentile([u.detect_latency * 1000 for u in results], 0.5):>11.0f}"
+              + ("" if len(results) == len(utterances) else f"  ({len(results)}/{len(utterances)} cut)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared, process-wide services for the Zara app (LLM clients, caches, ...).
+
+The tab modules in ``tabs/`` hold the lesson content; everything that should
+be built once per Streamlit process and shared across sessions lives here.
+"""
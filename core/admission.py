@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide admission control for upstream LLM calls.
+
+Each session used to call the provider as soon as it had something to send,
+so when a whole class reached the same stage together the burst went past
+the account's rate limit, and every learner got an error reply. Now
+``LLMRouter.create`` (and the voice transcriber, ``core.voice``) asks this
+controller for a ticket before any request goes out. A call is admitted once all three limits allow it:
+
+- a requests-per-minute token bucket (``ZARA_LLM_RPM``);
+- a tokens-per-minute token bucket (``ZARA_LLM_TPM``). A call is charged
+  its estimated prompt tokens plus its output cap, the way the provider
+  counts it. The charge is corrected to the real usage when the call
+  finishes;
+- a bound on calls in flight (``ZARA_LLM_CONCURRENCY``). For a stream, the
+  bound holds until the stream ends.
+
+Waiting calls are ordered by priority: grading and classification calls
+first, then short replies and summaries, then freeform chat streams.
+Within one priority, sessions take turns (round robin), so one busy
+session cannot hold up the others. A call that waits longer than
+``ZARA_ADMISSION_TIMEOUT_SECONDS`` fails with ``AdmissionTimeout``. Any
+limit set to 0 is off.
+
+The session comes from a context variable set by ``main`` around the tab
+(``session(sid)``), and ``core.jobs.submit`` carries it into the job pool
+along with the telemetry stage. ``expected_wait`` is what the tabs show
+queued learners. Queue depth, waits and admissions are exported with the
+other metrics in ``core.telemetry``. The limits apply to one process:
+with several workers, split the account's limits between them, and keep
+them a little under the account's (requests reach the provider with
+uneven delays). Retries and hedges go out under their call's ticket.
+``benchmarks/admission_bench.py`` runs a class-sized burst against them.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from core import telemetry
+from core.model_profiles import profile_for
+
+RPM_LIMIT = float(os.getenv("ZARA_LLM_RPM", "500"))
+TPM_LIMIT = float(os.getenv("ZARA_LLM_TPM", "200000"))
+MAX_CONCURRENCY = int(os.getenv("ZARA_LLM_CONCURRENCY", "16"))
+ADMISSION_TIMEOUT = float(os.getenv("ZARA_ADMISSION_TIMEOUT_SECONDS", "60"))
+DEFAULT_OUTPUT_TOKENS = 1000   # charged when a call sets no output cap
+CHARS_PER_TOKEN = 4
+
+# Lower runs first: grades, labels and transcripts hold up a lesson step; chat streams are long
+HIGH, NORMAL, LOW = 0, 1, 2
+PROFILE_PRIORITY = {"grading": HIGH, "classify": HIGH, "transcription": HIGH, "quick_chat": NORMAL,
+                    "summary": NORMAL}
+
+_session = contextvars.ContextVar("zara_session", default="")
+
+
+class AdmissionTimeout(RuntimeError):
+    """A call waited longer than the admission timeout."""
+
+
+@contextmanager
+def session(sid: str):
+    """Queue the LLM calls made (or submitted to the job pool) inside the block as ``sid``'s."""
+    token = _session.set(sid or "")
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def current_session() -> str:
+    return _session.get()
+
+
+def priority_for(call_site: str, stream: bool = False) -> int:
+    if call_site:
+        return PROFILE_PRIORITY.get(profile_for(call_site).name, LOW if stream else NORMAL)
+    return LOW if stream else NORMAL
+
+
+def estimate_tokens(kwargs: dict) -> int:
+    """Prompt tokens (by characters) plus the output cap, as the provider's limiter charges it."""
+    chars = 0
+    for message in kwargs.get("messages") or ():
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        chars += len(content) if isinstance(content, str) else len(str(content or ""))
+    output = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or DEFAULT_OUTPUT_TOKENS
+    return chars // CHARS_PER_TOKEN + int(output)
+
+
+class TokenBucket:
+    """``limit`` units per ``period`` seconds, bursting up to one period's worth."""
+
+    def __init__(self, limit: float, period: float = 60.0):
+        self.rate = limit / period
+        self.capacity = limit
+        self.tokens = limit
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def deficit(self, amount: float) -> float:
+        """Seconds until ``amount`` is available (0 if it is now)."""
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        # Negative when the call used more than was charged; the bucket may go into debt
+        self.tokens = max(-self.capacity, min(self.capacity, self.tokens + amount))
+
+
+class Ticket:
+    __slots__ = ("session", "priority", "tokens", "enqueued", "admitted_at", "released")
+
+    def __init__(self, session_id: str, priority: int, tokens: int):
+        self.session = session_id
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.admitted_at = None
+        self.released = False
+
+
+class AdmissionController:
+    """Token buckets, a concurrency bound and a fair priority queue, shared by every session."""
+
+    def __init__(self, rpm: float = RPM_LIMIT, tpm: float = TPM_LIMIT, concurrency: int = MAX_CONCURRENCY,
+                 timeout: float = ADMISSION_TIMEOUT, period: float = 60.0):
+        # ``period`` other than a minute only serves benchmarks run on a shorter clock
+        self.requests = TokenBucket(rpm, period) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, period) if tpm > 0 else None
+        self.concurrency = concurrency if concurrency > 0 else None
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        # priority -> session -> waiting tickets; a session moves to the back after each admission
+        self._queues = {p: OrderedDict() for p in (HIGH, NORMAL, LOW)}
+        self._waiting = 0
+        self._in_flight = 0
+        self._hold = 1.0    # EWMA seconds a call holds its slot, for wait estimates
+        self._wait = 0.0    # EWMA seconds of admission wait
+        self.counters = {"admitted": 0, "queued": 0, "timeouts": 0}
+
+    # -- queue --
+    def _head(self):
+        for priority, sessions in self._queues.items():
+            if sessions:
+                return priority, next(iter(sessions))
+        return None
+
+    def _pop(self, priority: int, session_id: str) -> Ticket:
+        sessions = self._queues[priority]
+        tickets = sessions.pop(session_id)
+        ticket = tickets.popleft()
+        if tickets:
+            sessions[session_id] = tickets  # back of the round
+        return ticket
+
+    def _remove(self, ticket: Ticket):
+        tickets = self._queues[ticket.priority].get(ticket.session)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._queues[ticket.priority][ticket.session]
+            self._waiting -= 1
+
+    def _dispatch(self) -> float:
+        """Admit the queue heads while the limits allow; seconds until the next may fit (0: none waiting)."""
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.refill(now)
+        while self.concurrency is None or self._in_flight < self.concurrency:
+            head = self._head()
+            if head is None:
+                return 0.0
+            ticket = self._queues[head[0]][head[1]][0]
+            delay = max(self.requests.deficit(1) if self.requests else 0.0,
+                        self.tokens.deficit(ticket.tokens) if self.tokens else 0.0)
+            if delay > 0:
+                return delay
+            self._pop(*head)
+            self._waiting -= 1
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(ticket.tokens)
+            self._in_flight += 1
+            ticket.admitted_at = now
+            self._cond.notify_all()
+        return 0.0
+
+    def _publish(self):
+        for priority, sessions in self._queues.items():
+            depth = sum(len(tickets) for tickets in sessions.values())
+            telemetry.set_gauge("zara_admission_queue_depth", (("priority", str(priority)),), depth)
+        telemetry.set_gauge("zara_admission_in_flight", (), self._in_flight)
+
+    # -- calls --
+    def admit(self, call_site: str = None, kwargs: dict = None) -> Ticket:
+        """Block until the call may go out; the caller must ``release`` the ticket."""
+        kwargs = kwargs or {}
+        ticket = Ticket(current_session(), priority_for(call_site, bool(kwargs.get("stream"))),
+                        estimate_tokens(kwargs))
+        deadline = ticket.enqueued + self.timeout
+        with self._cond:
+            self._queues[ticket.priority].setdefault(ticket.session, deque()).append(ticket)
+            self._waiting += 1
+            delay = self._dispatch()
+            if ticket.admitted_at is None:
+                self.counters["queued"] += 1
+                self._publish()
+            while ticket.admitted_at is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self.counters["timeouts"] += 1
+                    self._publish()
+                    telemetry.inc("zara_admission_timeouts_total", (("priority", str(ticket.priority)),))
+                    raise AdmissionTimeout("Zara is very busy right now; please send your message again in a minute.")
+                # Woken by a release, or when the buckets should have refilled enough
+                self._cond.wait(min(remaining, delay) if delay > 0 else remaining)
+                delay = self._dispatch()
+            waited = ticket.admitted_at - ticket.enqueued
+            self._wait += 0.2 * (waited - self._wait)
+            self.counters["admitted"] += 1
+            self._publish()
+        labels = (("priority", str(ticket.priority)),)
+        telemetry.inc("zara_admission_admitted_total", labels)
+        telemetry.observe("zara_admission_wait_seconds", labels, waited)
+        return ticket
+
+    def release(self, ticket: Ticket, usage=None):
+        """Free the ticket's slot and correct its token charge to ``usage`` (if known)."""
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._in_flight -= 1
+            self._hold += 0.2 * (time.monotonic() - ticket.admitted_at - self._hold)
+            if self.tokens is not None and usage is not None:
+                used = getattr(usage, "total_tokens", None)
+                if used is None and isinstance(usage, dict):
+                    used = usage.get("total_tokens")
+                if used:
+                    self.tokens.give_back(ticket.tokens - used)
+            self._dispatch()
+            self._publish()
+            self._cond.notify_all()
+
+    def expected_wait(self, session_id: str = None, priority: int = LOW) -> float:
+        """Seconds until ``session_id``'s first waiting call (or a new call at ``priority``) is admitted."""
+        with self._cond:
+            ahead, tokens, own = 0, 0, None
+            for level, sessions in self._queues.items():
+                for sid, tickets in sessions.items():
+                    if own is None and session_id and sid == session_id:
+                        own = level
+                        tokens += tickets[0].tokens
+                        break
+                    ahead += 1
+                    tokens += tickets[0].tokens
+                if own is not None or level >= priority:
+                    break
+            if own is None:
+                tokens += estimate_tokens({})
+            waits = [0.0]
+            if self.concurrency is not None:
+                free = self.concurrency - self._in_flight
+                if ahead >= free:
+                    waits.append(((ahead - free) // self.concurrency + 1) * self._hold)
+            if self.requests is not None:
+                waits.append(self.requests.deficit(ahead + 1) if ahead + 1 <= self.requests.capacity
+                             else (ahead + 1) / self.requests.rate)
+            if self.tokens is not None:
+                waits.append(self.tokens.deficit(tokens))
+            return max(waits)
+
+    def queued(self, session_id: str) -> bool:
+        with self._cond:
+            return any(session_id in sessions for sessions in self._queues.values())
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "concurrency": self.concurrency,
+                "waiting": {str(p): sum(len(t) for t in s.values()) for p, s in self._queues.items()},
+                "sessions_waiting": len({sid for s in self._queues.values() for sid in s}),
+                "rpm_available": None if self.requests is None else round(self.requests.tokens, 1),
+                "tpm_available": None if self.tokens is None else round(self.tokens.tokens),
+                "wait_ewma_ms": round(self._wait * 1000, 1),
+                "hold_ewma_ms": round(self._hold * 1000, 1),
+                **self.counters,
+            }
+
+
+# -----------------------------
+# Process-wide instance
+# -----------------------------
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
+
+
+def wait_message(session_id: str = None, priority: int = LOW):
+    """A line for learners whose call is (or would be) queued, or None when there is no wait to speak of."""
+    controller = get_admission_controller()
+    if session_id and not controller.queued(session_id):
+        return None
+    seconds = controller.expected_wait(session_id, priority)
+    if seconds < 1:
+        return None
+    return f"Many learners are online right now; Zara will reply in about {seconds:.0f} s."
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Structured index over the family-law case corpus (data/RAGdata.txt).
+
+Each bullet of the corpus is one judgment::
+
+    * Raja Muhammad Owais v. Mst. Nadia Jabeen (SC 2022, 2022 SCMR 2123) – The Supreme Court ...
+
+``parse_cases`` turns the chunks of ``core.retrieval.chunk_corpus`` into
+typed ``Case`` records (parties, court, year, citations, category). The
+``CaseIndex`` built from them is precomputed once per process:
+
+- a hash index from normalized case names, party names and citations
+  ("raja muhammad owais", "2022 scmr 2123") to cases;
+- court / year / category facets (sets of case ids);
+- a BM25 inverted index whose per-term weights are computed at build time,
+  so scoring a query is a sum over its terms' posting lists.
+
+``lookup`` answers a query like "Raja Muhammad Owais", "PLD 2011 Lah 423" or
+"SC 2024 khula" in microseconds, without the embedding model; the court
+codes and years in a query become facet filters and the remaining words
+are ranked by BM25. ``benchmarks/case_index_bench.py`` compares it with a
+linear scan of the text.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from core.retrieval import CORPUS_PATH, chunk_corpus
+
+# "Name v. Name (SC 2022, 2022 SCMR 2123) – summary"; the dash is an en dash in the corpus
+_HEADER = re.compile(r"^(?P<title>.+?)\s+\((?P<court>[A-Z]{2,4})\s+(?P<year>\d{4})(?P<rest>[^)]*)\)\s*[–-]\s*(?P<summary>.*)$")
+# Law-report citations: PLD 2011 Lah 423, 2022 SCMR 2123, 2024 CLC 979, ...
+_CITATION = re.compile(r"\b(?:PLD\s+\d{4}\s+[A-Z][A-Za-z]*\s+\d+|\d{4}\s+(?:SCMR|CLC|MLD|YLR|PLC|CLD|PCr\.?LJ)\s+\d+)\b")
+_PARTIES = re.compile(r"\s+v(?:s)?\.?\s+")
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Party names made of these ("The State", "Federation of Pakistan") name no particular case
+_GENERIC_PARTY = frozenset("state government federation pakistan council judge court sho police another others".split())
+_STOPWORDS = frozenset("a an and or the of in on to for by with is was that this it as at be etc v vs mst".split())
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class Case(NamedTuple):
+    id: int
+    title: str          # "Raja Muhammad Owais v. Mst. Nadia Jabeen"
+    parties: tuple      # ("Raja Muhammad Owais", "Mst. Nadia Jabeen")
+    court: str          # "SC", "LHC", "FSC", ...
+    year: int
+    citations: tuple    # law-report citations and petition numbers
+    category: str
+    summary: str
+    chunk_id: int       # the same bullet's id in ``core.retrieval.chunk_corpus``
+
+
+def normalize(text: str) -> str:
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+def tokenize(text: str):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def parse_cases(text: str) -> list:
+    """Typed records for the corpus bullets that follow the case-header pattern."""
+    cases = []
+    for chunk in chunk_corpus(text):
+        match = _HEADER.match(chunk.text)
+        if match is None:
+            continue  # free-standing notes, not judgments
+        rest = match["rest"].lstrip(",; ").strip()
+        citations = _CITATION.findall(rest + " " + match["summary"])
+        if rest and not _CITATION.fullmatch(rest) and not rest.startswith("appeal"):
+            citations.insert(0, rest)  # petition numbers: "C.P. 1418/2023"
+        cases.append(Case(
+            id=len(cases),
+            title=match["title"],
+            parties=tuple(part.strip(" ,") for part in _PARTIES.split(match["title"])),
+            court=match["court"],
+            year=int(match["year"]),
+            citations=tuple(dict.fromkeys(citations)),
+            category=chunk.category,
+            summary=match["summary"],
+            chunk_id=chunk.id,
+        ))
+    return cases
+
+
+class CaseIndex:
+    """Hash, facet and BM25 indexes over parsed cases; all lookups are dict / set operations."""
+
+    def __init__(self, cases):
+        self.cases = cases
+        self.exact = defaultdict(list)       # normalized name / party / citation -> case ids
+        self.courts = defaultdict(set)
+        self.years = defaultdict(set)
+        self.categories = defaultdict(set)   # normalized category -> case ids
+        self.postings = {}                   # term -> [(case id, BM25 weight)]
+        self._mention_keys = set()           # exact keys specific enough to spot inside a sentence
+
+        documents = []
+        for case in cases:
+            for key in map(normalize, (case.title, *case.parties, *case.citations)):
+                # "Mst." is an honorific; "Nadia Jabeen" should hit as well
+                for variant in {key, key[4:] if key.startswith("mst ") else key}:
+                    if case.id not in self.exact[variant]:
+                        self.exact[variant].append(case.id)
+                    words = variant.split()
+                    if len(words) >= 2 and not _GENERIC_PARTY.intersection(words):
+                        self._mention_keys.add(variant)
+            self.courts[case.court].add(case.id)
+            self.years[case.year].add(case.id)
+            self.categories[normalize(case.category)].add(case.id)
+            documents.append(Counter(tokenize(" ".join((case.title, " ".join(case.citations), case.summary)))))
+
+        average = sum(sum(doc.values()) for doc in documents) / max(1, len(documents))
+        frequency = Counter(term for doc in documents for term in doc)
+        for case_id, doc in enumerate(documents):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(doc.values()) / average)
+            for term, tf in doc.items():
+                idf = math.log(1 + (len(documents) - frequency[term] + 0.5) / (frequency[term] + 0.5))
+                weight = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                self.postings.setdefault(term, []).append((case_id, weight))
+
+    @classmethod
+    def from_corpus(cls, path: str = CORPUS_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(parse_cases(f.read()))
+
+    def search(self, query: str, k: int = 5, court: str = None, year: int = None, category: str = None):
+        """Up to ``k`` ``(case, score)`` pairs by BM25, within the given facets."""
+        return self._rank(tokenize(query), self._facets(court and [court], year and [year], category), k)
+
+    def lookup(self, query: str, k: int = 5):
+        """Resolve a free query: exact name / citation first, else facets from the query plus BM25."""
+        key = normalize(query)
+        if key in self.exact:
+            return [(self.cases[case_id], math.inf) for case_id in self.exact[key]][:k]
+
+        courts, years, words = [], [], []
+        for token in query.split():
+            bare = token.strip(",.;()")
+            if bare.upper() in self.courts:
+                courts.append(bare.upper())
+            elif bare.isdigit() and int(bare) in self.years:
+                years.append(int(bare))
+            else:
+                words.append(bare)
+        allowed = self._facets(courts, years, None)
+        if not words:
+            # Facets only ("LHC 2014"): newest first
+            ids = sorted(allowed if allowed is not None else (), key=lambda i: (-self.cases[i].year, i))
+            return [(self.cases[case_id], 0.0) for case_id in ids[:k]]
+        return self._rank(tokenize(" ".join(words)), allowed, k)
+
+    def mentions(self, text: str):
+        """Cases named or cited anywhere in ``text`` (a chat message), in corpus order."""
+        padded = f" {normalize(text)} "
+        found = set()
+        for citation in _CITATION.findall(text):
+            found.update(self.exact.get(normalize(citation), ()))
+        for key in self._mention_keys:
+            if f" {key} " in padded:
+                found.update(self.exact[key])
+        return [self.cases[case_id] for case_id in sorted(found)]
+
+    def _rank(self, terms, allowed, k: int):
+        scores = defaultdict(float)
+        for term in terms:
+            for case_id, weight in self.postings.get(term, ()):
+                if allowed is None or case_id in allowed:
+                    scores[case_id] += weight
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(self.cases[case_id], score) for case_id, score in ranked]
+
+    def _facets(self, courts, years, category):
+        allowed = None
+        for values, facet in ((courts, self.courts), (years, self.years)):
+            if values:
+                ids = set().union(*(facet.get(value, set()) for value in values))
+                allowed = ids if allowed is None else allowed & ids
+        if category:
+            ids = self.categories.get(normalize(category), set())
+            allowed = ids if allowed is None else allowed & ids
+        return allowed
+
+    def stats(self) -> dict:
+        return {
+            "cases": len(self.cases),
+            "terms": len(self.postings),
+            "exact_keys": len(self.exact),
+            "courts": {court: len(ids) for court, ids in sorted(self.courts.items())},
+        }
+
+
+# -----------------------------
+# Process-wide instance
+# -----------------------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_case_index() -> CaseIndex:
+    """Parse and index the corpus on first use; every session shares the result."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CaseIndex.from_corpus(CORPUS_PATH)
+    return _index
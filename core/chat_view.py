@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Windowed, incremental chat transcript rendering.
+
+Every rerun used to redraw the whole transcript, sometimes two or three
+times. ``render_history`` now draws only the most recent window of messages
+(with a "load earlier" button for the rest) into one container, and
+``render_new`` appends just the messages added since, into that same
+container, instead of redrawing everything. Per-rerun cost depends on the
+window size, not on how long the session has been running.
+
+"Incremental" holds within one run only. A full rerun re-executes the
+script, and Streamlit drops every element the run does not emit again, so
+there is no slot (``st.empty`` or container) that keeps its messages from
+one run to the next: each full rerun still draws up to ``HISTORY_WINDOW``
+messages. Fragment reruns (the "Zara is typing…" poll in ``core.jobs``) do
+not touch the transcript. Lower ``ZARA_HISTORY_WINDOW`` to cut the cost of
+a full rerun further.
+"""
+
+import os
+
+import streamlit as st
+
+HISTORY_WINDOW = int(os.getenv("ZARA_HISTORY_WINDOW", "40"))
+
+
+def _window_key(tab_name: str) -> str:
+    return f"history_window::{tab_name}"
+
+
+def _drawn_key(tab_name: str) -> str:
+    return f"history_drawn::{tab_name}"
+
+
+def _window_start(messages, window: int) -> int:
+    """Index of the first message in the last ``window`` non-system messages (walks back O(window))."""
+    shown = 0
+    index = len(messages)
+    while index > 0 and shown < window:
+        index -= 1
+        if messages[index]["role"] != "system":
+            shown += 1
+    return index
+
+
+def _draw(messages, start: int, end: int):
+    for i in range(start, end):
+        msg = messages[i]
+        if msg["role"] != "system":
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"])
+
+
+def render_history(tab_name: str, window: int = HISTORY_WINDOW):
+    """Draw the visible window of the tab's transcript; returns its container for ``render_new``."""
+    messages = st.session_state.messages[tab_name]
+    window_key = _window_key(tab_name)
+    if window_key not in st.session_state:
+        st.session_state[window_key] = window
+
+    start = _window_start(messages, st.session_state[window_key])
+    # Only message 0 is a system prompt, so everything else before ``start`` is hidden
+    hidden = start - 1 if messages and messages[0]["role"] == "system" else start
+    if hidden > 0:
+        if st.button(f"Load earlier messages ({hidden} more)", key=f"load_earlier::{tab_name}"):
+            st.session_state[window_key] += window
+            st.rerun()
+
+    container = st.container()
+    with container:
+        _draw(messages, start, len(messages))
+    st.session_state[_drawn_key(tab_name)] = len(messages)
+    return container
+
+
+def render_new(tab_name: str, container):
+    """Append messages added since the last draw to ``container`` (no full redraw)."""
+    messages = st.session_state.messages[tab_name]
+    drawn = st.session_state.get(_drawn_key(tab_name), 0)
+    if drawn >= len(messages):
+        return
+    with container:
+        _draw(messages, drawn, len(messages))
+    st.session_state[_drawn_key(tab_name)] = len(messages)
+
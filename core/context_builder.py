@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token-budgeted context assembly for the freeform chat.
+
+The freeform turns used to send the whole transcript: the scripted lesson
+messages, every earlier turn, and in one tab the system prompt twice. Now a
+turn is built from:
+
+- the system message(s) passed in (prompt, retrieval notes), once;
+- a rolling summary of older turns, if there is one;
+- older turns the summary does not cover yet, verbatim;
+- the most recent ``ZARA_CONTEXT_RECENT_TURNS`` turns, verbatim.
+
+Scripted messages are dropped and system messages in the stored history are
+ignored. The summary is refreshed in the background job pool and only folds
+in the turns that aged out since the last refresh, so it never blocks a turn
+and is never recomputed from scratch. A failed refresh is retried after
+``ZARA_CONTEXT_SUMMARY_RETRY_SECONDS``, doubling with each failure in a row.
+Over the token budget, the unsummarized older turns go first, then the
+oldest recent ones; the newest message is always sent. Tokens are counted locally (tiktoken
+when installed, a 4-characters-per-token estimate otherwise) and every build
+reports its before/after token count.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+import streamlit as st
+
+from core import jobs
+from core.message_log import MessageLog
+from core.model_profiles import request_options
+
+logger = logging.getLogger(__name__)
+
+RECENT_TURNS = int(os.getenv("ZARA_CONTEXT_RECENT_TURNS", "8"))
+MAX_CONTEXT_TOKENS = int(os.getenv("ZARA_CONTEXT_MAX_TOKENS", "3000"))
+# Refresh the summary once this many turns have aged out of the recent window
+SUMMARY_BATCH = int(os.getenv("ZARA_CONTEXT_SUMMARY_BATCH", "4"))
+SUMMARY_RETRY_SECONDS = float(os.getenv("ZARA_CONTEXT_SUMMARY_RETRY_SECONDS", "60"))
+SUMMARY_RETRY_MAX_SECONDS = 15 * 60
+
+# Per-message framing overhead in the chat format
+_MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """
+You keep a short running summary of a mentoring chat between Zara and a learner
+(a Pakistani woman balancing family and business roles).
+Update the summary with the new turns. Keep facts the learner shared about herself,
+her roles, successes, setbacks and open questions. Max 6 short lines, English, no greeting.
+"""
+
+
+# -----------------------------
+# Token counting
+# -----------------------------
+@lru_cache(maxsize=1)
+def _encoding():
+    # Loaded on the first count, not at import: tiktoken reads its BPE ranks from disk
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # tiktoken missing or its encoding files unavailable offline
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages) -> int:
+    return sum(count_tokens(m["content"]) + _MESSAGE_OVERHEAD for m in messages)
+
+
+# -----------------------------
+# Rolling summary
+# -----------------------------
+def summarize_turns(client, model: str, previous: str, turns) -> str:
+    """Fold ``turns`` into ``previous``; runs in the job pool."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    response = client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{previous or '(empty)'}\n\nNew turns:\n{transcript}"},
+        ],
+        stream=False,
+        call_site="context_summary",
+        **request_options("context_summary", model),
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _refresh_summary(state: dict, older, client, model: str):
+    """Apply a finished summary job, or start one when enough turns have aged out."""
+    pending = state.get("pending")
+    if pending is not None:
+        future, upto = pending
+        if not future.done():
+            return
+        state.pop("pending")
+        try:
+            state["summary"] = future.result()
+            state["upto"] = upto
+            state.pop("failures", None)
+            state.pop("retry_after", None)
+        except Exception as e:
+            failures = state["failures"] = state.get("failures", 0) + 1
+            delay = min(SUMMARY_RETRY_MAX_SECONDS, SUMMARY_RETRY_SECONDS * 2 ** (failures - 1))
+            state["retry_after"] = time.time() + delay
+            logger.warning("context summary failed (%d in a row, retry in %.0f s): %s", failures, delay, e)
+
+    if time.time() < state.get("retry_after", 0):
+        return
+    upto = state.get("upto", 0)
+    if client is not None and len(older) - upto >= SUMMARY_BATCH:
+        future = jobs.submit(summarize_turns, client, model, state.get("summary", ""),
+                             list(older[upto:]))
+        state["pending"] = (future, len(older))
+
+
+# -----------------------------
+# Context assembly
+# -----------------------------
+def session_context(tab_name: str) -> dict:
+    """The tab's summary state in this session (``build_context``'s ``state``)."""
+    key = f"context::{tab_name}"
+    if key not in st.session_state:
+        st.session_state[key] = {}
+    return st.session_state[key]
+
+
+class ContextReport(NamedTuple):
+    tokens_before: int
+    tokens_after: int
+    dropped_scripted: int
+    summarized_turns: int
+    verbatim_turns: int
+
+
+def build_context(system_messages, history, scripted=frozenset(), state: dict = None,
+                  client=None, model: str = None, recent_turns: int = RECENT_TURNS,
+                  max_tokens: int = MAX_CONTEXT_TOKENS, reference: dict = None):
+    """Return ``(messages, report)`` for one freeform call.
+
+    ``state`` is a per-session dict (kept in ``st.session_state`` by the tabs)
+    holding the rolling summary; without ``client`` no summary is computed and
+    older turns are trimmed to the budget instead. ``reference`` (per-turn
+    retrieval notes) goes right before the newest message, so everything in
+    front of it is the same as the previous turn's request.
+    """
+    state = {} if state is None else state
+    system_messages = list(system_messages)
+
+    if not isinstance(history, MessageLog):
+        history = MessageLog(history)
+    # A lazy view: only the turns that end up in the request become dicts
+    turns, dropped = history.turns(scripted)
+
+    split = max(0, len(turns) - recent_turns)
+    older, recent = turns[:split], list(turns[split:])
+
+    _refresh_summary(state, older, client, model)
+    upto = min(state.get("upto", 0), len(older))
+    unsummarized = older[upto:]
+
+    head = list(system_messages)
+    if state.get("summary") and upto:
+        head.append({"role": "system", "content": "Summary of the earlier conversation:\n" + state["summary"]})
+
+    if reference:
+        recent = recent[:-1] + [reference] + recent[-1:]
+
+    # Trim the oldest verbatim turns until it fits; the recent window only as a last resort
+    budget = max_tokens - count_message_tokens(head)
+    sizes = [count_tokens(m["content"]) + _MESSAGE_OVERHEAD for m in unsummarized]
+    recent_sizes = [count_tokens(m["content"]) + _MESSAGE_OVERHEAD for m in recent]
+    total, drop = sum(sizes) + sum(recent_sizes), 0
+    while drop < len(sizes) and total > budget:
+        total -= sizes[drop]
+        drop += 1
+    unsummarized = unsummarized[drop:]
+    # The newest message (and the notes for it) are always sent
+    keep = 2 if reference else 1
+    drop_recent = 0
+    while len(recent) - drop_recent > keep and total > budget:
+        total -= recent_sizes[drop_recent]
+        drop_recent += 1
+    recent = recent[drop_recent:]
+
+    messages = head + list(unsummarized) + recent
+    report = ContextReport(
+        tokens_before=count_message_tokens(system_messages) + sum(
+            count_tokens(text) + _MESSAGE_OVERHEAD for text in history.texts()
+        ),
+        tokens_after=count_message_tokens(messages),
+        dropped_scripted=dropped,
+        summarized_turns=upto,
+        verbatim_turns=len(unsummarized) + len(recent) - (1 if reference else 0),
+    )
+    state["last_report"] = report._asdict()
+    logger.info("context built: %s", state["last_report"])
+    return messages, report
+
+
+def conversation_fingerprint(history, scripted=frozenset(), state: dict = None) -> str:
+    """Hash of the conversation a turn is answered from, before its newest message.
+
+    Covers what ``build_context`` sends besides the system messages: the
+    rolling summary (and how far it reaches) and the turns after it. Turns
+    that age out of the window stay covered through the summary's ``upto``.
+    """
+    state = state or {}
+    if not isinstance(history, MessageLog):
+        history = MessageLog(history)
+    turns, _ = history.turns(scripted)
+    digest = hashlib.sha256()
+    digest.update(f"{state.get('upto', 0)}\x1e{state.get('summary', '')}".encode("utf-8"))
+    for message in turns[min(state.get("upto", 0), len(turns)):len(turns) - 1]:
+        digest.update(f"\x1e{message['role']}\x1f{message['content']}".encode("utf-8"))
+    return digest.hexdigest()[:16]
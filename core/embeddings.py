@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local sentence embeddings shared by the semantic cache and retrieval.
+
+The sentence-transformers model is loaded lazily, once per process, the
+first time something needs a vector. Vectors are L2-normalized float32 so a
+plain dot product is the cosine similarity.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("ZARA_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def embeddings_available() -> bool:
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_embedding_model():
+    """Return the process-wide SentenceTransformer, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    return _model
+
+
+def embedding_dim() -> int:
+    return get_embedding_model().get_sentence_embedding_dimension()
+
+
+def embed(texts, batch_size: int = 64) -> np.ndarray:
+    """Embed a list of texts into an (n, dim) float32 matrix of unit vectors."""
+    vectors = get_embedding_model().encode(
+        list(texts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def embed_one(text: str) -> np.ndarray:
+    return embed([text])[0]
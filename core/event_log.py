@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Append-only event log of lesson progress, for offline analytics.
+
+How learners moved through the stages used to exist only in each session's
+state and was gone when the session ended. Now the lesson layer records:
+
+- ``stage``: a learner entered a step (``flow``, ``step``, ``index``, the
+  ``prev`` step and the intent ``label`` that moved them);
+- ``turn``: a learner input was answered (its ``label``, so off-topic
+  detours are visible; ``is_correct`` when a JSON grader ran; the ``ms``
+  from input to reply);
+- ``llm``: an LLM call finished (call site, stage, provider, outcome,
+  latency, time to first token and tokens), from ``core.telemetry``.
+
+``emit`` only puts a small dict on an in-process queue. It never blocks:
+when the queue is full the event is dropped and counted. A daemon thread
+drains the queue every ``ZARA_EVENT_LOG_FLUSH_SECONDS`` and writes each
+batch to the current segment file of this process. A segment is rotated
+when it passes ``ZARA_EVENT_LOG_ROTATE_MB``.
+
+Backends (``ZARA_EVENT_LOG``):
+
+- ``off`` (default): nothing is recorded.
+- ``jsonl`` (segments in ``.cache/events``) or ``jsonl:///path/to/dir``: one
+  compact JSON object per line. Closed segments are gzipped.
+- ``sqlite`` or ``sqlite:///path/to/dir``: an ``events`` table per segment
+  (``t``, ``e``, ``s`` columns plus the other fields as JSON).
+
+The log is opt-in because events carry the session id of every learner;
+pick a directory whose retention suits that before turning it on.
+
+``python -m core.event_log report [dir]`` streams over every segment once.
+It keeps per-session bitmasks and fixed-size latency histograms, so memory
+grows with the number of sessions, not with the number of events. It
+prints each flow's funnel (sessions per step and where they stopped),
+off-topic and correct rates, and per-step dwell, turn and LLM latency.
+``benchmarks/event_log_bench.py`` times ``emit`` and a report over a
+million events.
+"""
+
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import math
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from core.response_cache import CACHE_DIR
+
+EVENT_LOG_URL = os.getenv("ZARA_EVENT_LOG", "off")
+FLUSH_SECONDS = float(os.getenv("ZARA_EVENT_LOG_FLUSH_SECONDS", "1.0"))
+ROTATE_BYTES = int(float(os.getenv("ZARA_EVENT_LOG_ROTATE_MB", "64")) * 1024 * 1024)
+QUEUE_SIZE = int(os.getenv("ZARA_EVENT_LOG_QUEUE", "100000"))
+DEFAULT_DIR = os.path.join(CACHE_DIR, "events")
+
+_SEPARATORS = (",", ":")
+
+
+# -----------------------------
+# Segment writers
+# -----------------------------
+def _segment_name(extension: str) -> str:
+    # Sorting the names sorts the segments by start time; the pid keeps processes apart
+    return f"events-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.monotonic_ns() % 10**6:06d}.{extension}"
+
+
+class JSONLWriter:
+    def __init__(self, directory: str, rotate_bytes: int = ROTATE_BYTES):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.path = None
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, records):
+        if self._file is None:
+            self.path = os.path.join(self.directory, _segment_name("jsonl"))
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(r, separators=_SEPARATORS, ensure_ascii=False) + "\n" for r in records))
+        self._file.flush()
+        if self._file.tell() >= self.rotate_bytes:
+            self.close()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        with open(self.path, "rb") as src, gzip.open(self.path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(self.path + ".gz.tmp", self.path + ".gz")
+        os.remove(self.path)
+
+
+class SQLiteWriter:
+    def __init__(self, directory: str, rotate_bytes: int = ROTATE_BYTES):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.path = None
+        self._db = None
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, records):
+        if self._db is None:
+            self.path = os.path.join(self.directory, _segment_name("sqlite3"))
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS events (t REAL, e TEXT, s TEXT, data TEXT)")
+        rows = []
+        for record in records:
+            fields = {k: v for k, v in record.items() if k not in ("t", "e", "s")}
+            rows.append((record["t"], record["e"], record["s"], json.dumps(fields, separators=_SEPARATORS)))
+        with self._db:
+            self._db.executemany("INSERT INTO events VALUES (?, ?, ?, ?)", rows)
+        if os.path.getsize(self.path) >= self.rotate_bytes:
+            self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def open_writer(url: str = EVENT_LOG_URL):
+    if url == "off":
+        return None
+    if url == "jsonl":
+        return JSONLWriter(DEFAULT_DIR)
+    if url.startswith("jsonl:///"):
+        return JSONLWriter(url[len("jsonl://"):])
+    if url == "sqlite":
+        return SQLiteWriter(DEFAULT_DIR)
+    if url.startswith("sqlite:///"):
+        return SQLiteWriter(url[len("sqlite://"):])
+    raise ValueError(f"Unknown ZARA_EVENT_LOG: {url!r}")
+
+
+# -----------------------------
+# Queue and background writer
+# -----------------------------
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_dropped = 0
+_written = 0
+_writer = None
+_writer_started = False
+_writer_lock = threading.Lock()   # held while a batch is written
+_start_lock = threading.Lock()
+
+
+def emit(event: str, session: str = "", **fields):
+    """Queue one event; returns at once (the event is dropped if the queue is full).
+
+    Fields that are None are left out.
+    """
+    global _dropped
+    if not _writer_started:
+        _start_writer()
+    if _writer is None:
+        return
+    try:
+        record = {"t": round(time.time(), 3), "e": event, "s": session}
+        record.update((key, value) for key, value in fields.items() if value is not None)
+        _queue.put_nowait(record)
+    except queue.Full:
+        with _start_lock:
+            _dropped += 1
+
+
+def flush():
+    """Write everything queued so far (the writer thread does this every few seconds)."""
+    global _written
+    with _writer_lock:
+        batch = []
+        while True:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch and _writer is not None:
+            try:
+                _writer.write(batch)
+                _written += len(batch)
+            except (OSError, sqlite3.Error) as e:
+                print(f"event log: {len(batch)} events not written: {e}", file=sys.stderr)
+
+
+def _run():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        flush()
+
+
+def _close():
+    flush()
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+
+
+def _start_writer():
+    global _writer, _writer_started
+    with _start_lock:
+        if _writer_started:
+            return
+        _writer = open_writer()
+        _writer_started = True
+        if _writer is not None:
+            threading.Thread(target=_run, name="zara-event-log", daemon=True).start()
+            atexit.register(_close)
+
+
+def stats() -> dict:
+    return {
+        "backend": EVENT_LOG_URL,
+        "segment": getattr(_writer, "path", None),
+        "queued": _queue.qsize(),
+        "written": _written,
+        "dropped": _dropped,
+    }
+
+
+# -----------------------------
+# Reading and reports
+# -----------------------------
+def segments(directory: str):
+    """Segment files in ``directory``, oldest first."""
+    paths = []
+    for pattern in ("events-*.jsonl", "events-*.jsonl.gz", "events-*.sqlite3"):
+        paths += glob.glob(os.path.join(directory, pattern))
+    return sorted(paths, key=os.path.basename)
+
+
+def iter_events(directory: str):
+    """Every event in ``directory``, one at a time (a segment is never read whole)."""
+    for path in segments(directory):
+        if path.endswith(".sqlite3"):
+            db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                for t, e, s, data in db.execute("SELECT t, e, s, data FROM events ORDER BY rowid"):
+                    yield {"t": t, "e": e, "s": s, **json.loads(data)}
+            finally:
+                db.close()
+            continue
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # the last line of a segment still being written
+
+
+class Histogram:
+    """Streaming quantiles: counts in log buckets 10% apart, so memory stays fixed."""
+
+    __slots__ = ("counts", "count")
+    _BASE = math.log(1.1)
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[int(math.log(max(value, 1e-3)) / self._BASE)] += 1
+        self.count += 1
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                return math.exp((bucket + 0.5) * self._BASE)
+        return None
+
+
+class Report:
+    """Funnel, rates and latencies per flow step, folded over a stream of events."""
+
+    def __init__(self):
+        self.steps = defaultdict(dict)          # flow -> index -> step name
+        self.visited = defaultdict(int)         # (flow, session) -> bitmask of step indexes entered
+        self.entered = {}                       # (flow, session) -> (step, time)
+        self.dwell = defaultdict(Histogram)     # (flow, step) -> seconds until the next step
+        self.turns = defaultdict(Counter)       # (flow, step) -> turns, off_topic, graded, correct
+        self.turn_ms = defaultdict(Histogram)
+        self.llm_ms = defaultdict(Histogram)    # telemetry stage ("flow/step") -> call latency
+        self.llm_errors = Counter()
+        self.events = 0
+
+    def add(self, event: dict):
+        self.events += 1
+        kind = event.get("e")
+        if kind == "stage":
+            flow, step, index = event["flow"], event["step"], event["index"]
+            key = (flow, event["s"])
+            self.steps[flow][index] = step
+            self.visited[key] |= 1 << index
+            previous = self.entered.get(key)
+            if previous is not None and event["t"] >= previous[1]:
+                self.dwell[(flow, previous[0])].observe(event["t"] - previous[1])
+            self.entered[key] = (step, event["t"])
+        elif kind == "turn":
+            counts = self.turns[(event["flow"], event["step"])]
+            counts["turns"] += 1
+            counts["off_topic"] += event.get("label") == "off_topic"
+            if event.get("is_correct") is not None:
+                counts["graded"] += 1
+                counts["correct"] += bool(event["is_correct"])
+            if event.get("ms") is not None:
+                self.turn_ms[(event["flow"], event["step"])].observe(event["ms"])
+        elif kind == "llm":
+            self.llm_ms[event.get("stage") or "-"].observe(event.get("ms") or 0)
+            if event.get("outcome") != "ok":
+                self.llm_errors[event.get("stage") or "-"] += 1
+
+    def funnel(self, flow: str):
+        """Per step: sessions that entered it, and of those how many never entered a later step."""
+        entered, stopped = Counter(), Counter()
+        for (name, _), mask in self.visited.items():
+            if name != flow:
+                continue
+            last = mask.bit_length() - 1
+            for index in self.steps[flow]:
+                if mask >> index & 1:
+                    entered[index] += 1
+            stopped[last] += 1
+        return [(index, self.steps[flow][index], entered[index], stopped[index]) for index in sorted(self.steps[flow])]
+
+    def to_dict(self) -> dict:
+        def ms(histogram, q):
+            value = histogram.quantile(q) if histogram is not None else None
+            return None if value is None else round(value, 1)
+
+        flows = {}
+        for flow in sorted(self.steps):
+            rows = []
+            start = None
+            for index, step, entered, stopped in self.funnel(flow):
+                start = start or entered or None
+                counts = self.turns.get((flow, step), Counter())
+                dwell = self.dwell.get((flow, step))
+                llm = self.llm_ms.get(f"{flow}/{step}")
+                rows.append({
+                    "index": index,
+                    "step": step,
+                    "sessions": entered,
+                    "of_start": round(entered / start, 3) if start else None,
+                    "stopped_here": stopped,
+                    "turns": counts["turns"],
+                    "off_topic_rate": round(counts["off_topic"] / counts["turns"], 3) if counts["turns"] else None,
+                    "correct_rate": round(counts["correct"] / counts["graded"], 3) if counts["graded"] else None,
+                    "dwell_p50_s": None if dwell is None else round(dwell.quantile(0.5), 1),
+                    "turn_p50_ms": ms(self.turn_ms.get((flow, step)), 0.5),
+                    "turn_p95_ms": ms(self.turn_ms.get((flow, step)), 0.95),
+                    "llm_p50_ms": ms(llm, 0.5),
+                    "llm_p95_ms": ms(llm, 0.95),
+                    "llm_errors": self.llm_errors.get(f"{flow}/{step}", 0),
+                })
+            flows[flow] = rows
+        return {"events": self.events, "sessions": len({s for _, s in self.visited}), "flows": flows}
+
+
+def build_report(directory: str) -> Report:
+    report = Report()
+    for event in iter_events(directory):
+        report.add(event)
+    return report
+
+
+def _print_report(summary: dict):
+    print(f"{summary['events']} events, {summary['sessions']} sessions")
+    columns = ("index", "step", "sessions", "of_start", "stopped_here", "off_topic_rate", "correct_rate",
+               "dwell_p50_s", "turn_p50_ms", "turn_p95_ms", "llm_p50_ms", "llm_p95_ms")
+    for flow, rows in summary["flows"].items():
+        print(f"\n{flow}")
+        print(" ".join(f"{column:>14}" for column in columns))
+        for row in rows:
+            print(" ".join(f"{'-' if row[c] is None else row[c]:>14}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="funnel and per-step latency over every segment")
+    report.add_argument("directory", nargs="?", default=DEFAULT_DIR)
+    report.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summary = build_report(args.directory).to_dict()
+    if args.json:
+        print(json.dumps(summary, indent=1))
+    else:
+        _print_report(summary)
+        print(f"\nread in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Table-driven conversation flows for the scripted lessons.
+
+A lesson used to be a hand-written if/elif ladder over a stage counter, each
+branch repeating the off-topic check, the message appends and the redisplay,
+and scanning the transcript to see whether its opening message had already
+been sent. Now a lesson is data: a ``Flow`` of ``Step`` rows, compiled once
+at import into a list (dispatch is an index lookup) with transitions
+resolved to indices. Scripted messages a step says on entry are tracked with
+one bit per step in the session, so no rerun ever scans the transcript.
+
+The state machine itself (``enter``/``begin``/``apply``) works on any dict
+and message list, so flows can be driven headless; ``render_flow`` is the
+Streamlit layer that draws the step's input and runs LLM work in the
+background job pool (see ``core.jobs``).
+"""
+
+import time
+from concurrent.futures import wait
+from typing import NamedTuple
+
+import streamlit as st
+
+from core import admission, chat_view, event_log, jobs, telemetry, voice
+from core.intent_router import ANSWER, CLARIFY, EXPECT_ANSWER, OFF_TOPIC, Route, route
+from core.json_stream import FEEDBACK_STREAMING, FeedbackStream, record_visible_latency
+from core.message_log import intern_texts
+
+# Step inputs
+CHAT = "chat"
+TEXT = "text"
+MULTISELECT = "multiselect"
+FREEFORM = "freeform"  # hands the turn to the flow's freeform chat handler
+
+DEFAULT = "*"
+# Labels answered in place: the learner stays on the step
+DETOURS = (OFF_TOPIC, CLARIFY)
+
+
+class Go(NamedTuple):
+    """Transition: messages said on the way, then the target step's own ``say``."""
+    target: str
+    say: tuple = ()
+
+
+class Step(NamedTuple):
+    name: str
+    say: tuple = ()                  # scripted messages sent when the step is entered
+    input: str = CHAT
+    placeholder: str = ""
+    options: tuple = ()              # MULTISELECT choices
+    widget_key: str = None
+    expect: str = EXPECT_ANSWER      # what the intent router should expect
+    route: bool = True               # False: every input counts as an answer (no off-topic check)
+    evaluate: str = None             # evaluator name; its feedback is said before moving on
+    fallback: str = "Thank you for sharing that with me."
+    store: str = None                # session key that keeps the learner's input
+    next: dict = None                # label -> Go; DEFAULT for anything else
+
+
+class Flow:
+    """A compiled lesson.
+
+    ``evaluators`` map names to ``fn(client, user_input, model, values,
+    stream=None)``, where ``values`` holds the steps' stored inputs and
+    ``stream`` is a ``FeedbackStream`` to push the feedback text into.
+    ``classify(client, user_input, expect, model)`` labels inputs the local
+    router can't decide, ``open_ended(client, tab_name, user_input, model)`` answers
+    off-topic questions (and explains the step's question when asked to; see
+    ``clarify_request``) and ``freeform(client, tab_name)`` runs a FREEFORM
+    step. All but ``freeform`` run in the job pool and must not touch
+    ``st.session_state``.
+    """
+
+    def __init__(self, name: str, steps, stage_key: str, emitted_key: str, evaluators=None,
+                 classify=None, open_ended=None, freeform=None,
+                 open_ended_fallback: str = "Let's continue with our lesson."):
+        self.name = name
+        self.steps = list(steps)
+        self.stage_key = stage_key
+        self.emitted_key = emitted_key
+        self.evaluators = dict(evaluators or {})
+        self.classify = classify
+        self.open_ended = open_ended
+        self.freeform = freeform
+        self.open_ended_fallback = open_ended_fallback
+        self._compile()
+
+    def _compile(self):
+        self.index = {step.name: i for i, step in enumerate(self.steps)}
+        if len(self.index) != len(self.steps):
+            raise ValueError(f"{self.name}: duplicate step names")
+        self.transitions = []
+        for step in self.steps:
+            if step.evaluate and step.evaluate not in self.evaluators:
+                raise ValueError(f"{self.name}.{step.name}: unknown evaluator {step.evaluate!r}")
+            resolved = {}
+            for label, go in (step.next or {}).items():
+                if go.target not in self.index:
+                    raise ValueError(f"{self.name}.{step.name}: unknown target {go.target!r}")
+                resolved[label] = (self.index[go.target], tuple(go.say))
+            if step.input != FREEFORM and DEFAULT not in resolved:
+                raise ValueError(f"{self.name}.{step.name}: needs a {DEFAULT!r} transition")
+            self.transitions.append(resolved)
+        self.stored_keys = tuple(step.store for step in self.steps if step.store)
+        # Every transcript references these instead of holding its own copy
+        intern_texts(text for step in self.steps for text in step.say)
+        intern_texts(text for resolved in self.transitions for _, say in resolved.values() for text in say)
+        intern_texts(step.fallback for step in self.steps)
+        intern_texts([self.open_ended_fallback])
+
+    # -- headless state machine -------------------------------------------
+    def current(self, session) -> Step:
+        return self.steps[session.get(self.stage_key, 0)]
+
+    def values(self, session) -> dict:
+        return {key: session.get(key) for key in self.stored_keys}
+
+    def _say(self, session, messages, index: int, extra=()):
+        messages.extend({"role": "assistant", "content": text} for text in extra)
+        messages.extend({"role": "assistant", "content": text} for text in self.steps[index].say)
+        session[self.emitted_key] = session.get(self.emitted_key, 0) | (1 << index)
+
+    def enter(self, session, messages) -> bool:
+        """Say the current step's opening messages if not sent yet; True if any were added."""
+        index = session.setdefault(self.stage_key, 0)
+        if session.get(self.emitted_key, 0) & (1 << index):
+            return False
+        self._say(session, messages, index)
+        return bool(self.steps[index].say)
+
+    def begin(self, session, messages, user_input: str) -> Route:
+        """Record the learner's input and route it locally."""
+        step = self.current(session)
+        if step.store:
+            session[step.store] = user_input
+        messages.append({"role": "user", "content": user_input})
+        if not step.route:
+            return Route(ANSWER, 1.0, False)
+        return route(user_input, step.expect)
+
+    def apply(self, session, messages, label: str, evaluation=None, open_ended_reply: str = None,
+              streamed_feedback: str = None):
+        """Finish a turn: answer detours in place, or give feedback and move on.
+
+        ``streamed_feedback`` is the feedback text already streamed to the learner; it is
+        kept even when the reply it came from failed to parse, so the transcript matches
+        what was shown.
+        """
+        if label == OFF_TOPIC:
+            messages.append({"role": "assistant", "content": open_ended_reply or self.open_ended_fallback})
+            return
+        index = session.get(self.stage_key, 0)
+        step = self.steps[index]
+        if label == CLARIFY:
+            # Without an explanation, asking the question again is the next best thing
+            replies = (open_ended_reply,) if open_ended_reply else step.say[-1:] or (self.open_ended_fallback,)
+            messages.extend({"role": "assistant", "content": text} for text in replies)
+            return
+        if step.evaluate:
+            feedback = streamed_feedback or (evaluation or {}).get("feedback") or step.fallback
+            messages.append({"role": "assistant", "content": feedback})
+        transitions = self.transitions[index]
+        target, say = transitions.get(label, transitions[DEFAULT])
+        session[self.stage_key] = target
+        self._say(session, messages, target, say)
+
+
+# -----------------------------
+# Streamlit layer
+# -----------------------------
+def _evaluate(evaluator, call_site: str, stream, client, user_input: str, model: str, values: dict):
+    """Run an evaluator in the job pool and record when its feedback became visible."""
+    started = time.perf_counter()
+    result = None
+    try:
+        result = evaluator(client, user_input, model, values, stream=stream)
+        return result
+    finally:
+        visible = time.perf_counter()
+        if stream is not None:
+            # Never leave the script thread waiting on an open stream
+            stream.finish((result or {}).get("feedback"))
+            visible = stream.first_visible_at or visible
+        record_visible_latency(call_site, stream is not None, visible - started)
+
+
+def clarify_request(step: Step, user_input: str) -> str:
+    """What ``open_ended`` is asked when the learner doesn't follow the step's question."""
+    question = step.say[-1] if step.say else ""
+    return (f'Zara asked the learner: "{question}"\nThe learner replied: "{user_input}"\n'
+            "Explain the question in simpler words, with a short example, and ask it again.")
+
+
+def _submit_detour(flow: Flow, client, tab_name: str, turn, step: Step, model: str):
+    if flow.open_ended is None:
+        return
+    request = clarify_request(step, turn.user_input) if turn.label == CLARIFY else turn.user_input
+    turn.add("open_ended", jobs.submit(flow.open_ended, client, tab_name, request, model))
+
+
+def _start_turn(flow: Flow, client, tab_name: str, user_input: str):
+    session = st.session_state
+    messages = session.messages[tab_name]
+    step = flow.current(session)
+    model = session["openai_model"]
+
+    index = len(messages)
+    previous = {step.store: session.get(step.store)} if step.store else {}
+    local = flow.begin(session, messages, user_input)
+    turn = jobs.PendingTurn(session[flow.stage_key], user_input, local.label, index)
+    turn.restore = previous
+
+    if local.needs_llm:
+        turn.add("intent", jobs.submit(flow.classify, client, user_input, step.expect, model))
+    if local.label in DETOURS:
+        _submit_detour(flow, client, tab_name, turn, step, model)
+    elif step.evaluate:
+        # Grade in parallel with the intent check; the grade is dropped if the input turns out off-topic
+        evaluator = flow.evaluators[step.evaluate]
+        if FEEDBACK_STREAMING:
+            turn.feedback_stream = FeedbackStream()
+        turn.add("evaluation", jobs.submit(
+            _evaluate, evaluator, step.evaluate, turn.feedback_stream, client, user_input, model, flow.values(session),
+        ))
+    jobs.start_turn(tab_name, turn)
+
+
+def _poll_turn(flow: Flow, client, tab_name: str):
+    """Return the finished turn, ``None`` if there is none, or ``jobs.PENDING`` while it runs."""
+    turn = jobs.get_turn(tab_name)
+    if turn is None:
+        return None
+    stream = turn.feedback_stream
+    if stream is not None and not turn.done() and turn.label not in DETOURS and "intent" not in turn.futures:
+        # The input is known to be an answer: show the feedback while it is generated
+        with st.chat_message("assistant"):
+            st.write_stream(stream.deltas())
+        wait(list(turn.futures.values()))
+    if turn.done():
+        label = turn.result("intent", turn.label) if "intent" in turn.futures else turn.label
+        if label in DETOURS and flow.open_ended is not None and "open_ended" not in turn.futures:
+            turn.label = label
+            _submit_detour(flow, client, tab_name, turn, flow.current(st.session_state),
+                           st.session_state["openai_model"])
+        else:
+            turn.label = label
+            return jobs.finish_turn(tab_name)
+    jobs.render_pending(tab_name)
+    return jobs.PENDING
+
+
+def _log_turn(flow: Flow, step: Step, label: str, evaluation=None, started: float = None):
+    """Record a finished turn and, unless it was a detour, the step it led to."""
+    sid = admission.current_session()
+    event_log.emit(
+        "turn", sid, flow=flow.name, step=step.name, label=label,
+        is_correct=(evaluation or {}).get("is_correct"),
+        ms=None if started is None else round((time.time() - started) * 1000),
+    )
+    if label not in DETOURS and step.input != FREEFORM:
+        target = flow.current(st.session_state)
+        event_log.emit("stage", sid, flow=flow.name, step=target.name, index=flow.index[target.name],
+                       prev=step.name, label=label)
+
+
+def _read_input(step: Step, tab_name: str):
+    if step.input == MULTISELECT:
+        choice = st.multiselect(step.placeholder, list(step.options), key=step.widget_key)
+        return ", ".join(choice)
+    if step.input == TEXT:
+        return st.text_input(step.placeholder, key=step.widget_key)
+    # A spoken message (see core.voice) counts as typed
+    return st.chat_input(step.placeholder, key=step.widget_key) or voice.take_text(tab_name)
+
+
+def render_flow(flow: Flow, client, tab_name: str, history):
+    """Run one rerun of ``flow`` below the tab's history container."""
+    # LLM calls made from here, and the jobs submitted, are labelled with the step
+    with telemetry.stage(f"{flow.name}/{flow.current(st.session_state).name}"):
+        # Above the pending check: the microphone keeps streaming while a turn runs
+        voice.render_voice_control(client, tab_name)
+        _render_step(flow, client, tab_name, history)
+
+
+def _render_step(flow: Flow, client, tab_name: str, history):
+    session = st.session_state
+    messages = session.messages[tab_name]
+    first_run = not session.get(flow.emitted_key)  # no step has been entered yet
+    if flow.enter(session, messages):
+        chat_view.render_new(tab_name, history)
+
+    step = flow.current(session)
+    if first_run:
+        event_log.emit("stage", admission.current_session(), flow=flow.name, step=step.name,
+                       index=flow.index[step.name])
+    if step.input == FREEFORM:
+        count, started = len(messages), time.time()
+        flow.freeform(client, tab_name)
+        if len(messages) > count:
+            _log_turn(flow, step, "chat", started=started)
+        return
+
+    turn = _poll_turn(flow, client, tab_name)
+    if turn is jobs.PENDING:
+        return
+    if turn is not None:
+        evaluation = turn.result("evaluation", {})
+        streamed = turn.feedback_stream.text if turn.feedback_stream is not None else None
+        flow.apply(session, messages, turn.label, evaluation=evaluation, open_ended_reply=turn.result("open_ended"),
+                   streamed_feedback=streamed)
+        _log_turn(flow, step, turn.label, evaluation, turn.started_at)
+        st.rerun()
+
+    user_input = _read_input(step, tab_name)
+    if not user_input:
+        return
+    if step.route or step.evaluate:
+        _start_turn(flow, client, tab_name, user_input)
+    else:
+        # Nothing to wait for: record and advance in this run
+        label = flow.begin(session, messages, user_input).label
+        flow.apply(session, messages, label)
+        _log_turn(flow, step, label)
+    st.rerun()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk format of the retrieval index.
+
+An index directory holds two files:
+
+- ``vectors-<id>.npy``: the (chunks, dim) embedding matrix as float16 in
+  plain ``.npy`` layout. Readers open it with ``mmap_mode="r"``, so loading
+  is zero-copy and every worker process on the host shares the same
+  page-cached copy instead of holding its own.
+- ``meta.json``: the sidecar. It holds the format version, the embedding
+  model, the corpus digest and the vectors file name, plus per row the
+  chunk's content hash, a category index and the text. Categories are
+  listed once.
+
+Writers save a new vectors file first and then swap ``meta.json`` in with
+``os.replace``, so a reader sees either the old index or the new one. Old
+vectors files are removed afterwards; processes that still map one keep
+reading it until they reload. The content hashes let a rebuild reuse the
+rows of unchanged chunks (see ``core.retrieval.build_index``).
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from typing import NamedTuple
+
+import numpy as np
+
+# Bump when the layout of either file changes; older indexes are rebuilt.
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+class StoredIndex(NamedTuple):
+    model: str
+    corpus_sha256: str
+    records: list          # (content hash, category, text) per row
+    vectors: np.ndarray    # read-only float16 memmap
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def read_index(directory: str):
+    """The index in ``directory``, or None if it is missing, unreadable or another format."""
+    try:
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            return None
+        vectors = np.load(os.path.join(directory, meta["vectors"]), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        # Missing, half-written by an older writer, or the vectors file was
+        # replaced between reading the sidecar and opening it
+        return None
+    categories = meta["categories"]
+    records = [(digest, categories[category], text) for digest, category, text in meta["chunks"]]
+    if vectors.dtype != np.float16 or vectors.ndim != 2 or len(vectors) != len(records):
+        return None
+    return StoredIndex(meta["model"], meta["corpus_sha256"], records, vectors)
+
+
+def write_index(directory: str, model: str, corpus_sha256: str, records, vectors: np.ndarray) -> str:
+    """Write a new index into ``directory`` and make it current; returns the vectors path."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"vectors-{uuid.uuid4().hex[:12]}.npy"
+    path = os.path.join(directory, name)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype=np.float16))
+    os.replace(path + ".tmp", path)
+
+    categories = list(dict.fromkeys(category for _, category, _ in records))
+    category_index = {category: i for i, category in enumerate(categories)}
+    meta = {
+        "format": FORMAT_VERSION,
+        "model": model,
+        "corpus_sha256": corpus_sha256,
+        "dim": int(vectors.shape[1]),
+        "vectors": name,
+        "categories": categories,
+        "chunks": [[digest, category_index[category], text] for digest, category, text in records],
+    }
+    meta_path = os.path.join(directory, META_FILE)
+    with open(f"{path}.meta.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(f"{path}.meta.tmp", meta_path)
+
+    for old in os.listdir(directory):
+        if old.startswith("vectors-") and old.endswith(".npy") and old != name:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass  # still open elsewhere (Windows); the next build retries
+    return path
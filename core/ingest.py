@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ingest judgment PDFs and DOCX files into the knowledge corpus.
+
+    python -m core.ingest path/to/judgments --workers 4
+
+Every ``.pdf`` under the directory is cut into tasks of at most ``--pages``
+pages, and every ``.docx`` is one task (python-docx parses the whole file at
+once, so it is parsed once, in the worker, and cut into pages of paragraphs
+there). A process pool extracts the tasks. The main process keeps only a bounded window of tasks in flight and
+takes their results in order, so memory stays bounded by the window, not by
+the size of any document. A page's text is normalized (NFKC, hyphenation
+and whitespace) and split into passages. Passages whose hash is already in
+the corpus, or was seen earlier in the run, are dropped. If a task fails,
+what its file already added to the corpus is truncated away and the rest of
+the file's tasks are skipped, so a retry never leaves a partial or
+duplicated document.
+
+Passages are appended to the corpus file in the format ``core.retrieval``
+reads: one ``Source: <file>`` heading per document, then one ``* `` bullet
+per passage. A manifest in the cache directory remembers each file's size,
+mtime and content hash, so unchanged files are skipped on the next run. The
+run ends with pages/sec and the peak RSS of the main process and the
+workers. Rebuild the retrieval index afterwards (``python -m core.retrieval``).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import resource
+import sys
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from core.response_cache import CACHE_DIR
+from core.retrieval import CORPUS_PATH, chunk_corpus
+
+MANIFEST_PATH = os.getenv("ZARA_INGEST_MANIFEST", os.path.join(CACHE_DIR, "ingest_manifest.json"))
+PAGES_PER_TASK = 16
+PARAGRAPHS_PER_PAGE = 30   # a DOCX has no pages; this many paragraphs count as one
+MIN_PASSAGE_CHARS = 40     # shorter blocks are page numbers, headers and the like
+MAX_PASSAGE_CHARS = 1200
+
+_HYPHENATED = re.compile(r"(\w)-\n(\w)")
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_BLOCK_BREAK = re.compile(r"\n\s*\n")
+
+
+# -----------------------------
+# Normalization
+# -----------------------------
+def split_passages(page_text: str):
+    """Normalized passages of one page: blank-line blocks, long ones cut at sentence ends."""
+    text = _HYPHENATED.sub(r"\1\2", unicodedata.normalize("NFKC", page_text))
+    for block in _BLOCK_BREAK.split(text):
+        block = _WHITESPACE.sub(" ", block).strip()
+        if len(block) < MIN_PASSAGE_CHARS:
+            continue
+        if len(block) <= MAX_PASSAGE_CHARS:
+            yield block
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(block):
+            if current and len(current) + len(sentence) + 1 > MAX_PASSAGE_CHARS:
+                yield current
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if len(current) >= MIN_PASSAGE_CHARS:
+            yield current
+
+
+def passage_hash(text: str) -> str:
+    # Case, punctuation and spacing differences do not make a new passage
+    key = "".join(ch for ch in text.lower() if ch.isalnum())
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+# -----------------------------
+# Extraction (runs in the worker processes)
+# -----------------------------
+def _pdf_reader(path: str):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    return PdfReader(path)
+
+
+def _pdf_pages(path: str, start: int, stop: int):
+    reader = _pdf_reader(path)
+    for number in range(start, stop):
+        yield number + 1, reader.pages[number].extract_text() or ""
+
+
+def _docx_pages(path: str):
+    import docx
+    paragraphs = [p.text for p in docx.Document(path).paragraphs]
+    for number, start in enumerate(range(0, max(1, len(paragraphs)), PARAGRAPHS_PER_PAGE)):
+        yield number + 1, "\n\n".join(paragraphs[start:start + PARAGRAPHS_PER_PAGE])
+
+
+def extract_task(task):
+    """``(path, kind, start, stop)`` -> ``(pages, [passages])`` for those pages (a DOCX: all of them)."""
+    path, kind, start, stop = task
+    pages = _pdf_pages(path, start, stop) if kind == "pdf" else _docx_pages(path)
+    passages = []
+    count = 0
+    for _, text in pages:
+        count += 1
+        passages.extend(split_passages(text))
+    return count, passages
+
+
+def page_count(path: str) -> int:
+    """Pages of a PDF (read from its page tree; the pages are not parsed)."""
+    return len(_pdf_reader(path).pages)
+
+
+# -----------------------------
+# Manifest
+# -----------------------------
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str, corpus_path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get(os.path.abspath(corpus_path), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: str, corpus_path: str, entries: dict):
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest[os.path.abspath(corpus_path)] = entries
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+def find_sources(directory: str):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            kind = name.rsplit(".", 1)[-1].lower()
+            if kind in ("pdf", "docx") and not name.startswith("~$"):
+                yield os.path.join(root, name), kind
+
+
+def heading_for(path: str) -> str:
+    # A corpus heading is a short line without a closing period (see core.retrieval)
+    return ("Source: " + os.path.splitext(os.path.basename(path))[0])[:80].rstrip(". ")
+
+
+def _tasks(path: str, kind: str, pages_per_task: int):
+    if kind == "docx":
+        yield path, kind, 0, None
+        return
+    total = page_count(path)
+    for start in range(0, total, pages_per_task):
+        yield path, kind, start, min(total, start + pages_per_task)
+
+
+def ingest(directory: str, corpus_path: str = CORPUS_PATH, workers: int = None,
+           pages_per_task: int = PAGES_PER_TASK, manifest_path: str = MANIFEST_PATH) -> dict:
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(manifest_path, corpus_path)
+    with open(corpus_path, encoding="utf-8") as f:
+        seen = {passage_hash(chunk.text) for chunk in chunk_corpus(f.read())}
+    stats = {"files": 0, "skipped": 0, "failed": 0, "pages": 0, "passages": 0, "duplicates": 0}
+
+    # Changed files only; a touched file whose bytes are the same is skipped too
+    sources = []
+    for path, kind in find_sources(directory):
+        stats["files"] += 1
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            stats["skipped"] += 1
+            continue
+        digest = file_digest(path)
+        if entry and entry["sha256"] == digest:
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            stats["skipped"] += 1
+            continue
+        sources.append((path, kind, stat, digest))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(corpus_path, "a", encoding="utf-8") as out:
+        window = deque()  # (path, future) in submission order, at most 2 per worker
+
+        def tasks():
+            for path, kind, _, _ in sources:
+                try:
+                    yield from ((path, task) for task in _tasks(path, kind, pages_per_task))
+                except Exception as e:
+                    print(f"skipping {path}: {e}", file=sys.stderr)
+                    stats["failed"] += 1
+                yield path, None  # end of this file
+
+        written = {}   # path -> passages added so far
+        added = {}     # path -> (corpus size before its heading, hashes it added)
+        failed = set()
+        pending = tasks()
+        while True:
+            while len(window) < 2 * workers:
+                item = next(pending, None)
+                if item is None:
+                    break
+                path, task = item
+                window.append((path, task and pool.submit(extract_task, task)))
+            if not window:
+                break
+            path, future = window.popleft()
+            if path in failed:
+                if future is not None:
+                    future.cancel()
+                continue
+            if future is None:
+                added.pop(path, None)
+                if path in written:
+                    # The whole file is in the corpus: remember it
+                    _, _, stat, digest = next(s for s in sources if s[0] == path)
+                    manifest[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                      "sha256": digest, "passages": written[path]}
+                continue
+            try:
+                pages, passages = future.result()
+            except Exception as e:
+                print(f"extraction failed in {path}: {e}", file=sys.stderr)
+                stats["failed"] += 1
+                failed.add(path)
+                if path in written:
+                    # Take the file's earlier passages back out; the next run retries it whole
+                    size, hashes = added.pop(path)
+                    out.truncate(size)
+                    seen.difference_update(hashes)
+                    stats["passages"] -= written.pop(path)
+                continue
+            stats["pages"] += pages
+            if path not in written:
+                written[path] = 0
+                added[path] = (os.fstat(out.fileno()).st_size, [])
+                out.write(f"\n\n{heading_for(path)}\n")
+            for passage in passages:
+                digest = passage_hash(passage)
+                if digest in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(digest)
+                added[path][1].append(digest)
+                out.write(f"* {passage}\n\n")
+                written[path] += 1
+                stats["passages"] += 1
+            out.flush()
+
+    save_manifest(manifest_path, corpus_path, manifest)
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 2)
+    stats["pages_per_second"] = round(stats["pages"] / seconds, 1) if seconds else 0.0
+    # ru_maxrss is in KiB on Linux
+    stats["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    stats["peak_worker_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="folder of .pdf / .docx judgments (searched recursively)")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="corpus file to append to")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPUs)")
+    parser.add_argument("--pages", type=int, default=PAGES_PER_TASK, help="pages per extraction task")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    args = parser.parse_args()
+
+    stats = ingest(args.directory, args.corpus, args.workers, args.pages, args.manifest)
+    print(f"{stats['files']} files ({stats['skipped']} unchanged, {stats['failed']} failed), "
+          f"{stats['pages']} pages -> {stats['passages']} passages ({stats['duplicates']} duplicates) "
+          f"in {stats['seconds']} s, {stats['pages_per_second']} pages/s; "
+          f"peak RSS {stats['peak_rss_mb']} MB (workers {stats['peak_worker_rss_mb']} MB)")
+    if stats["passages"]:
+        print("corpus changed: rebuild the retrieval index with python -m core.retrieval")
+
+
+if __name__ == "__main__":
+    main()
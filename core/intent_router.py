@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local intent router for scripted stage inputs.
+
+Decides, in well under a millisecond, whether a learner's reply at a scripted
+stage is an answer, a yes, a no, a request to clarify the question, an
+off-topic question, or unclear. Only unclear inputs need an LLM call to
+decide; everything else is routed locally.
+
+Two layers:
+
+1. compiled multi-pattern regexes (English + Roman Urdu) for yes/no words,
+   negations, interrogatives and topics that belong to other sessions;
+2. a tiny character/word n-gram Naive Bayes model, trained at import time on
+   the seed phrases below, that separates "learner is answering" from
+   "learner is asking something else" when the patterns alone can't.
+
+``evaluation/intent_fixtures.jsonl`` holds the labelled set and
+``benchmarks/intent_router_bench.py`` reports accuracy and routing latency.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import NamedTuple
+
+ANSWER = "answer"
+YES = "yes"
+NO = "no"
+OFF_TOPIC = "off_topic"
+CLARIFY = "clarify"   # the learner asks what the lesson's question means
+UNCLEAR = "unclear"
+
+LABELS = (ANSWER, YES, NO, CLARIFY, OFF_TOPIC, UNCLEAR)
+
+# What a stage expects from the learner
+EXPECT_ANSWER = "answer"
+EXPECT_YES_NO = "yes_no"
+
+
+class Route(NamedTuple):
+    label: str
+    confidence: float
+    needs_llm: bool
+
+
+# -----------------------------
+# Patterns
+# -----------------------------
+def _alternation(words) -> str:
+    # Longest first so "ji haan" wins over "ji"
+    return "|".join(sorted((re.escape(w).replace(r"\ ", r"\s+") for w in words), key=len, reverse=True))
+
+
+# A reply may go on after these ("yes, it was my planning")
+_YES_WORDS = [
+    "yes", "yeah", "yea", "yep", "yup", "of course", "definitely", "absolutely", "i think so", "ok yes",
+    "haan", "hanji", "haan ji", "ji haan", "jee haan", "bilkul",
+]
+# These also start ordinary sentences ("right now...", "sure I can..."), so they
+# only count as a yes on their own, before punctuation ("right, it was me") or
+# before another yes word ("jee bilkul")
+_YES_ALONE_WORDS = [
+    "sure", "correct", "right", "exactly", "true", "han", "haa", "ji", "jee",
+    "zaroor", "sahi", "theek", "theek hai", "thik hai", "durust", "aho",
+]
+_NO_WORDS = [
+    "no", "nope", "nah", "not really", "not at all", "i don't think so", "i dont think so",
+    "it wasn't", "it was not", "it is not", "not stable", "not myself", "not me",
+    "nahi", "nahin", "nai", "na", "nhi", "ji nahi", "jee nahi", "bilkul nahi", "nahi tha", "nahi hai",
+]
+_UNSURE_WORDS = [
+    "not sure", "maybe", "don't know", "dont know", "i don't know", "idk", "perhaps", "kind of",
+    "no idea", "no clue", "not certain", "hard to say",
+    "pata nahi", "pta nahi", "shayad", "maloom nahi", "kuch kuch", "idea nahi",
+]
+# Questions about the lesson's own question
+_CLARIFY_WORDS = [
+    "what do you mean", "what does that mean", "what does it mean", "what is the question",
+    "understand the question", "understand what you", "understand this question",
+    "can you repeat", "could you repeat", "say that again", "say it again", "explain the question",
+    "samajh nahi", "samajh nahin", "samjha nahi", "samjhi nahi",
+    "kya matlab", "matlab kya", "iska matlab", "dobara batao", "phir se batao",
+]
+_INTERROGATIVES = [
+    "what", "how", "why", "when", "where", "who", "which", "can you", "could you", "tell me",
+    "explain", "is it", "should i", "do you",
+    "kya", "kaise", "kaisay", "kyun", "kyon", "kab", "kahan", "kaun", "kitna", "kitne", "batao",
+    "bataen", "bataiye", "samjhao", "mujhe batao",
+]
+# Topics that belong to other sessions or outside the course
+_OFF_TOPICS = [
+    "stress management", "money management", "digital literacy", "branding", "marketing",
+    "politics", "election", "religion", "weather", "recipe", "cricket", "movie", "drama",
+    "namaz", "prayer", "doctor", "medicine", "fever", "loan", "bank account", "mobile phone",
+    "siyasat", "mazhab", "mausam", "dawai", "dawa", "khana pakana", "barish", "film",
+]
+# Words that keep an input inside the lesson even if it is phrased as a question
+_LESSON_TERMS = [
+    "success", "successful", "fail", "failure", "mistake", "myself", "my own", "planning", "planned",
+    "patience", "patient", "hard work", "effort", "discipline", "skill", "because", "cause",
+    "stable", "role", "mother", "wife", "business", "customer", "order", "sale", "sales", "family",
+    "kamyab", "kamyabi", "nakami", "mehnat", "sabr", "mera", "meri", "maine", "mainay", "apni",
+    "karobar", "dukaan", "bachon", "ghar",
+]
+
+_YES = re.compile(
+    rf"^(?:(?:{_alternation(_YES_WORDS)})\b"
+    rf"|(?:{_alternation(_YES_ALONE_WORDS)})(?:\s*(?:[.,!;:]|$)|\s+(?:{_alternation(_YES_WORDS + _YES_ALONE_WORDS)})\b))",
+    re.IGNORECASE,
+)
+_NO = re.compile(rf"^(?:{_alternation(_NO_WORDS)})\b", re.IGNORECASE)
+_UNSURE = re.compile(rf"\b(?:{_alternation(_UNSURE_WORDS)})\b", re.IGNORECASE)
+# "I don't understand" alone asks about the question; followed by more it is usually an answer
+_CLARIFY = re.compile(
+    rf"\b(?:{_alternation(_CLARIFY_WORDS)})\b|^(?:i\s+)?(?:don'?t|do\s+not|didn'?t)\s+understand\W*$",
+    re.IGNORECASE,
+)
+_QUESTION = re.compile(rf"\?\s*$|^(?:{_alternation(_INTERROGATIVES)})\b", re.IGNORECASE)
+_OFF_TOPIC = re.compile(rf"\b(?:{_alternation(_OFF_TOPICS)})\b", re.IGNORECASE)
+_LESSON = re.compile(rf"\b(?:{_alternation(_LESSON_TERMS)})\b", re.IGNORECASE)
+_WORD = re.compile(r"[a-z']+")
+
+
+# -----------------------------
+# Naive Bayes over n-grams
+# -----------------------------
+_SEED_ANSWERS = [
+    "I sold all my eid suits on time because I planned early",
+    "my stitching orders were finished before the wedding season",
+    "I managed my shop and kids exams in the same week",
+    "because I was patient with the customer",
+    "due to my hard work and good planning",
+    "my mother in law helped with the children",
+    "it was luck, the market was busy that day",
+    "I failed when the electricity went out and orders were late",
+    "I could not deliver the order because my son was sick",
+    "I lost money when the supplier cheated me",
+    "maine apni mehnat se order pura kiya",
+    "meri planning achi thi is liye kamyabi mili",
+    "sabr aur mehnat ki wajah se",
+    "ghar aur dukaan dono sambhale",
+    "customer ne dobara order diya kyun ke quality achi thi",
+    "main ne time pe kaam khatam kiya",
+    "the cause was my discipline",
+    "my own effort and skill",
+    "I stayed calm and organized",
+    "sales dropped because of rain",
+    "that's why I think it was my planning",
+    "I was successful in selling pickles at the school fair",
+    "I think the reason was that I woke up early every day",
+]
+_SEED_QUESTIONS = [
+    "what is the weather today",
+    "how to make biryani",
+    "tell me about politics in pakistan",
+    "can you explain money management",
+    "how do I open a bank account",
+    "what medicine is good for fever",
+    "when is the next cricket match",
+    "who are you",
+    "how to do branding for my shop",
+    "what is digital literacy",
+    "should I pray namaz before work",
+    "kya aap mujhe batao ke loan kaise milta hai",
+    "mausam kaisa hai aaj",
+    "dawai kaun si achi hai",
+    "kya tum insaan ho",
+    "mobile phone kaise chalate hain",
+    "why is the sky blue",
+    "tell me a joke",
+    "where can I watch a drama",
+    "what is the recipe for kheer",
+    "how much does a sewing machine cost",
+    "are you a robot",
+    "can you help me with my stress",
+]
+
+
+def _features(text: str) -> list:
+    text = text.lower()
+    words = _WORD.findall(text)
+    padded = f" {' '.join(words)} "
+    grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return grams + ["w:" + w for w in words] + ["b:" + a + "_" + b for a, b in zip(words, words[1:])]
+
+
+class NGramModel:
+    """Two-class multinomial Naive Bayes with add-one smoothing."""
+
+    def __init__(self, examples_by_label: dict):
+        self.labels = list(examples_by_label)
+        self._counts = {}
+        self._totals = {}
+        vocab = set()
+        for label, examples in examples_by_label.items():
+            counts = Counter()
+            for example in examples:
+                counts.update(_features(example))
+            self._counts[label] = counts
+            self._totals[label] = sum(counts.values())
+            vocab.update(counts)
+        self._vocab_size = len(vocab)
+        total_examples = sum(len(ex) for ex in examples_by_label.values())
+        self._priors = {label: math.log(len(ex) / total_examples) for label, ex in examples_by_label.items()}
+
+    def predict_proba(self, text: str) -> dict:
+        features = _features(text)
+        scores = {}
+        for label in self.labels:
+            counts = self._counts[label]
+            denominator = self._totals[label] + self._vocab_size
+            scores[label] = self._priors[label] + sum(
+                math.log((counts.get(f, 0) + 1) / denominator) for f in features
+            )
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp.values())
+        return {label: value / norm for label, value in exp.items()}
+
+
+_MODEL = NGramModel({ANSWER: _SEED_ANSWERS, OFF_TOPIC: _SEED_QUESTIONS})
+
+# Below/above these off-topic probabilities the model is trusted on its own
+_OFF_TOPIC_HIGH = 0.85
+_OFF_TOPIC_LOW = 0.25
+
+
+# -----------------------------
+# Routing
+# -----------------------------
+def route(text: str, expect: str = EXPECT_ANSWER) -> Route:
+    """Route one stage input. ``expect`` is what the current stage asked for."""
+    text = (text or "").strip()
+    if not _WORD.search(text.lower()):
+        return Route(UNCLEAR, 1.0, True)
+
+    off_topic = _OFF_TOPIC.search(text) is not None
+    in_lesson = _LESSON.search(text) is not None
+    question = _QUESTION.search(text) is not None
+
+    if _CLARIFY.search(text) and not off_topic:
+        return Route(CLARIFY, 0.9, False)
+
+    if expect == EXPECT_YES_NO:
+        if _UNSURE.search(text):
+            return Route(UNCLEAR, 0.7, True)
+        if _NO.search(text):
+            return Route(NO, 0.95, False)
+        if _YES.search(text):
+            return Route(YES, 0.95, False)
+        if off_topic and not in_lesson:
+            return Route(OFF_TOPIC, 0.9, False)
+        if question and not in_lesson:
+            p_off = _MODEL.predict_proba(text)[OFF_TOPIC]
+            if p_off >= _OFF_TOPIC_HIGH:
+                return Route(OFF_TOPIC, p_off, False)
+        # A full sentence about their cause rather than a yes/no
+        return Route(UNCLEAR, 0.5, True)
+
+    if off_topic and not in_lesson:
+        return Route(OFF_TOPIC, 0.9, False)
+    if not question:
+        return Route(ANSWER, 0.9, False)
+    if in_lesson:
+        return Route(ANSWER, 0.8, False)
+
+    p_off = _MODEL.predict_proba(text)[OFF_TOPIC]
+    if p_off >= _OFF_TOPIC_HIGH:
+        return Route(OFF_TOPIC, p_off, False)
+    if p_off <= _OFF_TOPIC_LOW:
+        return Route(ANSWER, 1 - p_off, False)
+    return Route(UNCLEAR, max(p_off, 1 - p_off), True)
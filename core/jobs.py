@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Background LLM jobs, shared thread pool per process.
+
+Stage evaluations used to block the Streamlit script thread. Now a stage
+submits its calls to a process-wide pool, records them as the session's
+pending turn and reruns; while the futures run, the tab shows a "Zara is
+typing…" bubble and a small fragment polls until they are done. Widgets stay
+responsive, and switching topics in the radio no longer throws the work
+away: results are kept for when the learner comes back (or the turn is
+cancelled, with ``ZARA_JOBS_ON_NAVIGATE=cancel``).
+
+Job functions run outside the script thread, so they must not touch
+``st.session_state``; pass them everything they need (model name included).
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from core import admission, telemetry
+
+JOB_WORKERS = int(os.getenv("ZARA_JOB_WORKERS", "32"))
+JOBS_ON_NAVIGATE = os.getenv("ZARA_JOBS_ON_NAVIGATE", "keep")  # "keep" or "cancel"
+POLL_INTERVAL_SECONDS = float(os.getenv("ZARA_JOB_POLL_SECONDS", "0.4"))
+
+# Returned by a tab's poll helper while a turn is still running
+PENDING = object()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="zara-llm")
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    # The job runs in a copy of the caller's context (its telemetry stage) and
+    # knows how long it waited for a worker
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def run():
+        telemetry.set_queue_wait(time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    return get_executor().submit(context.run, run)
+
+
+# -----------------------------
+# Pending turns (one per tab per session)
+# -----------------------------
+class PendingTurn:
+    """A learner input whose LLM work is still running in the pool."""
+
+    def __init__(self, stage, user_input: str, label: str, message_index: int):
+        self.stage = stage
+        self.user_input = user_input
+        self.label = label
+        self.message_index = message_index
+        self.futures = {}
+        self.feedback_stream = None  # core.json_stream.FeedbackStream while feedback is streamed
+        self.restore = {}            # session key -> its value before this turn stored the input
+        self.started_at = time.time()
+
+    def add(self, name: str, future):
+        self.futures[name] = future
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures.values())
+
+    def result(self, name: str, default=None):
+        future = self.futures.get(name)
+        if future is None or future.cancelled():
+            return default
+        try:
+            return future.result()
+        except Exception:
+            return default
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+
+def _turns() -> dict:
+    if "pending_turns" not in st.session_state:
+        st.session_state.pending_turns = {}
+    return st.session_state.pending_turns
+
+
+def start_turn(tab_name: str, turn: PendingTurn):
+    _turns()[tab_name] = turn
+
+
+def get_turn(tab_name: str):
+    return _turns().get(tab_name)
+
+
+def finish_turn(tab_name: str):
+    return _turns().pop(tab_name, None)
+
+
+def on_navigate(active_tab: str):
+    """Apply the navigation policy to turns pending in the other tabs.
+
+    ``active_tab`` is the tab's session name (``tabs.TabSpec.tab``), not its radio label.
+    """
+    if JOBS_ON_NAVIGATE != "cancel":
+        return
+    for tab_name in list(_turns()):
+        if tab_name == active_tab:
+            continue
+        turn = finish_turn(tab_name)
+        turn.cancel()
+        # Drop the unanswered input so the learner can send it again
+        messages = st.session_state.messages.get(tab_name, [])
+        if turn.message_index < len(messages):
+            del messages[turn.message_index:]
+        # and the stage values it stored, as if it had never been sent
+        for key, value in turn.restore.items():
+            st.session_state[key] = value
+
+
+def render_pending(tab_name: str):
+    """Show the typing bubble and rerun the app once the turn's jobs are done."""
+    with st.chat_message("assistant"):
+        st.markdown("_Zara is typing…_")
+
+    # Fragment reruns skip main, so take the session id while it is set
+    sid = admission.current_session()
+
+    @st.fragment(run_every=POLL_INTERVAL_SECONDS)
+    def _watch():
+        turn = get_turn(tab_name)
+        if turn is None or turn.done():
+            st.rerun(scope="app")
+        waiting = admission.wait_message(sid)
+        if waiting:
+            st.caption(waiting)
+
+    _watch()
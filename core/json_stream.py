@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streamed JSON feedback: show the ``feedback`` text while it is generated.
+
+The grading calls reply with ``{"feedback": "...", "is_correct": ...}``.
+They used to run with ``stream=False`` and ``json.loads`` the whole reply, so
+the learner saw nothing until the model had finished. Now (unless
+``ZARA_STREAM_FEEDBACK=0``) the call streams: ``FeedbackParser`` follows the
+JSON as tokens arrive and hands out the decoded ``feedback`` string piece by
+piece, a ``FeedbackStream`` carries those pieces from the job thread to the
+script thread for ``st.write_stream``, and the complete object (with
+``is_correct``) is parsed when its closing brace arrives.
+
+Time to first visible feedback is recorded per call site and mode
+(``stream`` vs ``blocking``) for the admin sidebar;
+``benchmarks/feedback_stream_bench.py`` compares the two against the mock
+server.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from core.model_profiles import request_options
+from core.telemetry import record_json_failure
+
+FEEDBACK_STREAMING = os.getenv("ZARA_STREAM_FEEDBACK", "1") != "0"
+
+
+# -----------------------------
+# Incremental parser
+# -----------------------------
+def _decode_prefix(raw: str) -> str:
+    """Decode as much of a JSON string body as is complete (drops a cut-off escape)."""
+    for cut in range(len(raw), max(-1, len(raw) - 12), -1):
+        try:
+            text = json.loads('"' + raw[:cut] + '"')
+        except ValueError:
+            continue
+        # Half of a surrogate pair: wait for the other half
+        if text and "\ud800" <= text[-1] <= "\udbff":
+            text = text[:-1]
+        return text
+    return ""
+
+
+class FeedbackParser:
+    """Follows one streamed JSON object; ``feed`` returns new text of the ``field`` string."""
+
+    def __init__(self, field: str = "feedback"):
+        self.field = field
+        self.result = None     # the parsed object once it closes
+        self.closed = False
+        self._buffer = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = True
+        self._key = None
+        self._raw = []         # body of the string being read
+        self._streaming = False
+        self._emitted = 0
+
+    def _delta(self) -> str:
+        text = _decode_prefix("".join(self._raw))
+        delta = text[self._emitted:]
+        self._emitted = len(text)
+        return delta
+
+    def feed(self, chunk: str) -> str:
+        out = []
+        for ch in chunk:
+            if self.closed:
+                break
+            if not self._started:
+                # Skip anything before the object (e.g. a ```json fence)
+                if ch != "{":
+                    continue
+                self._started = True
+            self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._streaming:
+                        out.append(self._delta())
+                        self._streaming = False
+                    elif self._depth == 1 and self._expect_key:
+                        self._key = "".join(self._raw)
+                    continue
+                self._raw.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                self._raw = []
+                self._streaming = self._depth == 1 and not self._expect_key and self._key == self.field
+                self._emitted = 0
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.closed = True
+                    self.result = json.loads("".join(self._buffer))
+            elif self._depth == 1 and ch == ":":
+                self._expect_key = False
+            elif self._depth == 1 and ch == ",":
+                self._expect_key = True
+                self._key = None
+
+        if self._streaming:
+            out.append(self._delta())
+        return "".join(out)
+
+
+# -----------------------------
+# Job thread -> script thread
+# -----------------------------
+class FeedbackStream:
+    """Feedback text pieces produced in the job pool, replayable by every rerun."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_visible_at = None
+        self._chunks = []
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def push(self, text: str):
+        if not text:
+            return
+        with self._cond:
+            if self.first_visible_at is None:
+                self.first_visible_at = time.perf_counter()
+            self._chunks.append(text)
+            self._cond.notify_all()
+
+    def finish(self, feedback: str = None):
+        """Close the stream; a cached or fallback reply that never streamed is sent whole."""
+        with self._cond:
+            empty = not self._chunks
+        if empty and feedback:
+            self.push(feedback)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def text(self) -> str:
+        """Everything pushed so far: what the learner has been shown."""
+        with self._cond:
+            return "".join(self._chunks)
+
+    def deltas(self):
+        """Yield every piece from the start, blocking until the stream closes."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._closed:
+                    self._cond.wait()
+                pieces = self._chunks[index:]
+                closed = self._closed
+            yield from pieces
+            index += len(pieces)
+            if closed and index >= len(self._chunks):
+                return
+
+
+def stream_json_feedback(client, model: str, messages, stream: FeedbackStream, call_site: str) -> dict:
+    """Streaming replacement for ``json.loads(create(stream=False))`` on a feedback call."""
+    response = client.chat.completions.create(
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        call_site=call_site,
+        **request_options(call_site, model),
+    )
+    parser = FeedbackParser()
+    raw = []
+    try:
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                text = chunk.choices[0].delta.content
+                raw.append(text)
+                stream.push(parser.feed(text))
+        # is_correct is only known once the object has closed
+        return parser.result if parser.closed else json.loads("".join(raw))
+    except ValueError:
+        record_json_failure(call_site)
+        raise
+
+
+# -----------------------------
+# Time to first visible feedback
+# -----------------------------
+_latency_lock = threading.Lock()
+_latencies = defaultdict(list)
+_MAX_SAMPLES = 1000
+
+
+def record_visible_latency(call_site: str, streamed: bool, seconds: float):
+    with _latency_lock:
+        samples = _latencies[(call_site, "stream" if streamed else "blocking")]
+        samples.append(seconds)
+        del samples[:-_MAX_SAMPLES]
+
+
+def visible_latency_stats() -> dict:
+    with _latency_lock:
+        snapshot = {key: sorted(values) for key, values in _latencies.items()}
+    stats = {}
+    for (call_site, mode), values in snapshot.items():
+        stats[f"{call_site}/{mode}"] = {
+            "count": len(values),
+            "p50_ms": round(values[len(values) // 2] * 1000, 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+        }
+    return stats
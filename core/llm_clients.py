@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide LLM client registry.
+
+Streamlit re-runs ``main.main`` on every interaction, so building a fresh
+``OpenAI`` client there throws away keep-alive connections and repeats the
+TLS handshake for every call. The registry is built once per process
+(``main.get_client_registry`` caches it with ``st.cache_resource``) and
+every session shares its pooled HTTP connections.
+
+Groq is reached through its OpenAI-compatible endpoint with the same SDK, so
+both providers return the same response types and errors and can sit behind
+one ``LLMRouter`` (``registry.router``).
+"""
+
+import os
+import threading
+
+import httpx
+from openai import OpenAI
+
+from core.admission import get_admission_controller
+from core.llm_router import LLMRouter, Provider
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# -----------------------------
+# Pool settings (override with env vars)
+# -----------------------------
+POOL_MAX_CONNECTIONS = int(os.getenv("ZARA_POOL_MAX_CONNECTIONS", "64"))
+POOL_MAX_KEEPALIVE = int(os.getenv("ZARA_POOL_MAX_KEEPALIVE", "32"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("ZARA_POOL_KEEPALIVE_EXPIRY", "60"))
+REQUEST_TIMEOUT = float(os.getenv("ZARA_REQUEST_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("ZARA_CONNECT_TIMEOUT", "5"))
+
+GROQ_BASE_URL = os.getenv("ZARA_GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+GROQ_MODEL = os.getenv("ZARA_GROQ_MODEL", "llama-3.3-70b-versatile")
+
+
+# -----------------------------
+# Transport that tracks pool usage
+# -----------------------------
+class _TrackedStream(httpx.SyncByteStream):
+    """Response body wrapper that releases the in-flight slot when closed."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class _RequestTrace:
+    """httpcore ``trace`` callback for one request: its first event means it has a connection."""
+
+    __slots__ = ("_transport", "_outer", "assigned")
+
+    def __init__(self, transport, outer=None):
+        self._transport = transport
+        self._outer = outer
+        self.assigned = False
+
+    def __call__(self, name: str, info: dict):
+        if not self.assigned:
+            self.assigned = True
+            self._transport._assigned(new_connection=".connect_tcp." in name)
+        if self._outer is not None:
+            self._outer(name, info)
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """HTTP transport that counts in-flight and waiting requests on top of httpcore's pool.
+
+    A request is in flight from the moment it is handed to the pool until its
+    response body is closed, which for streamed completions is the end of the
+    stream. It is waiting until the pool gives it a connection. That moment
+    is taken from httpcore's ``trace`` request extension (the first event a
+    request sees is on its connection), so no pool internals are read: a
+    request that opens a connection starts with ``connect_tcp``, one that
+    reuses a kept-alive connection with sending its headers. Open and idle
+    connections come from the pool's public ``connections`` list; idle ones
+    are what keep-alive is holding for the next burst of sessions.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._peak_in_flight = 0
+        self._total_requests = 0
+        self._connections_opened = 0
+        self._reused = 0
+
+    def _assigned(self, new_connection: bool):
+        with self._lock:
+            self._waiting -= 1
+            if new_connection:
+                self._connections_opened += 1
+            else:
+                self._reused += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def handle_request(self, request):
+        trace = _RequestTrace(self, request.extensions.get("trace"))
+        request.extensions = {**request.extensions, "trace": trace}
+        with self._lock:
+            self._in_flight += 1
+            self._waiting += 1
+            self._total_requests += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            with self._lock:
+                if not trace.assigned:
+                    trace.assigned = True
+                    self._waiting -= 1
+            self._release()
+            raise
+        response.stream = _TrackedStream(response.stream, self._release)
+        return response
+
+    def stats(self) -> dict:
+        connections = list(self._pool.connections)
+        with self._lock:
+            return {
+                "connections": len(connections),
+                "idle": sum(1 for connection in connections if connection.is_idle()),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "peak_in_flight": self._peak_in_flight,
+                "total_requests": self._total_requests,
+                "connections_opened": self._connections_opened,
+                "reused_connections": self._reused,
+            }
+
+
+def build_transport() -> PooledTransport:
+    """A bounded keep-alive pool for one upstream host."""
+    limits = httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+    return PooledTransport(limits=limits, http2=HTTP2_AVAILABLE, retries=1)
+
+
+def build_http_client(transport: PooledTransport = None) -> httpx.Client:
+    """Build an httpx client on ``transport`` (a new pool by default)."""
+    return httpx.Client(
+        transport=transport or build_transport(),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+class ClientRegistry:
+    """One pooled client per provider, shared by every session in the process."""
+
+    def __init__(self, openai_api_key: str, groq_api_key: str = None, openai_base_url: str = None,
+                 groq_base_url: str = GROQ_BASE_URL, groq_model: str = GROQ_MODEL):
+        self._transports = {}
+        self._http_clients = {}
+
+        self._transports["openai"] = build_transport()
+        self._http_clients["openai"] = build_http_client(self._transports["openai"])
+        self.openai = OpenAI(
+            api_key=openai_api_key,
+            base_url=openai_base_url,
+            http_client=self._http_clients["openai"],
+        )
+
+        self.groq = None
+        if groq_api_key:
+            self._transports["groq"] = build_transport()
+            self._http_clients["groq"] = build_http_client(self._transports["groq"])
+            self.groq = OpenAI(api_key=groq_api_key, base_url=groq_base_url, http_client=self._http_clients["groq"])
+
+        # The router does its own retries across providers; the SDK's would stack on top
+        providers = [Provider("openai", self.openai.with_options(max_retries=0))]
+        if self.groq is not None:
+            providers.append(Provider("groq", self.groq.with_options(max_retries=0), model=groq_model))
+        # One admission queue per process in front of both providers (see core.admission)
+        self.router = LLMRouter(providers, admission=get_admission_controller())
+
+    def pool_stats(self) -> dict:
+        """Return in-flight / idle / waiting counts and connection reuse for each provider's pool."""
+        return {name: transport.stats() for name, transport in self._transports.items()}
+
+    def close(self):
+        self.router.close()
+        for http_client in self._http_clients.values():
+            http_client.close()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latency-aware routing over the OpenAI and Groq clients.
+
+Every call used to go to OpenAI alone: when it slowed down, each session
+waited for the full timeout and the tabs fell back to canned replies. The
+router sits behind the same ``client.chat.completions.create(...)`` call the
+tabs already make and, per call:
+
+- takes the providers whose circuit breaker lets traffic through in the
+  configured order, so the primary (and its model and reasoning settings)
+  serves every call it can. ``ZARA_ROUTER_POLICY=latency`` orders them by
+  EWMA latency penalised by the EWMA error rate instead. That EWMA is per
+  provider and call kind (stream or full), not per call site, so the policy
+  suits providers serving comparable models; a provider without samples is
+  assumed as fast as the primary, not faster;
+- sends the request to the first one and, if it has not answered after
+  that provider's recent p95 latency, sends a hedged duplicate to the next
+  one; the first success wins and a losing stream is closed;
+- retries retryable failures (timeouts, connection errors, 429, 5xx) a
+  bounded number of times with full-jitter exponential backoff.
+
+A breaker opens after ``ZARA_BREAKER_FAILURES`` consecutive failures, stays
+open for ``ZARA_BREAKER_COOLDOWN_SECONDS`` and then lets a single probe
+through (half-open): success closes it, failure opens it again. Latency for
+streams is time to the first chunk, so hedging also covers slow first tokens.
+
+With an ``admission`` controller (``core.admission``), a call first waits
+for its ticket there; retries and hedges go out under the same ticket.
+
+Each call is recorded in ``core.telemetry`` under the ``call_site`` keyword
+(the router takes it off before the request goes out).
+
+``benchmarks/router_bench.py`` exercises all of this against two local mock
+servers with injected slowness and failures.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from core import telemetry
+from core.admission import current_session
+
+ROUTER_POLICY = os.getenv("ZARA_ROUTER_POLICY", "priority")  # "priority" or "latency"
+HEDGING_ENABLED = os.getenv("ZARA_HEDGE", "1") != "0"
+HEDGE_DEFAULT_DELAY = float(os.getenv("ZARA_HEDGE_DELAY_SECONDS", "3.0"))  # until p95 is known
+HEDGE_MIN_DELAY = float(os.getenv("ZARA_HEDGE_MIN_DELAY_SECONDS", "0.3"))
+HEDGE_MIN_SAMPLES = 10
+RETRIES = int(os.getenv("ZARA_LLM_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("ZARA_LLM_BACKOFF_SECONDS", "0.2"))
+BACKOFF_CAP = 2.0
+ATTEMPT_TIMEOUT = float(os.getenv("ZARA_LLM_ATTEMPT_TIMEOUT", "30"))
+BREAKER_FAILURES = int(os.getenv("ZARA_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("ZARA_BREAKER_COOLDOWN_SECONDS", "30"))
+
+EWMA_ALPHA = 0.2
+# Assumed latency when no provider has samples yet (keeps the configured order)
+_PRIOR_LATENCY = 1.0
+_WINDOW = 200
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class NoProviderAvailable(RuntimeError):
+    """Every provider's circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (NoProviderAvailable, openai.APITimeoutError, openai.APIConnectionError,
+                          httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+# -----------------------------
+# Per-provider health
+# -----------------------------
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """Would ``allow`` let a request through? (Does not take the probe slot.)"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return self.state == CLOSED or not self._probing
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class Provider:
+    """One upstream: an OpenAI-compatible client, an optional model override, and its health."""
+
+    def __init__(self, name: str, client, model: str = None):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self._ewma = {}                 # "stream" / "full" -> seconds
+        self._samples = {"stream": deque(maxlen=_WINDOW), "full": deque(maxlen=_WINDOW)}
+        self.error_rate = 0.0
+        self.counters = {"requests": 0, "failures": 0, "hedges": 0, "backup_wins": 0}
+
+    def record(self, kind: str, seconds: float = None, error: bool = False):
+        with self._lock:
+            self.counters["requests"] += 1
+            self.error_rate += EWMA_ALPHA * ((1.0 if error else 0.0) - self.error_rate)
+            if error:
+                self.counters["failures"] += 1
+            else:
+                previous = self._ewma.get(kind)
+                self._ewma[kind] = seconds if previous is None else previous + EWMA_ALPHA * (seconds - previous)
+                self._samples[kind].append(seconds)
+        if error:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def latency(self, kind: str):
+        with self._lock:
+            return self._ewma.get(kind)
+
+    def score(self, kind: str, prior: float = _PRIOR_LATENCY) -> float:
+        """EWMA latency penalised by errors; ``prior`` stands in until there are samples."""
+        with self._lock:
+            latency = self._ewma.get(kind, prior)
+            return latency * (1 + 4 * self.error_rate)
+
+    def p95(self, kind: str):
+        with self._lock:
+            samples = sorted(self._samples[kind])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def stats(self) -> dict:
+        p95 = {kind: self.p95(kind) for kind in self._samples}
+        with self._lock:
+            return {
+                "breaker": self.breaker.state,
+                "ewma_ms": {kind: round(value * 1000, 1) for kind, value in self._ewma.items()},
+                "p95_ms": {kind: round(value * 1000, 1) for kind, value in p95.items() if value is not None},
+                "error_rate": round(self.error_rate, 3),
+                **self.counters,
+            }
+
+
+# -----------------------------
+# Streams
+# -----------------------------
+class _ResumedStream:
+    """A chat stream whose first chunk was already read (to time it).
+
+    ``on_done(usage)`` is called once, when the stream ends or is closed.
+    """
+
+    def __init__(self, stream, first):
+        self._stream = stream
+        self._first = first
+        self._usage = None
+        self.on_done = None
+
+    def __iter__(self):
+        try:
+            if self._first is not None:
+                yield self._note(self._first)
+            for chunk in self._stream:
+                yield self._note(chunk)
+        finally:
+            self._done()
+
+    def _note(self, chunk):
+        if getattr(chunk, "usage", None) is not None:
+            self._usage = chunk.usage
+        return chunk
+
+    def _done(self):
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done(self._usage)
+
+    def close(self):
+        self._stream.close()
+        self._done()
+
+    def __del__(self):
+        # A stream dropped without being read to the end still finishes its call
+        # (and gives back its admission slot)
+        self._done()
+
+
+def _discard(future):
+    """Close a losing hedged stream once it arrives."""
+    try:
+        result = future.result()
+    except Exception:
+        return
+    if isinstance(result, _ResumedStream):
+        result.close()
+
+
+# -----------------------------
+# Router
+# -----------------------------
+class LLMRouter:
+    """Drop-in for ``client.chat.completions.create`` over several providers."""
+
+    def __init__(self, providers, policy: str = ROUTER_POLICY, hedging: bool = HEDGING_ENABLED,
+                 retries: int = RETRIES, admission=None):
+        self.providers = list(providers)
+        self.admission = admission
+        self.policy = policy
+        self.hedging = hedging
+        self.retries = retries
+        self._pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="zara-hedge")
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _ordered(self, kind: str, exclude=()):
+        candidates = [p for p in self.providers if p.name not in exclude and p.breaker.available()]
+        if self.policy == "latency":
+            # An unsampled provider is scored like the primary, so the sort is
+            # stable for it until its own samples say otherwise
+            prior = self.providers[0].latency(kind) or _PRIOR_LATENCY
+            candidates.sort(key=lambda p: p.score(kind, prior))
+        return candidates
+
+    def _attempt(self, provider: Provider, kwargs: dict):
+        kind = "stream" if kwargs.get("stream") else "full"
+        args = dict(kwargs)
+        if provider.model:
+            args["model"] = provider.model
+            # Profiles tune reasoning effort for the primary's model family only
+            args.pop("reasoning_effort", None)
+        args.setdefault("timeout", ATTEMPT_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            result = provider.client.chat.completions.create(**args)
+            if kind == "stream":
+                stream = iter(result)
+                result = _ResumedStream(result, next(stream, None))
+        except Exception:
+            provider.record(kind, error=True)
+            raise
+        provider.record(kind, time.perf_counter() - started)
+        return result
+
+    def _launch(self, candidates, pending: dict, kwargs: dict) -> bool:
+        """Start the next candidate whose breaker lets it through."""
+        while candidates:
+            provider = candidates.pop(0)
+            if provider.breaker.allow():
+                pending[self._pool.submit(self._attempt, provider, kwargs)] = provider
+                return True
+        return False
+
+    def _hedged(self, candidates, kwargs: dict, tried: set):
+        kind = "stream" if kwargs.get("stream") else "full"
+        pending = {}
+        if not self._launch(candidates, pending, kwargs):
+            raise NoProviderAvailable("no LLM provider available")
+        primary = next(iter(pending.values()))
+        delay = primary.p95(kind) or HEDGE_DEFAULT_DELAY
+        delay = max(HEDGE_MIN_DELAY, delay)
+        hedged = not self.hedging
+        error = None
+
+        while pending:
+            timeout = None if hedged or not candidates else delay
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than its p95: race a duplicate on the next provider
+                hedged = True
+                if self._launch(candidates, pending, kwargs):
+                    list(pending.values())[-1].count("hedges")
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                tried.add(provider.name)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    if not is_retryable(e):
+                        for other in pending:
+                            other.add_done_callback(_discard)
+                        raise
+                    if not pending:
+                        # Failed before the hedge fired: fail over right away
+                        hedged = True
+                        self._launch(candidates, pending, kwargs)
+                    continue
+                if provider is not primary:
+                    provider.count("backup_wins")
+                for other in pending:
+                    other.add_done_callback(_discard)
+                return provider, result
+        raise error
+
+    def create(self, call_site: str = None, **kwargs):
+        if self.admission is None:
+            return self._create(call_site, kwargs)
+        ticket = self.admission.admit(call_site, kwargs)
+        try:
+            result = self._create(call_site, kwargs)
+        except BaseException:
+            self.admission.release(ticket)
+            raise
+        if isinstance(result, _ResumedStream):
+            # The slot is held until the stream ends
+            finish = result.on_done
+
+            def on_done(usage):
+                self.admission.release(ticket, usage)
+                finish(usage)
+
+            result.on_done = on_done
+        else:
+            self.admission.release(ticket, getattr(result, "usage", None))
+        return result
+
+    def _create(self, call_site: str, kwargs: dict):
+        kind = "stream" if kwargs.get("stream") else "full"
+        call = telemetry.start_call(call_site, kwargs.get("model"), current_session())
+        tried = set()
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                call.retries += 1
+                # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+                time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+            candidates = self._ordered(kind, exclude=tried) or self._ordered(kind)
+            try:
+                provider, result = self._hedged(candidates, kwargs, tried)
+            except Exception as e:
+                if not is_retryable(e):
+                    call.finish(error=e)
+                    raise
+                error = e
+                continue
+            call.provider = provider.name
+            if kind == "stream":
+                # The first chunk has been read already
+                call.first_token()
+                result.on_done = call.finish
+            else:
+                call.finish(getattr(result, "usage", None))
+            return result
+        call.finish(error=error)
+        raise error
+
+    def stats(self) -> dict:
+        stats = {provider.name: provider.stats() for provider in self.providers}
+        if self.admission is not None:
+            stats["admission"] = self.admission.stats()
+        return stats
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
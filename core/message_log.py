@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact per-session transcripts.
+
+Each tab's transcript used to be a list of ``{"role", "content"}`` dicts:
+a dict (and its list slot) per message on top of the text. A session
+restored from the session store also held its own copies of the
+multi-kilobyte system prompt and the long scripted lesson messages. A
+``MessageLog`` keeps two array columns instead, one role byte and one 32-bit
+text reference per message:
+
+- system prompts and the texts registered with ``intern_texts`` (the flows
+  register their scripted messages when compiled) are stored once per
+  process and referenced by id;
+- every other text (learner input, replies) sits in the log's own list and
+  is referenced by position.
+
+The log still reads like the old list (``len``, indexing, slicing,
+iteration, ``append``/``extend`` of message dicts, ``del log[i:]``); the
+dicts are built only when a message is read. ``turns`` gives
+``build_context`` a lazy view of the conversation without the system and
+scripted messages, so a freeform turn only builds dicts for the messages it
+sends. ``benchmarks/message_log_bench.py`` measures bytes per session.
+"""
+
+import threading
+from array import array
+
+ROLES = ("system", "user", "assistant")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+_SYSTEM = _ROLE_CODES["system"]
+_ASSISTANT = _ROLE_CODES["assistant"]
+
+_texts = []       # id -> the one shared copy
+_text_ids = {}    # text -> id
+_intern_lock = threading.Lock()
+
+
+def intern_text(text: str) -> int:
+    """Register ``text`` as shared (idempotent); returns its id."""
+    text_id = _text_ids.get(text)
+    if text_id is None:
+        with _intern_lock:
+            text_id = _text_ids.get(text)
+            if text_id is None:
+                text_id = len(_texts)
+                _texts.append(text)
+                _text_ids[text] = text_id
+    return text_id
+
+
+def intern_texts(texts):
+    for text in texts:
+        intern_text(text)
+
+
+class MessageLog:
+    """A transcript stored as columns; reads and appends like a list of message dicts."""
+
+    __slots__ = ("_roles", "_refs", "_own")
+
+    def __init__(self, messages=()):
+        self._roles = bytearray()
+        self._refs = array("i")  # >= 0: shared text id; < 0: ~position in _own
+        self._own = []
+        self.extend(messages)
+
+    def _ref(self, code: int, content: str) -> int:
+        if code == _SYSTEM:
+            # Few distinct system prompts, each multi-kilobyte: always share them
+            return intern_text(content)
+        text_id = _text_ids.get(content)
+        if text_id is not None:
+            return text_id
+        self._own.append(content)
+        return ~(len(self._own) - 1)
+
+    def _text(self, ref: int) -> str:
+        return _texts[ref] if ref >= 0 else self._own[~ref]
+
+    def _message(self, index: int) -> dict:
+        return {"role": ROLES[self._roles[index]], "content": self._text(self._refs[index])}
+
+    # -- list interface -----------------------------------------------------
+    def append(self, message: dict):
+        code = _ROLE_CODES[message["role"]]
+        self._refs.append(self._ref(code, message["content"]))
+        self._roles.append(code)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._message(i) for i in range(*index.indices(len(self)))]
+        return self._message(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._message(i)
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self._message(i)
+
+    def __delitem__(self, index):
+        start, stop, step = (index if isinstance(index, slice) else slice(index, index + 1 or None)).indices(len(self))
+        if step != 1 or stop != len(self):
+            # Only the tail is ever dropped (a cancelled turn); anything else rebuilds
+            messages = list(self)
+            del messages[index]
+            self.__init__(messages)
+            return
+        own = [~ref for ref in self._refs[start:] if ref < 0]
+        del self._roles[start:]
+        del self._refs[start:]
+        if own:
+            del self._own[min(own):]
+
+    def __repr__(self) -> str:
+        return f"MessageLog({len(self)} messages)"
+
+    # -- cheap reads ----------------------------------------------------------
+    def role(self, index: int) -> str:
+        return ROLES[self._roles[index]]
+
+    def content(self, index: int) -> str:
+        return self._text(self._refs[index])
+
+    def texts(self, include_system: bool = False):
+        """Message texts in order, without building dicts."""
+        for code, ref in zip(self._roles, self._refs):
+            if include_system or code != _SYSTEM:
+                yield self._text(ref)
+
+    def turns(self, scripted=frozenset()):
+        """``(view, dropped)``: the non-system messages minus scripted assistant lines, lazily."""
+        scripted_ids = {_text_ids[text] for text in scripted if text in _text_ids}
+        indices = []
+        dropped = 0
+        for i, (code, ref) in enumerate(zip(self._roles, self._refs)):
+            if code == _SYSTEM:
+                continue
+            if code == _ASSISTANT and (ref in scripted_ids if ref >= 0 else self._own[~ref] in scripted):
+                dropped += 1
+                continue
+            indices.append(i)
+        return Turns(self, indices), dropped
+
+
+class Turns:
+    """Selected messages of a ``MessageLog``; dicts are built on access."""
+
+    __slots__ = ("_log", "_indices")
+
+    def __init__(self, log: MessageLog, indices):
+        self._log = log
+        self._indices = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Turns(self._log, self._indices[index])
+        return self._log[self._indices[index]]
+
+    def __iter__(self):
+        for i in self._indices:
+            yield self._log[i]
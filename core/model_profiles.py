@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-call-site model profiles.
+
+Every call used to go out as ``model=st.session_state["openai_model"]`` with
+the model's default reasoning effort, so a one-line JSON grade paid the same
+reasoning latency as a long freeform chat. A ``Profile`` names the model,
+reasoning effort, output-token cap and timeout for a kind of call, and each
+call site (the same names the usage accounting in ``core.prompts`` uses) is
+assigned one.
+
+The built-in table below can be replaced by a JSON file named by
+``ZARA_MODEL_PROFILES``, read once at import::
+
+    {
+      "profiles": {"grading": {"model": "gpt-4.1-mini", "max_output_tokens": 400}},
+      "call_sites": {"ri_qualities": "grading"}
+    }
+
+Entries in the file are merged over the built-ins. A profile without a
+``model`` uses the session's model. ``benchmarks/profile_bench.py`` replays
+recorded stage inputs through each profile to compare them.
+"""
+
+import json
+import os
+from typing import NamedTuple
+
+PROFILES_PATH = os.getenv("ZARA_MODEL_PROFILES")
+
+
+class Profile(NamedTuple):
+    name: str
+    model: str = None                # None: the session's model
+    reasoning_effort: str = None     # "minimal" / "low" / "medium" / "high"; None: model default
+    max_output_tokens: int = None    # includes reasoning tokens on reasoning models
+    timeout: float = None            # seconds; None: the client's default
+
+
+DEFAULT_PROFILES = {
+    "default": Profile("default"),
+    # Short JSON replies: grading and intent labels
+    "grading": Profile("grading", reasoning_effort="low", max_output_tokens=2000, timeout=20),
+    "classify": Profile("classify", reasoning_effort="low", max_output_tokens=1000, timeout=10),
+    # Off-topic answers in the middle of a lesson: a few lines, soon
+    "quick_chat": Profile("quick_chat", reasoning_effort="low", max_output_tokens=2000, timeout=20),
+    "chat": Profile("chat", reasoning_effort="medium", max_output_tokens=4000, timeout=60),
+    "summary": Profile("summary", reasoning_effort="low", max_output_tokens=2000, timeout=30),
+    # Speech to text of a few seconds of audio (the model comes from core.voice)
+    "transcription": Profile("transcription", max_output_tokens=200, timeout=20),
+}
+
+DEFAULT_CALL_SITES = {
+    "success_reflection": "grading",
+    "attribution_analysis": "grading",
+    "ri_qualities": "grading",
+    "intent": "classify",
+    "reflection_open_ended": "quick_chat",
+    "reflection_chat": "chat",
+    "roles_chat": "chat",
+    "context_summary": "summary",
+    "voice_transcription": "transcription",
+}
+
+
+def load_profiles(path: str = None):
+    """Built-in profiles and call-site assignments, with the JSON file at ``path`` merged over them."""
+    profiles = dict(DEFAULT_PROFILES)
+    call_sites = dict(DEFAULT_CALL_SITES)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        for name, fields in (config.get("profiles") or {}).items():
+            profiles[name] = Profile(name, **fields)
+        call_sites.update(config.get("call_sites") or {})
+    for call_site, name in call_sites.items():
+        if name not in profiles:
+            raise ValueError(f"call site {call_site!r} uses unknown profile {name!r}")
+    return profiles, call_sites
+
+
+_profiles, _call_sites = load_profiles(PROFILES_PATH)
+
+
+def get_profiles() -> dict:
+    return dict(_profiles)
+
+
+def profile_for(call_site: str) -> Profile:
+    return _profiles[_call_sites.get(call_site, "default")]
+
+
+def assign(call_site: str, profile_name: str):
+    """Point ``call_site`` at another profile (the A/B benchmark switches profiles this way)."""
+    if profile_name not in _profiles:
+        raise KeyError(profile_name)
+    _call_sites[call_site] = profile_name
+
+
+def request_options(call_site: str, model: str) -> dict:
+    """Keyword arguments for ``chat.completions.create`` at ``call_site``.
+
+    ``model`` is the session's model, used when the profile names none. Only
+    request parameters are returned, so the options also suit a bare OpenAI
+    client; callers on ``LLMRouter`` pass ``call_site=`` themselves.
+    """
+    profile = profile_for(call_site)
+    options = {"model": profile.model or model}
+    if profile.reasoning_effort:
+        options["reasoning_effort"] = profile.reasoning_effort
+    if profile.max_output_tokens:
+        options["max_completion_tokens"] = profile.max_output_tokens
+    if profile.timeout:
+        options["timeout"] = profile.timeout
+    return options
+
+
+def profile_stats() -> dict:
+    """Call site -> profile settings, for the admin sidebar."""
+    return {call_site: profile_for(call_site)._asdict() for call_site in sorted(_call_sites)}
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prompt registry with a cache-friendly layout, plus prompt-cache accounting.
+
+Provider prefix caching only kicks in when the start of a request is
+byte-identical to an earlier one. Each prompt is therefore split into a
+static ``prefix`` (sent as the system message, never formatted) and a
+variable ``tail`` (the learner's input, sent as the following user message),
+so every call to the same prompt starts with the same bytes.
+
+Token usage is recorded once, by ``LLMRouter`` in ``core.telemetry``;
+``usage_stats`` reads it back per call site so the admin sidebar can show
+how many prompt tokens the provider served from its cache. OpenAI only
+caches prompts of 1024+ tokens; shorter prefixes report 0.
+"""
+
+from core import telemetry
+
+
+class Prompt:
+    """A static system prefix and an optional ``str.format`` tail for the user message."""
+
+    def __init__(self, name: str, prefix: str, tail: str = None):
+        self.name = name
+        self.prefix = prefix
+        self.tail = tail
+
+    @property
+    def text(self) -> str:
+        """Full template text; response cache versions hash this."""
+        return self.prefix + (self.tail or "")
+
+    def messages(self, **values):
+        messages = [{"role": "system", "content": self.prefix}]
+        if self.tail is not None:
+            messages.append({"role": "user", "content": self.tail.format(**values)})
+        return messages
+
+
+_PROMPTS = {}
+
+
+def register(name: str, prefix: str, tail: str = None) -> Prompt:
+    prompt = Prompt(name, prefix, tail)
+    _PROMPTS[name] = prompt
+    return prompt
+
+
+def get_prompt(name: str) -> Prompt:
+    return _PROMPTS[name]
+
+
+def registered_prompts() -> dict:
+    return dict(_PROMPTS)
+
+
+# -----------------------------
+# Streams and usage
+# -----------------------------
+def stream_text(stream):
+    """Yield the text of a chat stream (for ``st.write_stream``).
+
+    The router records the stream's usage chunk, so create it with
+    ``stream_options={"include_usage": True}``.
+    """
+    for chunk in stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+def usage_stats() -> dict:
+    """Prompt-cache view of ``telemetry.token_usage()``, per call site (empty with ``ZARA_METRICS=0``)."""
+    stats = {}
+    for call_site, site in telemetry.token_usage().items():
+        prompt_tokens = site["prompt"]
+        stats[call_site] = {
+            "calls": site["calls"],
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": site["cached"],
+            "completion_tokens": site["completion"],
+            "uncached_tokens": prompt_tokens - site["cached"],
+            "cached_ratio": round(site["cached"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+        }
+    return stats
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent response cache for the JSON grading calls.
+
+Learners often type the same short answers ("yes", "patience, planning",
+"Mother, Wife"), so the grading calls are cached on disk in SQLite, keyed on
+model + prompt id + prompt version + normalized input. Editing a prompt
+changes its version hash, so old entries are never served for the new text.
+
+Identical requests that arrive while the first one is still in flight (for
+example from two sessions in the same class) wait for that one upstream call
+instead of sending their own.
+
+The cache never fails a request: a read that errors (e.g. "database is
+locked" from another process) counts as a miss, and a value that cannot be
+stored is still returned to its caller and every waiting one.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Settings (override with env vars)
+# -----------------------------
+CACHE_DIR = os.getenv(
+    "ZARA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+CACHE_MAX_ENTRIES = int(os.getenv("ZARA_CACHE_MAX_ENTRIES", "50000"))
+CACHE_TTL_SECONDS = float(os.getenv("ZARA_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_ENABLED = os.getenv("ZARA_CACHE_DISABLED", "") == ""
+
+# Bump when the shape of cached values changes.
+CACHE_SCHEMA_VERSION = "1"
+
+# Only check the size limit every N writes; a COUNT(*) per write is wasteful.
+_EVICT_EVERY = 100
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_input(text: str) -> str:
+    """Fold case, unicode forms, whitespace and trailing punctuation."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.strip(" .!?,;:")
+
+
+def prompt_version(prompt_text: str) -> str:
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(model: str, prompt_id: str, prompt_text: str, user_input: str) -> str:
+    raw = "\x1f".join([
+        CACHE_SCHEMA_VERSION,
+        model,
+        prompt_id,
+        prompt_version(prompt_text),
+        normalize_input(user_input),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class ResponseCache:
+    """SQLite-backed LRU + TTL cache with in-flight request coalescing."""
+
+    def __init__(self, path: str, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+
+        self._db_lock = threading.Lock()
+        self._inflight_lock = threading.Lock()
+        self._inflight = {}
+        self._writes = 0
+        self._counters = {
+            "hits": 0, "misses": 0, "coalesced": 0,
+            "stores": 0, "expired": 0, "evicted": 0, "errors": 0,
+            "read_errors": 0, "write_errors": 0,
+        }
+
+    def _count(self, name: str, n: int = 1):
+        with self._inflight_lock:
+            self._counters[name] += n
+
+    # -- storage --------------------------------------------------------
+    def get(self, key: str):
+        """The live value under ``key``, or None (also when the read fails)."""
+        try:
+            return self._get(key)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("response cache read failed: %s", e)
+            self._count("read_errors")
+            return None
+
+    def _get(self, key: str):
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count("expired")
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def put(self, key: str, value):
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict_locked()
+        self._count("stores")
+
+    def _evict_locked(self):
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._count("evicted", overflow)
+
+    # -- lookup with coalescing -----------------------------------------
+    def get_or_compute(self, model: str, prompt_id: str, prompt_text: str, user_input: str,
+                       compute, should_cache=None):
+        """Return the cached value or run ``compute()`` once for all concurrent callers.
+
+        ``should_cache(value)`` can veto storing a value (e.g. a fallback reply);
+        exceptions from ``compute`` are re-raised in every waiting caller and
+        nothing is stored.
+        """
+        key = make_key(model, prompt_id, prompt_text, user_input)
+
+        cached = self.get(key)
+        if cached is not None:
+            self._count("hits")
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._counters["misses"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+        # Waiting callers get the value before the write, which may fail
+        future.set_result(value)
+        try:
+            if should_cache is None or should_cache(value):
+                self.put(key, value)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("response cache write failed: %s", e)
+            self._count("write_errors")
+        return value
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        with self._inflight_lock:
+            counters = dict(self._counters)
+            counters["in_flight"] = len(self._inflight)
+        lookups = counters["hits"] + counters["misses"] + counters["coalesced"]
+        counters["entries"] = entries
+        counters["hit_rate"] = round((counters["hits"] + counters["coalesced"]) / lookups, 3) if lookups else 0.0
+        return counters
+
+    def clear(self):
+        with self._db_lock:
+            self._db.execute("DELETE FROM responses")
+
+
+# -----------------------------
+# Process-wide instance
+# -----------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the cache shared by every session in this process."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(os.path.join(CACHE_DIR, "responses.sqlite3"))
+    return _cache
+
+
+def cached_json_call(model: str, prompt_id: str, prompt_text: str, user_input: str, compute,
+                     required_key: str = "feedback"):
+    """Run a JSON call through the shared cache (or directly if disabled).
+
+    Only replies that parsed into a dict with ``required_key`` are stored.
+    """
+    if not CACHE_ENABLED:
+        return compute()
+    return get_response_cache().get_or_compute(
+        model, prompt_id, prompt_text, user_input, compute,
+        should_cache=lambda value: isinstance(value, dict) and required_key in value,
+    )
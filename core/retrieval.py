@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process retrieval over the family-law case corpus (data/RAGdata.txt).
+
+The corpus is split along its own structure: one chunk per bullet (one
+judgment), tagged with the category heading it sits under. The chunks are
+embedded in one matrix, so a query is one embedding plus one matrix-vector
+product and a partial sort.
+
+The matrix is built offline (``python -m core.retrieval``) into the on-disk
+format of ``core.index_store``: float16, memory-mapped by every worker, with
+a content hash per chunk so an edited corpus only re-embeds the chunks that
+changed. When that index is missing or stale the corpus is embedded in the
+process instead, as before.
+
+Only the top passages above a similarity floor are injected into the chat
+prompt, never the whole corpus.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+from core import index_store
+from core.embeddings import EMBEDDING_MODEL, embed, embed_one, embedding_dim, embeddings_available
+from core.response_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------
+# Settings (override with env vars)
+# -----------------------------
+CORPUS_PATH = os.getenv(
+    "ZARA_RAG_CORPUS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "RAGdata.txt"),
+)
+RAG_ENABLED = os.getenv("ZARA_RAG_DISABLED", "") == ""
+RAG_TOP_K = int(os.getenv("ZARA_RAG_TOP_K", "3"))
+RAG_MIN_SCORE = float(os.getenv("ZARA_RAG_MIN_SCORE", "0.35"))
+INDEX_DIR = os.getenv("ZARA_RAG_INDEX_DIR", os.path.join(CACHE_DIR, "rag_index"))
+SEARCH_BLOCK_ROWS = 4096   # float16 rows widened to float32 at a time per query
+
+_BULLET = re.compile(r"^\s*\*\s+")
+
+
+class Chunk(NamedTuple):
+    id: int
+    category: str
+    text: str
+
+
+# -----------------------------
+# Chunking
+# -----------------------------
+def _is_heading(line: str) -> bool:
+    # Category headings are short, unbulleted lines without a closing period
+    # ("Marriage and Divorce", "Child Custody and Guardianship", ...).
+    return len(line) <= 80 and not line.endswith(".")
+
+
+def chunk_corpus(text: str) -> list:
+    """Split the corpus into one chunk per case, carrying its category heading."""
+    chunks = []
+    category = ""
+    current = None
+
+    def flush():
+        if current:
+            chunks.append(Chunk(len(chunks), category, " ".join(current)))
+
+    for raw_line in text.lstrip("\ufeff").splitlines():
+        line = raw_line.strip()
+        if not line:
+            # A blank line closes the current case; wrapped lines never span one.
+            flush()
+            current = None
+            continue
+        if _BULLET.match(raw_line):
+            flush()
+            current = [_BULLET.sub("", raw_line).strip()]
+        elif _is_heading(line):
+            flush()
+            current = None
+            category = line
+        elif current is not None:
+            current.append(line)
+        else:
+            # Free-standing paragraph (e.g. the closing note): its own chunk
+            current = [line]
+    flush()
+    return chunks
+
+
+def passage_text(chunk: Chunk) -> str:
+    """What gets embedded for a chunk (and hashed to detect edits)."""
+    return f"{chunk.category}: {chunk.text}"
+
+
+def corpus_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Offline build
+# -----------------------------
+def build_index(corpus_path: str = CORPUS_PATH, index_dir: str = INDEX_DIR, batch_size: int = 64) -> dict:
+    """Chunk and embed the corpus into ``index_dir``, re-embedding only new or edited chunks."""
+    start = time.perf_counter()
+    with open(corpus_path, encoding="utf-8") as f:
+        text = f.read()
+    chunks = chunk_corpus(text)
+    hashes = [index_store.content_hash(passage_text(c)) for c in chunks]
+
+    previous = index_store.read_index(index_dir)
+    if previous is not None and previous.model != EMBEDDING_MODEL:
+        previous = None
+    rows = {digest: row for row, (digest, _, _) in enumerate(previous.records)} if previous else {}
+
+    missing = [i for i, digest in enumerate(hashes) if digest not in rows]
+    dim = previous.vectors.shape[1] if previous is not None else embedding_dim()
+    vectors = np.empty((len(chunks), dim), dtype=np.float16)
+    for i, digest in enumerate(hashes):
+        if digest in rows:
+            vectors[i] = previous.vectors[rows[digest]]
+    for offset in range(0, len(missing), batch_size):
+        batch = missing[offset:offset + batch_size]
+        vectors[batch] = embed([passage_text(chunks[i]) for i in batch], batch_size=batch_size)
+
+    records = [(digest, c.category, c.text) for digest, c in zip(hashes, chunks)]
+    path = index_store.write_index(index_dir, EMBEDDING_MODEL, corpus_digest(text), records, vectors)
+    return {
+        "chunks": len(chunks),
+        "reused": len(chunks) - len(missing),
+        "embedded": len(missing),
+        "vectors_bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class RetrievalIndex:
+    """Dense index over the corpus chunks with latency bookkeeping."""
+
+    def __init__(self, chunks, vectors: np.ndarray, mapped: bool = False):
+        self.chunks = chunks
+        self.vectors = vectors
+        self.mapped = mapped  # float16 memmap shared through the page cache
+        self._latencies_ms = deque(maxlen=512)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_corpus(cls, path: str = CORPUS_PATH):
+        with open(path, encoding="utf-8") as f:
+            chunks = chunk_corpus(f.read())
+        vectors = embed([passage_text(c) for c in chunks])
+        return cls(chunks, vectors)
+
+    @classmethod
+    def from_stored(cls, stored: index_store.StoredIndex):
+        chunks = [Chunk(i, category, text) for i, (_, category, text) in enumerate(stored.records)]
+        return cls(chunks, stored.vectors, mapped=True)
+
+    def search(self, query: str, k: int = RAG_TOP_K, min_score: float = 0.0):
+        """Return up to ``k`` ``(chunk, score)`` pairs, best first."""
+        start = time.perf_counter()
+        scores = self._scores(embed_one(query))
+        k = min(k, len(scores))
+        results = []
+        if k > 0:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = [(self.chunks[i], float(scores[i])) for i in top if scores[i] >= min_score]
+        with self._lock:
+            self._latencies_ms.append((time.perf_counter() - start) * 1000)
+        return results
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        # A float16 matrix is widened for the product; doing it a block at a time
+        # keeps the float32 copy to one block instead of the whole index
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for begin in range(0, len(self.vectors), SEARCH_BLOCK_ROWS):
+            end = begin + SEARCH_BLOCK_ROWS
+            np.dot(self.vectors[begin:end], query, out=scores[begin:end])
+        return scores
+
+    def memory_bytes(self) -> int:
+        text_bytes = sum(len(c.text.encode("utf-8")) + len(c.category.encode("utf-8")) for c in self.chunks)
+        return int(self.vectors.nbytes) + text_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+        stats = {
+            "chunks": len(self.chunks),
+            "dim": int(self.vectors.shape[1]),
+            "index_bytes": self.memory_bytes(),
+            "storage": "mmap float16" if self.mapped else "in-process float32",
+            "queries": len(latencies),
+        }
+        if latencies:
+            stats["p50_ms"] = round(latencies[len(latencies) // 2], 3)
+            stats["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+        return stats
+
+
+# -----------------------------
+# Process-wide instance
+# -----------------------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def retrieval_available() -> bool:
+    return RAG_ENABLED and os.path.exists(CORPUS_PATH) and embeddings_available()
+
+
+def get_retrieval_index() -> RetrievalIndex:
+    """Map the built index (or embed the corpus) on first use; every session shares the result."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_index()
+    return _index
+
+
+def _load_index() -> RetrievalIndex:
+    stored = index_store.read_index(INDEX_DIR)
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        digest = corpus_digest(f.read())
+    if stored is not None and stored.model == EMBEDDING_MODEL and stored.corpus_sha256 == digest:
+        return RetrievalIndex.from_stored(stored)
+    logger.warning("retrieval index in %s is missing or stale; embedding the corpus in this process "
+                   "(build it with: python -m core.retrieval)", INDEX_DIR)
+    return RetrievalIndex.from_corpus(CORPUS_PATH)
+
+
+def build_reference_message(query: str, k: int = RAG_TOP_K, min_score: float = RAG_MIN_SCORE):
+    """System message with the top matching passages, or ``None`` when nothing is relevant.
+
+    Cases the query names or cites come first; they are found by exact
+    lookup, so they are included even without the embedding model.
+    """
+    # Imported here: core.case_index parses with this module's chunker
+    from core.case_index import get_case_index
+
+    passages, seen = [], set()
+    if RAG_ENABLED and os.path.exists(CORPUS_PATH):
+        for case in get_case_index().mentions(query)[:k]:
+            passages.append(f"- [{case.category}] {case.title} ({case.court} {case.year}) – {case.summary}")
+            seen.add(case.chunk_id)
+    if retrieval_available() and len(passages) < k:
+        hits = get_retrieval_index().search(query, k=k, min_score=min_score)
+        passages += [f"- [{chunk.category}] {chunk.text}" for chunk, _ in hits if chunk.id not in seen]
+    if not passages:
+        return None
+    passages = "\n".join(passages[:k])
+    return {
+        "role": "system",
+        "content": (
+            "Reference notes on Pakistani family law. Use them only if they help answer "
+            "the user's question, explain simply, and do not quote case citations unless asked.\n"
+            + passages
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the on-disk retrieval index (incremental).")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    stats = build_index(args.corpus, args.index_dir, args.batch_size)
+    print(f"{stats['chunks']} chunks: {stats['reused']} reused, {stats['embedded']} embedded, "
+          f"{stats['vectors_bytes']:,} bytes of vectors in {stats['seconds']} s -> {args.index_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Embedding-based semantic cache for the freeform "Chat with Zara" turns.
+
+The last user turn is embedded locally and compared against the stored
+questions with one matrix-vector product. A cached answer is replayed only
+when the similarity passes the threshold *and* it was produced in the same
+conversation context: same tab, system prompt and lesson step, and the same
+conversation before the question (``context_builder.conversation_fingerprint``:
+the rolling summary and the turns sent verbatim). Replies often use what
+the learner shared earlier, so an answer is never replayed to a learner
+whose conversation differs, at the cost of hits only between identical
+conversations.
+
+The cache is opt-in per tab:
+
+    ZARA_SEMANTIC_CACHE_TABS="Reflection,Identifying the right person"   # or "all"
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from core.embeddings import embed_one, embedding_dim, embeddings_available
+
+
+# -----------------------------
+# Settings (override with env vars)
+# -----------------------------
+SEMANTIC_CACHE_TABS = {
+    name.strip() for name in os.getenv("ZARA_SEMANTIC_CACHE_TABS", "").split(",") if name.strip()
+}
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("ZARA_SEMANTIC_CACHE_CAPACITY", "5000"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("ZARA_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("ZARA_SEMANTIC_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+
+def semantic_cache_enabled(tab_name: str) -> bool:
+    if not (SEMANTIC_CACHE_TABS and embeddings_available()):
+        return False
+    return "all" in SEMANTIC_CACHE_TABS or tab_name.strip() in SEMANTIC_CACHE_TABS
+
+
+def context_key(tab_name: str, system_prompt: str, step: str = "", conversation: str = "") -> str:
+    """Fingerprint of what the answer depends on besides the question itself."""
+    raw = "\x1f".join([tab_name, system_prompt, step, conversation])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def simulate_stream(text: str, words_per_chunk: int = 3, delay: float = 0.02):
+    """Yield a cached answer in small chunks so ``st.write_stream`` renders it like a live reply."""
+    words = text.split(" ")
+    for i in range(0, len(words), words_per_chunk):
+        chunk = " ".join(words[i:i + words_per_chunk])
+        yield chunk if i + words_per_chunk >= len(words) else chunk + " "
+        if delay:
+            time.sleep(delay)
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class SemanticCache:
+    """Fixed-capacity vector store with LRU eviction.
+
+    Memory is bounded by ``capacity * dim * 4`` bytes for the vectors plus the
+    stored answers; nothing grows past ``capacity`` entries. A context id is
+    dropped when the last slot using it is evicted, so the context table is
+    bounded by ``capacity`` too.
+    """
+
+    def __init__(self, dim: int, capacity: int = SEMANTIC_CACHE_CAPACITY,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._contexts = np.full(capacity, -1, dtype=np.int64)
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._answers = [None] * capacity
+        self._size = 0
+
+        self._context_ids = {}    # context key -> id
+        self._context_keys = {}   # id -> context key
+        self._context_slots = {}  # id -> slots holding it
+        self._next_context = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+    def _acquire_context(self, key: str) -> int:
+        context_id = self._context_ids.get(key)
+        if context_id is None:
+            context_id = self._context_ids[key] = self._next_context
+            self._context_keys[context_id] = key
+            self._context_slots[context_id] = 0
+            self._next_context += 1
+        self._context_slots[context_id] += 1
+        return context_id
+
+    def _release_context(self, context_id: int):
+        self._context_slots[context_id] -= 1
+        if not self._context_slots[context_id]:
+            del self._context_slots[context_id]
+            del self._context_ids[self._context_keys.pop(context_id)]
+
+    def lookup(self, vector: np.ndarray, context: str):
+        """Return ``(answer, score)`` for the best match above the threshold, else ``(None, score)``."""
+        now = time.time()
+        with self._lock:
+            context_id = self._context_ids.get(context)
+            if context_id is None or self._size == 0:
+                self._counters["misses"] += 1
+                return None, 0.0
+
+            n = self._size
+            scores = self._vectors[:n] @ vector
+            valid = (self._contexts[:n] == context_id) & (now - self._created[:n] <= self.ttl_seconds)
+            scores = np.where(valid, scores, -1.0)
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+
+            if score < self.threshold:
+                self._counters["misses"] += 1
+                return None, score
+            self._last_used[best] = now
+            self._counters["hits"] += 1
+            return self._answers[best], score
+
+    def store(self, vector: np.ndarray, context: str, answer: str):
+        now = time.time()
+        with self._lock:
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._counters["evicted"] += 1
+                self._release_context(int(self._contexts[slot]))
+            self._vectors[slot] = vector
+            self._contexts[slot] = self._acquire_context(context)
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._answers[slot] = answer
+            self._counters["stores"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = self._size
+            stats["capacity"] = self.capacity
+            stats["contexts"] = len(self._context_ids)
+            stats["vector_bytes"] = int(self._vectors.nbytes)
+            stats["answer_bytes"] = sum(len(a.encode("utf-8")) for a in self._answers[:self._size])
+        return stats
+
+
+# -----------------------------
+# Process-wide instance
+# -----------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(embedding_dim())
+    return _cache
+
+
+def lookup_turn(tab_name: str, system_prompt: str, step: str, conversation: str, user_input: str):
+    """Look up a freeform turn; returns ``(answer_or_None, vector, context)`` for a later ``store``.
+
+    ``conversation`` fingerprints the turns before ``user_input``
+    (``core.context_builder.conversation_fingerprint``).
+    """
+    vector = embed_one(user_input)
+    context = context_key(tab_name, system_prompt, step, conversation)
+    answer, _ = get_semantic_cache().lookup(vector, context)
+    return answer, vector, context
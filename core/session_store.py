@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Externalized session state, so a lesson survives restarts and can continue
+on any replica.
+
+Conversation state used to live only in ``st.session_state``. Now each
+browser session gets an id, kept in the ``?sid=`` query parameter as
+``<id>.<signature>``; on the first run of a session its transcript and stage
+variables are loaded from the configured store, and after every run only
+what changed is written back: new messages are appended, changed stage
+variables are upserted. The transcript is never rewritten.
+
+The signature is an HMAC of the id under ``ZARA_SESSION_SECRET``, so only
+ids this app handed out are accepted; a bare id (as it appears in the event
+log or the store) or an edited one starts a new session instead. Without
+that variable a random secret is created once in the cache directory; set
+it explicitly, and the same on every replica, when sessions move between
+hosts. The signed link itself still resumes the lesson, so treat it like a
+password.
+
+Backends (``ZARA_SESSION_STORE``):
+
+- ``memory`` (default): per-process dict; resumable across reruns and tabs
+  of one process only.
+- ``sqlite`` or ``sqlite:///path/to/file``: WAL-mode SQLite, shareable by
+  several processes on one host.
+- ``redis://host:port/db``: any server speaking the Redis protocol (Redis,
+  Valkey, KeyDB, or a local stand-in); needs the ``redis`` package. Only
+  RPUSH/LRANGE/LTRIM/HSET/HGETALL/EXPIRE are used.
+
+System prompts are not stored: a transcript is kept without its leading
+system message, which ``restore_session`` puts back from the tab's current
+``SYSTEM_PROMPT``, so stored sessions stay small and pick up prompt edits.
+Values are stored as compact JSON. Pending background turns and other live
+objects are never persisted; a turn still running when a process dies shows
+up as an unanswered message the learner can simply send again.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+import streamlit as st
+
+from core.message_log import MessageLog
+from core.response_cache import CACHE_DIR
+
+SESSION_STORE_URL = os.getenv("ZARA_SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = int(os.getenv("ZARA_SESSION_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Stage variables the tabs keep in session_state
+PERSISTED_KEYS = (
+    "attribution_stage", "success_shared", "attribution_given", "stable_internal_confirmed",
+    "ri_stage", "ri_roles", "ri_qualities", "ri_challenge",
+    "attribution_emitted", "ri_emitted",
+)
+# Rolling summaries (see core.context_builder); only these fields are persisted
+_CONTEXT_PREFIX = "context::"
+_CONTEXT_FIELDS = ("summary", "upto")
+
+_SID_PARAM = "sid"
+_SECRET_PATH = os.path.join(CACHE_DIR, "session_secret")
+_SNAPSHOT_KEY = "_session_store_snapshot"
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class SessionStore:
+    """Append-only transcript + key/value stage state per session id."""
+
+    def load(self, sid: str):
+        """Return ``{"messages": {tab: [...]}, "state": {...}}`` or None if unknown."""
+        raise NotImplementedError
+
+    def append_messages(self, sid: str, tab: str, messages):
+        raise NotImplementedError
+
+    def truncate_messages(self, sid: str, tab: str, length: int):
+        """Drop messages from ``length`` on (a cancelled turn's input)."""
+        raise NotImplementedError
+
+    def set_state(self, sid: str, changes: dict):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def load(self, sid):
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                return None
+            return {
+                "messages": {tab: list(msgs) for tab, msgs in session["messages"].items()},
+                "state": json.loads(_dumps(session["state"])),
+            }
+
+    def _session(self, sid):
+        return self._sessions.setdefault(sid, {"messages": {}, "state": {}})
+
+    def append_messages(self, sid, tab, messages):
+        with self._lock:
+            self._session(sid)["messages"].setdefault(tab, MessageLog()).extend(messages)
+
+    def truncate_messages(self, sid, tab, length):
+        with self._lock:
+            del self._session(sid)["messages"].setdefault(tab, MessageLog())[length:]
+
+    def set_state(self, sid, changes):
+        with self._lock:
+            self._session(sid)["state"].update(json.loads(_dumps(changes)))
+
+
+class SQLiteSessionStore(SessionStore):
+    """Messages in one table, with each transcript's length kept in ``session_tabs``."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            " sid TEXT NOT NULL, tab TEXT NOT NULL, idx INTEGER NOT NULL,"
+            " role TEXT NOT NULL, content TEXT NOT NULL,"
+            " PRIMARY KEY (sid, tab, idx))"
+        )
+        upgrading = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'session_tabs'"
+        ).fetchone() is None
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_tabs ("
+            " sid TEXT NOT NULL, tab TEXT NOT NULL, length INTEGER NOT NULL,"
+            " PRIMARY KEY (sid, tab))"
+        )
+        if upgrading:
+            # A store written before the lengths were kept
+            self._db.execute(
+                "INSERT OR IGNORE INTO session_tabs (sid, tab, length)"
+                " SELECT sid, tab, MAX(idx) + 1 FROM session_messages GROUP BY sid, tab"
+            )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            " sid TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (sid, key))"
+        )
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def load(self, sid):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT tab, role, content FROM session_messages WHERE sid = ? ORDER BY tab, idx", (sid,)
+            ).fetchall()
+            state_rows = self._db.execute(
+                "SELECT key, value FROM session_state WHERE sid = ?", (sid,)
+            ).fetchall()
+        if not rows and not state_rows:
+            return None
+        messages = {}
+        for tab, role, content in rows:
+            messages.setdefault(tab, []).append({"role": role, "content": content})
+        return {"messages": messages, "state": {key: json.loads(value) for key, value in state_rows}}
+
+    def append_messages(self, sid, tab, messages):
+        rows = [(m["role"], m["content"]) for m in messages]
+        with self._transaction():
+            row = self._db.execute(
+                "SELECT length FROM session_tabs WHERE sid = ? AND tab = ?", (sid, tab)
+            ).fetchone()
+            start = row[0] if row else 0
+            self._db.executemany(
+                "INSERT INTO session_messages (sid, tab, idx, role, content) VALUES (?, ?, ?, ?, ?)",
+                [(sid, tab, start + i, role, content) for i, (role, content) in enumerate(rows)],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO session_tabs (sid, tab, length) VALUES (?, ?, ?)",
+                (sid, tab, start + len(rows)),
+            )
+
+    def truncate_messages(self, sid, tab, length):
+        with self._transaction():
+            self._db.execute(
+                "DELETE FROM session_messages WHERE sid = ? AND tab = ? AND idx >= ?", (sid, tab, length)
+            )
+            self._db.execute(
+                "UPDATE session_tabs SET length = MIN(length, ?) WHERE sid = ? AND tab = ?", (length, sid, tab)
+            )
+
+    def set_state(self, sid, changes):
+        with self._transaction():
+            self._db.executemany(
+                "INSERT OR REPLACE INTO session_state (sid, key, value) VALUES (?, ?, ?)",
+                [(sid, key, _dumps(value)) for key, value in changes.items()],
+            )
+
+
+class RedisSessionStore(SessionStore):
+    """Backend over a Redis-protocol client (``redis.Redis`` or anything with the same methods)."""
+
+    def __init__(self, client, ttl_seconds: int = SESSION_TTL_SECONDS, prefix: str = "zara:session:"):
+        self._r = client
+        self._ttl = ttl_seconds
+        self._prefix = prefix
+
+    def _key(self, sid, part):
+        return f"{self._prefix}{sid}:{part}"
+
+    def _touch(self, *keys):
+        for key in keys:
+            self._r.expire(key, self._ttl)
+
+    def load(self, sid):
+        tabs = self._r.hgetall(self._key(sid, "tabs"))
+        state = self._r.hgetall(self._key(sid, "state"))
+        if not tabs and not state:
+            return None
+        messages = {}
+        for tab in tabs:
+            tab = tab.decode() if isinstance(tab, bytes) else tab
+            messages[tab] = [
+                dict(zip(("role", "content"), json.loads(item)))
+                for item in self._r.lrange(self._key(sid, "msg:" + tab), 0, -1)
+            ]
+        return {
+            "messages": messages,
+            "state": {
+                (k.decode() if isinstance(k, bytes) else k): json.loads(v) for k, v in state.items()
+            },
+        }
+
+    def append_messages(self, sid, tab, messages):
+        key = self._key(sid, "msg:" + tab)
+        self._r.rpush(key, *[_dumps([m["role"], m["content"]]) for m in messages])
+        self._r.hset(self._key(sid, "tabs"), tab, 1)
+        self._touch(key, self._key(sid, "tabs"))
+
+    def truncate_messages(self, sid, tab, length):
+        key = self._key(sid, "msg:" + tab)
+        if length == 0:
+            self._r.ltrim(key, 1, 0)  # empty range clears the list
+        else:
+            self._r.ltrim(key, 0, length - 1)
+
+    def set_state(self, sid, changes):
+        key = self._key(sid, "state")
+        self._r.hset(key, mapping={k: _dumps(v) for k, v in changes.items()})
+        self._touch(key)
+
+
+def open_store(url: str = SESSION_STORE_URL) -> SessionStore:
+    if url == "memory":
+        return MemorySessionStore()
+    if url == "sqlite":
+        return SQLiteSessionStore(os.path.join(CACHE_DIR, "sessions.sqlite3"))
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # optional dependency, only for this backend
+        return RedisSessionStore(redis.Redis.from_url(url))
+    raise ValueError(f"Unknown ZARA_SESSION_STORE: {url!r}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Return the store shared by every session in this process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = open_store()
+    return _store
+
+
+# -----------------------------
+# Signed session ids
+# -----------------------------
+_secret = None
+
+
+def _session_secret() -> bytes:
+    global _secret
+    if _secret is None:
+        configured = os.getenv("ZARA_SESSION_SECRET")
+        if configured:
+            _secret = configured.encode("utf-8")
+        else:
+            _secret = _load_or_create_secret(_SECRET_PATH)
+    return _secret
+
+
+def _load_or_create_secret(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        # O_EXCL: when two processes race, both end up with the file that won
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "rb") as f:
+            return f.read()
+    secret = secrets.token_hex(32).encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    return secret
+
+
+def sign_sid(sid: str) -> str:
+    """``<sid>.<signature>``, the form kept in the URL."""
+    signature = hmac.new(_session_secret(), sid.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+    return f"{sid}.{signature}"
+
+
+def verify_sid(token: str):
+    """The session id in a signed ``token``, or None if it was not signed with this app's secret."""
+    sid = (token or "").rpartition(".")[0]
+    if not sid or not hmac.compare_digest(sign_sid(sid), token):
+        return None
+    return sid
+
+
+# -----------------------------
+# Streamlit glue
+# -----------------------------
+def _tracked_state() -> dict:
+    state = {key: st.session_state[key] for key in PERSISTED_KEYS if key in st.session_state}
+    for key in st.session_state:
+        if key.startswith(_CONTEXT_PREFIX):
+            context = st.session_state[key]
+            state[key] = {field: context[field] for field in _CONTEXT_FIELDS if field in context}
+    return state
+
+
+def _prompt_length(messages) -> int:
+    """Number of leading system messages (the tab's prompt), which are never stored."""
+    length = 0
+    while length < len(messages) and messages[length]["role"] == "system":
+        length += 1
+    return length
+
+
+def restore_session(system_prompt=None):
+    """On a session's first run, pick up its id from the URL and load its state.
+
+    ``system_prompt(tab)`` returns the prompt to put back in front of a
+    restored transcript (see ``tabs.system_prompt``).
+    """
+    if _SNAPSHOT_KEY in st.session_state:
+        return st.session_state[_SNAPSHOT_KEY]["sid"]
+
+    sid = verify_sid(st.query_params.get(_SID_PARAM)) or uuid.uuid4().hex
+    st.query_params[_SID_PARAM] = sign_sid(sid)
+
+    store = get_session_store()
+    saved = store.load(sid) or {"messages": {}, "state": {}}
+    messages, counts = {}, {}
+    for tab, msgs in saved["messages"].items():
+        skip = _prompt_length(msgs)
+        if skip:
+            # Stored before prompts were left out: rewrite without them
+            store.truncate_messages(sid, tab, 0)
+            store.append_messages(sid, tab, msgs[skip:])
+            msgs = msgs[skip:]
+        prompt = system_prompt(tab) if system_prompt else None
+        messages[tab] = MessageLog(([{"role": "system", "content": prompt}] if prompt else []) + msgs)
+        counts[tab] = len(msgs)
+    st.session_state.messages = messages
+    for key, value in saved["state"].items():
+        st.session_state[key] = value
+
+    st.session_state[_SNAPSHOT_KEY] = {"sid": sid, "counts": counts, "state": saved["state"]}
+    return sid
+
+
+def persist_session():
+    """Write what changed during this run: new messages and changed stage variables."""
+    snapshot = st.session_state.get(_SNAPSHOT_KEY)
+    if snapshot is None:
+        return
+    store = get_session_store()
+    sid = snapshot["sid"]
+
+    for tab, messages in st.session_state.get("messages", {}).items():
+        skip = _prompt_length(messages)
+        length = len(messages) - skip
+        saved = snapshot["counts"].get(tab, 0)
+        if length < saved:
+            store.truncate_messages(sid, tab, length)
+            saved = length
+        if length > saved:
+            store.append_messages(sid, tab, messages[skip + saved:])
+        snapshot["counts"][tab] = length
+
+    state = _tracked_state()
+    changes = {key: value for key, value in state.items() if snapshot["state"].get(key) != value}
+    if changes:
+        store.set_state(sid, changes)
+        snapshot["state"].update(json.loads(_dumps(changes)))
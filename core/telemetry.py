@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM call instrumentation: per call site and lesson stage.
+
+Every LLM call goes through ``LLMRouter.create``, which opens an ``LLMCall``
+here and closes it when the reply (or the end of the stream) arrives. A call
+records its call site (the names ``core.model_profiles`` uses), the lesson
+stage it was made from, the model, the provider that answered, how long it
+waited in the job pool, time to first token (streams), total latency,
+prompt / completion / cached / reasoning tokens, retries and the outcome
+(``ok`` or the error's class name). Call sites report replies that were not
+valid JSON with ``parse_json``.
+
+The stage comes from a context variable set by ``core.flow.render_flow`` and
+carried into the job pool by ``core.jobs.submit``, which also sets the queue
+wait. Counters are always kept; latency histograms and the recent-calls list
+only take a sample of the calls, 10% by default, so instrumentation costs a
+few microseconds per call. Set ``ZARA_METRICS_SAMPLE_RATE`` (0 to 1) to
+change it, e.g. ``ZARA_METRICS_SAMPLE_RATE=1`` to record every call when
+debugging or running a benchmark. Other modules add their own series through
+``inc``, ``set_gauge`` and ``observe`` (``core.admission`` does, for its queue).
+
+Exports, all optional:
+
+- Prometheus text on ``http://0.0.0.0:$ZARA_METRICS_PORT/metrics``;
+- the same text written every ``ZARA_METRICS_EXPORT_SECONDS`` to
+  ``ZARA_METRICS_FILE`` (for node_exporter's textfile collector);
+- ``summary()`` for the admin sidebar (``ZARA_ADMIN``).
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core import event_log
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("ZARA_METRICS", "1") != "0"
+SAMPLE_RATE = float(os.getenv("ZARA_METRICS_SAMPLE_RATE", "0.1"))
+METRICS_FILE = os.getenv("ZARA_METRICS_FILE")
+METRICS_PORT = int(os.getenv("ZARA_METRICS_PORT", "0"))
+EXPORT_INTERVAL = float(os.getenv("ZARA_METRICS_EXPORT_SECONDS", "15"))
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_SAMPLES = 500   # per call site and stage, for the sidebar percentiles
+_RECENT = 50
+
+_stage = contextvars.ContextVar("zara_stage", default="")
+_queue_wait = contextvars.ContextVar("zara_queue_wait", default=0.0)
+
+
+@contextmanager
+def stage(name: str):
+    """Label the LLM calls made (or submitted to the job pool) inside the block."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def set_queue_wait(seconds: float):
+    _queue_wait.set(seconds)
+
+
+# -----------------------------
+# Metric store
+# -----------------------------
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)       # (name, labels) -> value
+        self.histograms = defaultdict(_Histogram)
+        self.samples = defaultdict(lambda: {"ttft": deque(maxlen=_SAMPLES), "latency": deque(maxlen=_SAMPLES)})
+        self.recent = deque(maxlen=_RECENT)
+
+    def inc(self, name: str, labels: tuple, value: float = 1):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def set(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            self.counters[(name, labels)] = value
+
+    def observe_value(self, name: str, labels: tuple, value: float):
+        with self._lock:
+            self.histograms[(name, labels)].observe(value)
+
+    def observe(self, call, latency: float, usage: dict, error):
+        site = (("call_site", call.call_site), ("stage", call.stage), ("model", call.model))
+        outcome = "ok" if error is None else type(error).__name__
+        with self._lock:
+            self.counters[("zara_llm_calls_total", site + (("provider", call.provider or ""), ("outcome", outcome)))] += 1
+            if call.retries:
+                self.counters[("zara_llm_retries_total", site)] += call.retries
+            for kind in ("prompt", "completion", "cached", "reasoning"):
+                if usage.get(kind):
+                    self.counters[("zara_llm_tokens_total", site + (("kind", kind),))] += usage[kind]
+            if not call.sampled:
+                return
+            self.histograms[("zara_llm_latency_seconds", site)].observe(latency)
+            self.histograms[("zara_llm_queue_wait_seconds", site)].observe(call.queue_wait)
+            samples = self.samples[(call.call_site, call.stage)]
+            samples["latency"].append(latency)
+            if call.ttft is not None:
+                self.histograms[("zara_llm_ttft_seconds", site)].observe(call.ttft)
+                samples["ttft"].append(call.ttft)
+            self.recent.append({
+                "call_site": call.call_site,
+                "stage": call.stage,
+                "model": call.model,
+                "provider": call.provider,
+                "outcome": outcome,
+                "queue_wait_ms": round(call.queue_wait * 1000, 1),
+                "ttft_ms": None if call.ttft is None else round(call.ttft * 1000, 1),
+                "latency_ms": round(latency * 1000, 1),
+                "retries": call.retries,
+                **usage,
+            })
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            samples = {key: {k: sorted(v) for k, v in s.items()} for key, s in self.samples.items()}
+            recent = list(self.recent)
+        return counters, histograms, samples, recent
+
+
+_metrics = _Metrics()
+
+
+def _usage_dict(usage) -> dict:
+    if usage is None:
+        return {}
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    prompt_details = usage.get("prompt_tokens_details") or {}
+    completion_details = usage.get("completion_tokens_details") or {}
+    return {
+        "prompt": usage.get("prompt_tokens") or 0,
+        "completion": usage.get("completion_tokens") or 0,
+        "cached": prompt_details.get("cached_tokens") or 0,
+        "reasoning": completion_details.get("reasoning_tokens") or 0,
+    }
+
+
+# -----------------------------
+# Calls
+# -----------------------------
+class LLMCall:
+    """One logical LLM request (all its retries and hedges)."""
+
+    __slots__ = ("call_site", "stage", "session", "model", "provider", "queue_wait", "sampled", "started", "ttft",
+                 "retries", "_done")
+
+    def __init__(self, call_site: str, model: str, session: str = ""):
+        self.call_site = call_site or "unknown"
+        self.stage = _stage.get()
+        self.session = session
+        self.model = model or ""
+        self.provider = None
+        self.queue_wait = _queue_wait.get()
+        self.sampled = random.random() < SAMPLE_RATE
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.retries = 0
+        self._done = False
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def finish(self, usage=None, error: BaseException = None):
+        """Record the call once; later calls (e.g. a closed stream after its end) are ignored."""
+        if self._done:
+            return
+        self._done = True
+        latency = time.perf_counter() - self.started
+        usage = _usage_dict(usage)
+        outcome = "ok" if error is None else type(error).__name__
+        if METRICS_ENABLED:
+            _metrics.observe(self, latency, usage, error)
+        event_log.emit(
+            "llm", self.session, call_site=self.call_site, stage=self.stage, model=self.model, provider=self.provider,
+            outcome=outcome, ms=round(latency * 1000, 1),
+            ttft_ms=None if self.ttft is None else round(self.ttft * 1000, 1),
+            prompt=usage.get("prompt", 0), completion=usage.get("completion", 0),
+        )
+
+
+def start_call(call_site: str, model: str, session: str = "") -> LLMCall:
+    """Open a call record; ``session`` (see ``core.admission.session``) labels its event log entry."""
+    return LLMCall(call_site, model, session)
+
+
+def record_json_failure(call_site: str):
+    if METRICS_ENABLED:
+        _metrics.inc("zara_llm_json_parse_failures_total", (("call_site", call_site), ("stage", _stage.get())))
+
+
+def inc(name: str, labels: tuple = (), value: float = 1):
+    """Add to a counter kept by another module (listed in ``_HELP``)."""
+    if METRICS_ENABLED:
+        _metrics.inc(name, labels, value)
+
+
+def set_gauge(name: str, labels: tuple, value: float):
+    if METRICS_ENABLED:
+        _metrics.set(name, labels, value)
+
+
+def observe(name: str, labels: tuple, value: float):
+    if METRICS_ENABLED:
+        _metrics.observe_value(name, labels, value)
+
+
+def parse_json(call_site: str, text: str):
+    """``json.loads`` a reply, counting replies that are not valid JSON."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        record_json_failure(call_site)
+        raise
+
+
+# -----------------------------
+# Exporters
+# -----------------------------
+_HELP = {
+    "zara_llm_calls_total": ("counter", "LLM calls by call site, stage, model, provider and outcome."),
+    "zara_llm_retries_total": ("counter", "Retries made by the router after retryable failures."),
+    "zara_llm_tokens_total": ("counter", "Tokens by kind: prompt, completion, cached (prompt) and reasoning."),
+    "zara_llm_json_parse_failures_total": ("counter", "Replies that were not the JSON the call site expected."),
+    "zara_llm_latency_seconds": ("histogram", "Total call latency (sampled); streams end at their last chunk."),
+    "zara_llm_ttft_seconds": ("histogram", "Time to first token of streamed calls (sampled)."),
+    "zara_llm_queue_wait_seconds": ("histogram", "Time the call's job waited for a pool worker (sampled)."),
+    "zara_admission_admitted_total": ("counter", "LLM calls let through by the admission controller, by priority."),
+    "zara_admission_timeouts_total": ("counter", "LLM calls given up after waiting too long for admission."),
+    "zara_admission_wait_seconds": ("histogram", "Time LLM calls waited for admission, by priority."),
+    "zara_admission_queue_depth": ("gauge", "LLM calls waiting for admission, by priority."),
+    "zara_admission_in_flight": ("gauge", "LLM calls admitted and not yet finished."),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms, _, _ = _metrics.snapshot()
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, value))
+    for (name, labels), value in histograms.items():
+        by_name[name].append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, text = _HELP[name]
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind in ("counter", "gauge"):
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: str = METRICS_FILE):
+    # Write then rename, so a scraper never reads half a file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters():
+    """Start the configured exporters once per process (safe to call on every rerun)."""
+    global _exporters_started
+    if _exporters_started or not METRICS_ENABLED:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if METRICS_PORT:
+            try:
+                server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), _MetricsHandler)
+            except OSError as e:
+                # Another worker process on this host already serves the port
+                logger.warning("metrics endpoint not started: %s", e)
+            else:
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name="zara-metrics", daemon=True).start()
+        if METRICS_FILE:
+            def _write_loop():
+                while True:
+                    try:
+                        write_metrics_file(METRICS_FILE)
+                    except OSError as e:
+                        logger.warning("metrics file not written: %s", e)
+                    time.sleep(EXPORT_INTERVAL)
+
+            threading.Thread(target=_write_loop, name="zara-metrics-file", daemon=True).start()
+
+
+# -----------------------------
+# Admin sidebar
+# -----------------------------
+def _percentile(values, pct: float):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * pct))] * 1000, 1)
+
+
+def token_usage() -> dict:
+    """Per call site: successful calls and tokens by kind, over all stages, models and providers."""
+    counters, _, _, _ = _metrics.snapshot()
+    sites = defaultdict(lambda: {"calls": 0, "prompt": 0, "completion": 0, "cached": 0, "reasoning": 0})
+    for (name, labels), value in counters.items():
+        label = dict(labels)
+        if name == "zara_llm_calls_total" and label["outcome"] == "ok":
+            sites[label["call_site"]]["calls"] += int(value)
+        elif name == "zara_llm_tokens_total":
+            sites[label["call_site"]][label["kind"]] += int(value)
+    return dict(sites)
+
+
+def summary() -> dict:
+    """Per call site and stage: calls, errors, tokens and sampled latency percentiles."""
+    counters, _, samples, recent = _metrics.snapshot()
+    rows = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "json_failures": 0,
+                                "prompt": 0, "completion": 0, "cached": 0, "reasoning": 0})
+    for (name, labels), value in counters.items():
+        if not name.startswith("zara_llm_"):
+            continue  # admission metrics have their own panel
+        label = dict(labels)
+        row = rows[f"{label['call_site']} @ {label['stage'] or '-'}"]
+        if name == "zara_llm_calls_total":
+            row["calls"] += int(value)
+            if label["outcome"] != "ok":
+                row["errors"] += int(value)
+        elif name == "zara_llm_retries_total":
+            row["retries"] += int(value)
+        elif name == "zara_llm_json_parse_failures_total":
+            row["json_failures"] += int(value)
+        elif name == "zara_llm_tokens_total":
+            row[label["kind"]] += int(value)
+    for (call_site, stage_name), sample in samples.items():
+        row = rows[f"{call_site} @ {stage_name or '-'}"]
+        row["ttft_p50_ms"] = _percentile(sample["ttft"], 0.5)
+        row["ttft_p95_ms"] = _percentile(sample["ttft"], 0.95)
+        row["latency_p50_ms"] = _percentile(sample["latency"], 0.5)
+        row["latency_p95_ms"] = _percentile(sample["latency"], 0.95)
+    return {"sample_rate": SAMPLE_RATE, "by_call_site": dict(sorted(rows.items())), "recent": recent[-10:]}
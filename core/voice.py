@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming voice input for the chat stages.
+
+Many learners find speaking easier than typing. Voice is off unless
+``ZARA_VOICE=1`` (and streamlit-webrtc and PyAV are installed), since it
+sends the learner's audio to the speech-to-text provider. With the voice
+toggle on, a tab streams microphone audio over WebRTC (streamlit-webrtc) in 20 ms frames
+of 16 kHz mono PCM into a per-session ``VoiceSession``:
+
+- a voice activity detector (webrtcvad when installed, an adaptive energy
+  threshold otherwise) marks each frame as speech or silence;
+- ``UtteranceCutter`` closes a *segment* at every short pause and the
+  *utterance* at a long one;
+- each segment is sent to the transcriber in the background job pool as
+  soon as it closes, so while the learner is still talking the earlier
+  parts are already transcribed. When the utterance ends only the last
+  segment is left to wait for, instead of uploading the whole recording.
+
+The finished text is taken by the stage's input (``take_text``) exactly
+like a typed message. Transcribers are pluggable: Groq or OpenAI speech to
+text through the shared clients, or ``StubTranscriber`` for tests and
+benchmarks. Speech-to-text requests wait for a ticket from the router's
+admission controller at grading priority, under the learner's session, and
+are recorded in ``core.telemetry`` as ``voice_transcription`` calls. Every utterance's end-of-speech-to-text latency is recorded
+(``voice_latency_stats``); ``benchmarks/voice_bench.py`` compares
+incremental with whole-utterance transcription.
+"""
+
+import importlib.util
+import io
+import logging
+import math
+import os
+import threading
+import time
+import wave
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+import streamlit as st
+
+from core import admission, jobs, telemetry
+from core.model_profiles import profile_for
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Settings (override with env vars)
+# -----------------------------
+VOICE_ENABLED = os.getenv("ZARA_VOICE", "0") != "0"
+VOICE_TRANSCRIBER = os.getenv("ZARA_VOICE_TRANSCRIBER", "groq")  # "groq", "openai" or "stub"
+VOICE_MODELS = {
+    "groq": os.getenv("ZARA_VOICE_GROQ_MODEL", "whisper-large-v3-turbo"),
+    "openai": os.getenv("ZARA_VOICE_OPENAI_MODEL", "gpt-4o-mini-transcribe"),
+}
+VOICE_LANGUAGE = os.getenv("ZARA_VOICE_LANGUAGE", "")  # ISO code, e.g. "ur"; empty: auto-detect
+SEGMENT_PAUSE_MS = int(os.getenv("ZARA_VOICE_SEGMENT_PAUSE_MS", "300"))
+END_PAUSE_MS = int(os.getenv("ZARA_VOICE_END_PAUSE_MS", "800"))
+MIN_SPEECH_MS = int(os.getenv("ZARA_VOICE_MIN_SPEECH_MS", "250"))
+MAX_SEGMENT_MS = int(os.getenv("ZARA_VOICE_MAX_SEGMENT_MS", "6000"))
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2  # int16 mono
+_PRE_ROLL_FRAMES = 5  # audio kept from just before the speech onset
+
+_MAX_SAMPLES = 512
+
+
+# -----------------------------
+# Voice activity detection
+# -----------------------------
+class EnergyVAD:
+    """Speech when a frame is ``margin_db`` above the running noise floor."""
+
+    def __init__(self, margin_db: float = 12.0, min_level_db: float = -50.0):
+        self.margin_db = margin_db
+        self.min_level_db = min_level_db
+        self.noise_db = -70.0
+
+    def is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        rms = math.sqrt(float(np.mean(samples * samples))) if len(samples) else 0.0
+        level_db = 20 * math.log10(rms / 32768 + 1e-9)
+        speech = level_db > self.min_level_db and level_db > self.noise_db + self.margin_db
+        if not speech:
+            # Track the room's noise while nobody speaks
+            self.noise_db = 0.95 * self.noise_db + 0.05 * level_db
+        return speech
+
+
+class WebRTCVAD:
+    def __init__(self, aggressiveness: int = 2):
+        import webrtcvad
+        self._vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame: bytes) -> bool:
+        return self._vad.is_speech(frame, SAMPLE_RATE)
+
+
+def make_vad():
+    if importlib.util.find_spec("webrtcvad") is not None:
+        return WebRTCVAD()
+    return EnergyVAD()
+
+
+# -----------------------------
+# Utterance cutting
+# -----------------------------
+class UtteranceCutter:
+    """Turns frames into ``("segment", pcm)`` / ``("end", last_voiced_at)`` / ``("discard", None)`` events."""
+
+    def __init__(self, vad=None, segment_pause_ms: int = SEGMENT_PAUSE_MS, end_pause_ms: int = END_PAUSE_MS,
+                 min_speech_ms: int = MIN_SPEECH_MS, max_segment_ms: int = MAX_SEGMENT_MS):
+        self.vad = vad or make_vad()
+        self.segment_pause = segment_pause_ms // FRAME_MS
+        self.end_pause = end_pause_ms // FRAME_MS
+        self.min_speech = min_speech_ms // FRAME_MS
+        self.max_segment = max_segment_ms // FRAME_MS
+        self._pre_roll = deque(maxlen=_PRE_ROLL_FRAMES)
+        self._segment = []
+        self._segment_voiced = 0
+        self._voiced = 0           # speech frames in the whole utterance
+        self._silence = 0          # frames since the last speech frame
+        self._last_voiced_at = None
+        self.in_utterance = False
+
+    def feed(self, frame: bytes, now: float):
+        events = []
+        speech = self.vad.is_speech(frame)
+        if not self.in_utterance:
+            if not speech:
+                self._pre_roll.append(frame)
+                return events
+            self.in_utterance = True
+            self._segment = list(self._pre_roll)
+            self._pre_roll.clear()
+
+        self._segment.append(frame)
+        if speech:
+            self._segment_voiced += 1
+            self._voiced += 1
+            self._silence = 0
+            self._last_voiced_at = now
+        else:
+            self._silence += 1
+
+        if self._silence >= self.end_pause:
+            self._close_segment(events)
+            events.append(("end", self._last_voiced_at) if self._voiced >= self.min_speech else ("discard", None))
+            self.in_utterance = False
+            self._voiced = 0
+            self._silence = 0
+        elif self._silence == self.segment_pause or len(self._segment) >= self.max_segment:
+            self._close_segment(events)
+        return events
+
+    def _close_segment(self, events):
+        if self._segment_voiced:
+            events.append(("segment", b"".join(self._segment)))
+        self._segment = []
+        self._segment_voiced = 0
+
+
+# -----------------------------
+# Transcribers
+# -----------------------------
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class SpeechToTextTranscriber:
+    """Groq or OpenAI speech to text (both speak the OpenAI audio API)."""
+
+    call_site = "voice_transcription"
+
+    def __init__(self, client, model: str, language: str = VOICE_LANGUAGE, provider: str = "",
+                 controller=None):
+        self.client = client
+        self.model = model
+        self.language = language
+        self.provider = provider
+        self.controller = controller
+
+    def transcribe(self, pcm: bytes) -> str:
+        profile = profile_for(self.call_site)
+        options = {"language": self.language} if self.language else {}
+        if profile.timeout:
+            options["timeout"] = profile.timeout
+        ticket = None
+        if self.controller is not None:
+            ticket = self.controller.admit(self.call_site, {"max_completion_tokens": profile.max_output_tokens})
+        call = telemetry.start_call(self.call_site, self.model, admission.current_session())
+        call.provider = self.provider
+        try:
+            response = self.client.audio.transcriptions.create(
+                model=self.model, file=("speech.wav", pcm_to_wav(pcm), "audio/wav"), **options,
+            )
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        finally:
+            if ticket is not None:
+                self.controller.release(ticket)
+        call.finish(getattr(response, "usage", None))
+        return response.text.strip()
+
+
+class StubTranscriber:
+    """Offline transcriber: fixed texts (or a length note) after a simulated delay."""
+
+    def __init__(self, texts=(), overhead: float = 0.0, seconds_per_audio_second: float = 0.0):
+        self._texts = deque(texts)
+        self.overhead = overhead
+        self.seconds_per_audio_second = seconds_per_audio_second
+
+    def transcribe(self, pcm: bytes) -> str:
+        audio_seconds = len(pcm) / (2 * SAMPLE_RATE)
+        time.sleep(self.overhead + audio_seconds * self.seconds_per_audio_second)
+        return self._texts.popleft() if self._texts else f"({audio_seconds:.1f} s of speech)"
+
+
+def make_transcriber(client, name: str = VOICE_TRANSCRIBER):
+    """The configured transcriber on the router's provider clients (Groq falls back to OpenAI)."""
+    if name == "stub":
+        return StubTranscriber()
+    clients = {provider.name: provider.client for provider in getattr(client, "providers", ())}
+    controller = getattr(client, "admission", None)
+    if name == "groq" and "groq" in clients:
+        return SpeechToTextTranscriber(clients["groq"], VOICE_MODELS["groq"], provider="groq", controller=controller)
+    return SpeechToTextTranscriber(clients.get("openai", client), VOICE_MODELS["openai"], provider="openai",
+                                   controller=controller)
+
+
+# -----------------------------
+# Per-session pipeline
+# -----------------------------
+class Utterance(NamedTuple):
+    text: str
+    segments: int
+    latency: float          # seconds from the last speech frame to the full text
+    detect_latency: float   # seconds from the end-of-utterance decision to the full text
+
+
+class _Pending:
+    __slots__ = ("futures", "last_voiced_at", "ended_at", "closed", "finished")
+
+    def __init__(self):
+        self.futures = []
+        self.last_voiced_at = None
+        self.ended_at = None
+        self.closed = False
+        self.finished = False
+
+
+class VoiceSession:
+    """Frames in, finished utterances out; ``feed`` is called from the audio thread.
+
+    The audio thread has no session context, so transcriptions are submitted
+    under the session that created the ``VoiceSession``.
+    """
+
+    def __init__(self, transcriber, vad=None, cutter: UtteranceCutter = None, incremental: bool = True):
+        self.transcriber = transcriber
+        self.incremental = incremental
+        self.session_id = admission.current_session()
+        self._cutter = cutter or UtteranceCutter(vad)
+        self._buffer = b""
+        self._held = []  # segments of the current utterance when not incremental
+        self._pending = _Pending()
+        self._ready = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def speaking(self) -> bool:
+        return self._cutter.in_utterance
+
+    def feed(self, pcm: bytes, now: float = None):
+        """Add 16 kHz mono int16 audio (any length)."""
+        now = time.perf_counter() if now is None else now
+        self._buffer += pcm
+        offset = 0
+        while len(self._buffer) - offset >= FRAME_BYTES:
+            frame = self._buffer[offset:offset + FRAME_BYTES]
+            offset += FRAME_BYTES
+            for event, value in self._cutter.feed(frame, now):
+                self._handle(event, value)
+        self._buffer = self._buffer[offset:]
+
+    def _handle(self, event: str, value):
+        pending = self._pending
+        if event == "segment":
+            if self.incremental:
+                pending.futures.append(self._submit(value))
+            else:
+                self._held.append(value)
+            return
+        self._pending = _Pending()
+        if event == "discard":
+            self._held = []
+            for future in pending.futures:
+                future.cancel()
+            return
+        if not self.incremental:
+            pending.futures.append(self._submit(b"".join(self._held)))
+            self._held = []
+        pending.last_voiced_at = value
+        pending.ended_at = time.perf_counter()
+        pending.closed = True
+        if not pending.futures:
+            return
+        for future in pending.futures:
+            future.add_done_callback(lambda _, pending=pending: self._maybe_finish(pending))
+
+    def _submit(self, pcm: bytes):
+        with admission.session(self.session_id):
+            return jobs.submit(self.transcriber.transcribe, pcm)
+
+    def _maybe_finish(self, pending: _Pending):
+        with self._lock:
+            if pending.finished or not all(future.done() for future in pending.futures):
+                return
+            pending.finished = True
+        texts = []
+        for future in pending.futures:
+            try:
+                texts.append(future.result())
+            except Exception as e:
+                logger.warning("transcription failed: %s", e)
+        now = time.perf_counter()
+        text = " ".join(t for t in texts if t).strip()
+        utterance = Utterance(text, len(pending.futures), now - pending.last_voiced_at, now - pending.ended_at)
+        record_voice_latency(utterance)
+        if text:
+            self._ready.append(utterance)
+
+    def ready(self) -> bool:
+        return bool(self._ready)
+
+    def pop(self):
+        """The oldest finished utterance, or None."""
+        try:
+            return self._ready.popleft()
+        except IndexError:
+            return None
+
+
+# -----------------------------
+# Latency accounting
+# -----------------------------
+_latencies = {"end_of_speech": [], "end_detected": []}
+_latency_lock = threading.Lock()
+
+
+def record_voice_latency(utterance: Utterance):
+    with _latency_lock:
+        for key, seconds in (("end_of_speech", utterance.latency), ("end_detected", utterance.detect_latency)):
+            samples = _latencies[key]
+            samples.append(seconds)
+            del samples[:-_MAX_SAMPLES]
+
+
+def voice_latency_stats() -> dict:
+    with _latency_lock:
+        snapshot = {key: sorted(values) for key, values in _latencies.items() if values}
+    return {
+        key: {
+            "count": len(values),
+            "p50_ms": round(values[len(values) // 2] * 1000, 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+        }
+        for key, values in snapshot.items()
+    }
+
+
+# -----------------------------
+# Streamlit widget
+# -----------------------------
+def voice_available() -> bool:
+    """Voice is opt-in (``ZARA_VOICE=1``) and needs the WebRTC packages."""
+    return (VOICE_ENABLED
+            and importlib.util.find_spec("streamlit_webrtc") is not None
+            and importlib.util.find_spec("av") is not None)
+
+
+def render_voice_control(client, tab_name: str):
+    """The voice toggle and, when on, the microphone stream for ``tab_name``.
+
+    Rendered on every rerun of the tab (also while a turn is pending), so the
+    stream is not torn down between stages.
+    """
+    if not voice_available():
+        return
+    if not st.toggle("🎤 Speak instead of typing", key=f"voice_on::{tab_name}"):
+        return
+    # Imported here: aiortc / PyAV are heavy and only needed once voice is on
+    import av
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+
+    key = f"voice::{tab_name}"
+    if key not in st.session_state:
+        st.session_state[key] = VoiceSession(make_transcriber(client))
+        st.session_state[f"{key}::resampler"] = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    session = st.session_state[key]
+    resampler = st.session_state[f"{key}::resampler"]
+
+    def on_audio(frame):
+        # Runs in the WebRTC thread: only the VoiceSession is touched here
+        for resampled in resampler.resample(frame):
+            session.feed(resampled.to_ndarray().tobytes())
+        return frame
+
+    context = webrtc_streamer(
+        key=f"voice-{tab_name}",
+        mode=WebRtcMode.SENDONLY,
+        audio_frame_callback=on_audio,
+        media_stream_constraints={"audio": True, "video": False},
+    )
+    if not context.state.playing:
+        return
+    st.caption("Listening… speak, then pause." if not session.speaking else "Hearing you…")
+
+    @st.fragment(run_every=jobs.POLL_INTERVAL_SECONDS)
+    def _watch():
+        if session.ready():
+            st.rerun(scope="app")
+
+    _watch()
+
+
+def take_text(tab_name: str):
+    """The learner's next spoken message for ``tab_name``, or None."""
+    session = st.session_state.get(f"voice::{tab_name}")
+    if session is None:
+        return None
+    utterance = session.pop()
+    return utterance.text if utterance else None
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local OpenAI-compatible mock server for offline evaluation and load tests.
+
+Implements ``POST /v1/chat/completions`` (streaming and non-streaming) and
+``GET /v1/models`` with configurable latency, per-token delay and failure
+rate (plus an optional slow tail and a requests-per-window limit answered
+with 429), so throughput changes can be measured
+without network access. Requests with ``reasoning_effort`` spend hidden
+reasoning tokens first (at the per-token delay), and ``max_completion_tokens``
+cuts the reply short the way a real reasoning model does.
+
+    python -m evaluation.mock_llm_server --port 8787 --latency 0.4 --token-delay 0.01
+
+Point the app or the runner at it with ``OPENAI_BASE_URL=http://127.0.0.1:8787/v1``.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+MOCK_TEXT = (
+    "That is a good question. In Pakistan, family courts handle marriage, divorce, "
+    "custody and maintenance cases. For example, a mother can ask the court for her "
+    "child's maintenance. A local legal aid office can help you start."
+)
+MOCK_JSON = {
+    "feedback": "That's wonderful! You stayed patient and planned well. These are strengths you can use again.",
+    "is_correct": True,
+}
+
+
+# Hidden reasoning tokens spent before the reply, per effort
+REASONING_TOKENS = {"minimal": 0, "low": 48, "medium": 192, "high": 768}
+REASONING_MODELS = ("o1", "o3", "o4", "gpt-5")
+
+
+def _count_tokens(text: str) -> int:
+    # Rough tokenizer stand-in: ~4 characters per token.
+    return max(1, len(text) // 4)
+
+
+def _reply_for(messages) -> str:
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    if '{"label"' in prompt:
+        return json.dumps({"label": "answer"})
+    if "JSON" in prompt:
+        return json.dumps(MOCK_JSON)
+    return MOCK_TEXT
+
+
+class MockSettings:
+    def __init__(self, latency: float = 0.2, token_delay: float = 0.005, fail_rate: float = 0.0,
+                 jitter: float = 0.0, cached_prefix_tokens: int = 0, slow_rate: float = 0.0,
+                 slow_latency: float = 5.0, rate_limit: int = 0, rate_window: float = 60.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.fail_rate = fail_rate
+        self.jitter = jitter
+        self.cached_prefix_tokens = cached_prefix_tokens
+        # Tail latency: this fraction of requests takes ``slow_latency`` instead
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # ``rate_limit`` requests per ``rate_window`` seconds, replenished continuously
+        # the way the provider's limiter does (0: no limit)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.allowance = float(rate_limit)
+        self.allowance_at = time.monotonic()
+        self.rate_limited = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None  # set per server class
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        settings = self.settings
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with settings.lock:
+            settings.requests += 1
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        if settings.rate_limit:
+            with settings.lock:
+                now = time.monotonic()
+                settings.allowance = min(settings.rate_limit, settings.allowance + (now - settings.allowance_at)
+                                         * settings.rate_limit / settings.rate_window)
+                settings.allowance_at = now
+                limited = settings.allowance < 1
+                if limited:
+                    settings.rate_limited += 1
+                else:
+                    settings.allowance -= 1
+            if limited:
+                self._send_json(429, {"error": {"message": "mock rate limit reached", "type": "rate_limit_exceeded"}})
+                return
+
+        if settings.slow_rate and random.random() < settings.slow_rate:
+            time.sleep(settings.slow_latency)
+        else:
+            time.sleep(max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter)))
+        if settings.fail_rate and random.random() < settings.fail_rate:
+            self._send_json(503, {"error": {"message": "mock upstream failure", "type": "server_error"}})
+            return
+
+        messages = request.get("messages", [])
+        model = request.get("model", "mock-model")
+        text = _reply_for(messages)
+        effort = request.get("reasoning_effort")
+        if effort is None and model.startswith(REASONING_MODELS):
+            effort = "medium"  # the API's default for reasoning models
+        reasoning = REASONING_TOKENS.get(effort, 0)
+        finish_reason = "stop"
+        limit = request.get("max_completion_tokens")
+        if limit is not None and reasoning + _count_tokens(text) > limit:
+            # Reasoning counts against the cap; what is left of the reply is cut off
+            text = text[:max(0, limit - reasoning) * 4]
+            finish_reason = "length"
+        if reasoning and settings.token_delay:
+            time.sleep(settings.token_delay * reasoning)
+        prompt_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = reasoning + (_count_tokens(text) if text else 0)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(prompt_tokens, settings.cached_prefix_tokens)},
+            "completion_tokens_details": {"reasoning_tokens": reasoning},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not request.get("stream"):
+            # The whole reply is generated before anything is sent
+            if settings.token_delay:
+                time.sleep(settings.token_delay * len(text.split(" ")))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        words = text.split(" ") if text else []
+        self.close_connection = True
+        try:
+            for i, word in enumerate(words):
+                piece = word if i == 0 else " " + word
+                delta = {"content": piece} if i else {"role": "assistant", "content": piece}
+                send({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                if settings.token_delay:
+                    time.sleep(settings.token_delay)
+            send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                send({**base, "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. the router closed a losing hedge)
+            pass
+
+
+class MockLLMServer:
+    """Run the mock on a background thread (for tests, benchmarks and load runs)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **settings):
+        self.settings = MockSettings(**settings)
+        handler = type("MockHandler", (_Handler,), {"settings": self.settings})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between streamed tokens")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to --latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests allowed per --rate-window (429 beyond)")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="seconds")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port,
+        latency=args.latency, token_delay=args.token_delay, jitter=args.jitter, fail_rate=args.fail_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        rate_limit=args.rate_limit, rate_window=args.rate_window,
+    )
+    print(f"Mock OpenAI-compatible server on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
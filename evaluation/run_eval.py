@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline evaluation runner for evaluation/evalDataset.txt.
+
+Every question is sent the way the freeform chat sends it: the tab's prompt
+builder, then ``registry.router`` (admission control, telemetry) with the
+tab's call site and its model profile's request options, many at a time on
+a bounded thread pool. The admission limits (``ZARA_LLM_RPM``,
+``ZARA_LLM_TPM``, ``ZARA_LLM_CONCURRENCY``) apply as in the app; set them
+to 0 for a raw throughput run. For each question the runner records
+latency and time-to-first-token of the LLM call (the messages are built
+before the clock starts) and token usage, then writes:
+
+- ``<out>/eval_<timestamp>.csv`` in the layout of evaluationSheet.xlsx
+  (Query, Response, the six score columns left blank for the reviewers,
+  Overall) plus the timing/usage columns;
+- ``<out>/eval_<timestamp>_summary.json`` with p50/p95/p99 latency and TTFT,
+  throughput and token totals.
+
+Run from the repo root:
+
+    python -m evaluation.run_eval --concurrency 8
+    python -m evaluation.run_eval --mock --concurrency 32 --repeat 5   # no network needed
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from core.llm_clients import ClientRegistry
+from core.model_profiles import request_options
+
+EVAL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(EVAL_DIR, "evalDataset.txt")
+DEFAULT_MODEL = "o4-mini-2025-04-16"
+
+# Column layout of the reviewer sheets in evaluationSheet.xlsx
+SHEET_COLUMNS = [
+    "Query", "Response", "Accuracy", "Clarity", "Comprehensiveness",
+    "Relevance", "Practical Guidance", "Empathy", "Overall",
+]
+TIMING_COLUMNS = [
+    "latency_ms", "ttft_ms", "prompt_tokens", "completion_tokens",
+    "cached_tokens", "total_tokens", "error",
+]
+
+
+def load_questions(path: str = DATASET_PATH) -> list:
+    questions = []
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("*"):
+                line = line.lstrip("* ").strip()
+            if line:
+                questions.append(line)
+    return questions
+
+
+def _tab_prompt_builder(tab: str):
+    """``(build_messages, call_site)`` of the tab's freeform chat."""
+    if tab == "reflection":
+        from tabs.solutions import SYSTEM_PROMPT, build_chat_messages_solutions as build
+        call_site = "reflection_chat"
+    else:
+        from tabs.identifying_stressors import SYSTEM_PROMPT, build_chat_messages as build
+        call_site = "roles_chat"
+
+    def build_messages(question: str):
+        # A fresh session's transcript: system prompt, then the learner's question.
+        history = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": question}]
+        return build(history, question)
+
+    return build_messages, call_site
+
+
+def percentile(values, pct: float):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return round(values[index], 1)
+
+
+# -----------------------------
+# One question
+# -----------------------------
+def run_one(client, model: str, build_messages, question: str, call_site: str) -> dict:
+    row = {"Query": question, "Response": "", "error": ""}
+    try:
+        messages = build_messages(question)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        row["latency_ms"] = row["ttft_ms"] = ""
+        return row
+    start = time.perf_counter()
+    first_token = None
+    usage = None
+    parts = []
+    try:
+        stream = client.chat.completions.create(
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            call_site=call_site,
+            **request_options(call_site, model),
+        )
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(chunk.choices[0].delta.content)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    end = time.perf_counter()
+
+    row["Response"] = "".join(parts)
+    row["latency_ms"] = round((end - start) * 1000, 1)
+    row["ttft_ms"] = round((first_token - start) * 1000, 1) if first_token else ""
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        row["prompt_tokens"] = usage.prompt_tokens
+        row["completion_tokens"] = usage.completion_tokens
+        row["cached_tokens"] = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        row["total_tokens"] = usage.total_tokens
+    return row
+
+
+# -----------------------------
+# Whole dataset
+# -----------------------------
+def run_eval(client, model: str, questions, build_messages, call_site: str, concurrency: int = 8) -> tuple:
+    rows = [None] * len(questions)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(run_one, client, model, build_messages, question, call_site): i
+            for i, question in enumerate(questions)
+        }
+        for future in as_completed(futures):
+            rows[futures[future]] = future.result()
+    wall = time.perf_counter() - start
+    return rows, summarize(rows, wall, concurrency, request_options(call_site, model)["model"])
+
+
+def summarize(rows, wall_seconds: float, concurrency: int, model: str) -> dict:
+    ok = [r for r in rows if not r["error"]]
+    latencies = [r["latency_ms"] for r in ok]
+    ttfts = [r["ttft_ms"] for r in ok if r["ttft_ms"] != ""]
+    return {
+        "model": model,
+        "questions": len(rows),
+        "errors": len(rows) - len(ok),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(rows) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": {p: percentile(latencies, int(p[1:])) for p in ("p50", "p95", "p99")},
+        "ttft_ms": {p: percentile(ttfts, int(p[1:])) for p in ("p50", "p95", "p99")},
+        "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in ok),
+        "completion_tokens": sum(r.get("completion_tokens") or 0 for r in ok),
+        "cached_tokens": sum(r.get("cached_tokens") or 0 for r in ok),
+    }
+
+
+def write_results(rows, summary: dict, out_dir: str) -> tuple:
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = os.path.join(out_dir, f"eval_{stamp}.csv")
+    summary_path = os.path.join(out_dir, f"eval_{stamp}_summary.json")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SHEET_COLUMNS + TIMING_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return csv_path, summary_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--tab", choices=["reflection", "roles"], default="roles",
+                        help="whose freeform prompt to use (Reflection or Role Integration)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="the session model (a profile may name another)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="run the dataset N times (load/throughput runs)")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"), help="OpenAI-compatible endpoint")
+    parser.add_argument("--mock", action="store_true", help="start a local mock server and run against it")
+    parser.add_argument("--mock-latency", type=float, default=0.3)
+    parser.add_argument("--out", default=os.path.join(EVAL_DIR, "results"))
+    args = parser.parse_args()
+
+    mock = None
+    base_url = args.base_url
+    api_key = os.getenv("OPENAI_API_KEY")
+    if args.mock:
+        from evaluation.mock_llm_server import MockLLMServer
+        mock = MockLLMServer(latency=args.mock_latency).start()
+        base_url, api_key = mock.base_url, "mock-key"
+    if not api_key:
+        parser.error("OPENAI_API_KEY is not set (or use --mock)")
+
+    registry = ClientRegistry(openai_api_key=api_key, openai_base_url=base_url)
+    questions = load_questions(args.dataset) * args.repeat
+    build_messages, call_site = _tab_prompt_builder(args.tab)
+    try:
+        rows, summary = run_eval(registry.router, args.model, questions, build_messages, call_site, args.concurrency)
+    finally:
+        registry.close()
+        if mock:
+            mock.stop()
+
+    csv_path, summary_path = write_results(rows, summary, args.out)
+    print(json.dumps(summary, indent=2))
+    print(f"Results: {csv_path}\nSummary: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
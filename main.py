@@ -7,21 +7,75 @@ Customized by Bushra for Zara Entrepreneur chatbot.
 
 import os
 import streamlit as st
-from openai import OpenAI
 
-# Keep original tab modules (so no import error)
-from tabs import solutions, identifying_stressors
+import tabs
+
+
+@st.cache_resource(show_spinner=False)
+def get_client_registry(openai_api_key: str, groq_api_key: str):
+    """Build the pooled LLM clients once per process; every session shares them."""
+    # Imported here: openai and httpx are the bulk of the cold start, and the
+    # page (title and topic radio) is drawn before they are needed
+    from core.llm_clients import ClientRegistry
+
+    return ClientRegistry(openai_api_key=openai_api_key, groq_api_key=groq_api_key)
+
+
+def render_admin_sidebar(registry):
+    # Imported here: retrieval and the semantic cache pull in numpy, which
+    # only this panel and the tabs that use them should pay for
+    from core import event_log, telemetry
+    from core.json_stream import visible_latency_stats
+    from core.model_profiles import profile_stats
+    from core.prompts import usage_stats
+    from core.response_cache import get_response_cache
+    from core.retrieval import get_retrieval_index, retrieval_available
+    from core.semantic_cache import SEMANTIC_CACHE_TABS, get_semantic_cache
+    from core.voice import voice_latency_stats
+
+    with st.sidebar.expander("LLM calls"):
+        st.json(telemetry.summary())
+    with st.sidebar.expander("Connection pool"):
+        st.json(registry.pool_stats())
+    with st.sidebar.expander("LLM providers"):
+        st.json(registry.router.stats())
+    with st.sidebar.expander("Model profiles"):
+        st.json(profile_stats())
+    with st.sidebar.expander("Response cache"):
+        st.json(get_response_cache().stats())
+    if SEMANTIC_CACHE_TABS:
+        with st.sidebar.expander("Semantic cache"):
+            st.json(get_semantic_cache().stats())
+    if retrieval_available():
+        with st.sidebar.expander("Retrieval index"):
+            st.json(get_retrieval_index().stats())
+    with st.sidebar.expander("Prompt cache (provider)"):
+        st.json(usage_stats())
+    with st.sidebar.expander("Feedback latency"):
+        st.json(visible_latency_stats())
+    with st.sidebar.expander("Voice input"):
+        st.json(voice_latency_stats())
+    with st.sidebar.expander("Event log"):
+        st.json(event_log.stats())
+    with st.sidebar.expander("Chat context"):
+        st.json({
+            key.split("::", 1)[1]: state.get("last_report")
+            for key, state in st.session_state.items()
+            if key.startswith("context::")
+        })
+    with st.sidebar.expander("Tabs loaded"):
+        st.json(tabs.loaded())
+
 
 def main():
     st.set_page_config(page_title="Zara | زارا", layout="centered")
     st.title("Zara || زارا - ROLE_INTEGRATION Assistant")
 
-    # OpenAI API initialization
+    # OpenAI API key
     try:
         api_key = st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OpenAI API key not found.")
-        client = OpenAI(api_key=api_key)
     except Exception as e:
         st.error(f"Failed to initialize OpenAI client: {e}")
         return
@@ -36,25 +90,47 @@ def main():
         st.error(f"Failed to set Groq API key: {e}")
         return
 
+    # Tab modules are imported the first time their label is picked (see tabs/__init__.py)
+    choice = st.radio("Which topic do you want to try first?", tabs.labels())
+
+    # Everything below serves the tab; imported after the radio is drawn
+    from core import admission, jobs, session_store, telemetry
+
+    # Shared, pooled clients (built on the first run, reused afterwards)
+    try:
+        registry = get_client_registry(api_key, groq_key)
+        # OpenAI and Groq behind one latency-aware router (hedging, breakers, retries)
+        client = registry.router
+    except Exception as e:
+        st.error(f"Failed to initialize OpenAI client: {e}")
+        return
+
+    # Prometheus endpoint / file, if configured (once per process)
+    telemetry.start_exporters()
+
+    if os.getenv("ZARA_ADMIN"):
+        render_admin_sidebar(registry)
+
     # Session state
     if "openai_model" not in st.session_state:
         st.session_state["openai_model"] = "o4-mini-2025-04-16"
     if "messages" not in st.session_state:
         st.session_state["messages"] = {}
 
-    # Sidebar options mapped to original tab modules, but with your new labels
-    label_map = {
-        "Reflection ": solutions,
-        "Identifying the right person": identifying_stressors
-    }
+    # Resume the lesson from the session store (signed id in the ?sid= query param)
+    sid = session_store.restore_session(tabs.system_prompt)
 
-    choice = st.radio("Which topic do you want to try first?", list(label_map.keys()))
+    # Turns still running in another tab are kept (or cancelled) per ZARA_JOBS_ON_NAVIGATE
+    jobs.on_navigate(tabs.get_spec(choice).tab)
 
-    module = label_map[choice]
-    if(choice=="Reflection "):
-        module.render_solutions(client)
-    else:   
-        module.render(client)
+    render = tabs.load(choice)
+    try:
+        # The session's LLM calls queue fairly against everyone else's (see core.admission)
+        with admission.session(sid):
+            render(client)
+    finally:
+        # Runs on st.rerun() too: write the new messages and stage changes
+        session_store.persist_session()
 
     # module.render(client)
 
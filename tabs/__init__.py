@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lesson tabs, registered lazily.
+
+Each tab is registered by label with the module and function that render
+it; the module (and whatever it imports: the flow engine, retrieval,
+numpy, ...) is imported the first time its label is picked in the topic
+radio, not when the app starts. A new tab only needs a ``register`` line
+here. ``python -m benchmarks.import_profile`` shows what each tab adds to
+the cold start.
+"""
+
+import importlib
+import threading
+from typing import NamedTuple
+
+
+class TabSpec(NamedTuple):
+    label: str
+    module: str      # dotted module path, imported on first use
+    function: str    # ``function(client)`` renders the tab
+    tab: str         # the name its messages and pending turn are kept under in the session
+
+
+_registry = {}     # label -> TabSpec, in radio order
+_renderers = {}    # label -> loaded render function
+_lock = threading.Lock()
+
+
+def register(label: str, module: str, function: str = "render", tab: str = None):
+    _registry[label] = TabSpec(label, module, function, tab or label)
+
+
+def labels():
+    return list(_registry)
+
+
+def get_spec(label: str) -> TabSpec:
+    return _registry[label]
+
+
+def load(label: str):
+    """The tab's render function, importing its module on first use."""
+    renderer = _renderers.get(label)
+    if renderer is None:
+        spec = _registry[label]
+        # Sessions run in parallel threads; import each tab module once
+        with _lock:
+            renderer = _renderers.get(label)
+            if renderer is None:
+                renderer = getattr(importlib.import_module(spec.module), spec.function)
+                _renderers[label] = renderer
+    return renderer
+
+
+def system_prompt(tab: str):
+    """``SYSTEM_PROMPT`` of the module behind the tab kept under ``tab``, or None."""
+    for spec in _registry.values():
+        if spec.tab == tab:
+            return getattr(importlib.import_module(spec.module), "SYSTEM_PROMPT", None)
+    return None
+
+
+def loaded():
+    """Labels whose modules have been imported in this process."""
+    return [label for label in _registry if label in _renderers]
+
+
+register("Reflection ", "tabs.solutions", "render_solutions", tab="Reflection")
+register("Identifying the right person", "tabs.identifying_stressors")
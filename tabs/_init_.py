@@ -1,11 +0,0 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-Created on Wed May 14 15:18:33 2025
-
-@author: amna
-"""
-
-# tabs/__init__.py
-from .solutions import render as solutions
-from .identifying_stressors import render as identifying_stressors
\ No newline at end of file
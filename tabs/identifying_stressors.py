@@ -9,7 +9,25 @@ learn how to balance multiple family and work responsibilities.
 """
 
 import streamlit as st
-import json
+
+from core import chat_view
+from core.admission import LOW, wait_message
+from core.context_builder import build_context, conversation_fingerprint, session_context
+from core.flow import DEFAULT, FREEFORM, MULTISELECT, TEXT, Flow, Go, Step, render_flow
+from core.json_stream import stream_json_feedback
+from core.message_log import MessageLog
+from core.model_profiles import request_options
+from core.prompts import register, stream_text
+from core.response_cache import cached_json_call
+from core.retrieval import build_reference_message
+from core.semantic_cache import (
+    get_semantic_cache,
+    lookup_turn,
+    semantic_cache_enabled,
+    simulate_stream,
+)
+from core.telemetry import parse_json
+from core.voice import take_text
 
 
 # -----------------------------
@@ -35,6 +53,43 @@ Your response rules:
 - If off-topic, kindly redirect back to role balance.
 """
 
+# Stage 1 grading prompt; the learner's roles and qualities go in the user message
+# so the instructions are a byte-identical (cacheable) prefix.
+QUALITIES_FEEDBACK_PROMPT = """
+You are Zara — a warm, supportive mentor who helps low-income Pakistani women 
+(with limited education and digital exposure) learn how to balance their family 
+and work responsibilities with confidence. You guide them through WhatsApp-style 
+sessions using relatable examples, small practical tips, and encouragement.Dont be very casual no need to greet here.
+
+The user message gives the INPUT: the learner's roles and the qualities she named.
+
+Your task:  
+1. If user gives 3–5 clear qualities/skills, celebrate warmly.  
+   - Reinforce each quality with reasoning or an example.  
+     For example: If they say “trustworthy,” you might add, “Yes, because you can rely on them with money or children without worry.”  
+   - Encourage reflection *inside the feedback itself* without asking them to type again. (e.g., “These qualities show you thought carefully about this person — it’s clear why they’re a strong choice.”)  
+
+2. If user gives fewer than 3, or vague/negative responses (e.g., “just available”), guide gently.  
+   - Appreciate what they shared.  
+   - Suggest simple, concrete qualities they could add (e.g., reliable, caring, experienced).  
+   - Reinforce by explaining why those qualities matter in daily life.  
+
+3. If user gives unrelated responses, redirect with kindness.  
+    - Acknowledge their input try to make sense of their input
+   - Explain what “qualities or skills” mean with an example.  
+   - Encourage them to think of 3–5 qualities of the person.  
+
+NOTE: Always respond in English, WhatsApp-style (short, 2–5 lines). Use simple, relatable examples from daily family and work life. No jargon. No long paragraphs. Be empathetic and encouraging.
+
+Output ONLY JSON:
+{"feedback": "<empathetic WhatsApp-style response>", "is_correct": true/false}
+"""
+
+QUALITIES_INPUT = "INPUT:\n- Roles: {roles}\n- Qualities: {qualities}"
+
+CHAT_PROMPT = register("roles_chat", SYSTEM_PROMPT)
+QUALITIES_PROMPT = register("ri_qualities", QUALITIES_FEEDBACK_PROMPT, QUALITIES_INPUT)
+
 
 # -----------------------------
 # Pre-scripted conversation messages
@@ -58,15 +113,18 @@ msg_360 = (
     "If you have any questions about role balance or family/work tips, feel free to ask me now."
 )
 
+# Scripted lines carry no information for the freeform model
+SCRIPTED_MESSAGES = frozenset([msg_357, msg_358, msg_358A, msg_360])
+
 
 # -----------------------------
 # Session Setup
 # -----------------------------
 def setup_session_state(tab_name: str):
     if tab_name not in st.session_state.messages:
-        st.session_state.messages[tab_name] = [
+        st.session_state.messages[tab_name] = MessageLog([
             {"role": "system", "content": SYSTEM_PROMPT}
-        ]
+        ])
     if "ri_stage" not in st.session_state:
         st.session_state.ri_stage = 0
     if "ri_roles" not in st.session_state:
@@ -81,117 +139,145 @@ def setup_session_state(tab_name: str):
 # Show chat history
 # -----------------------------
 def display_chat_history(tab_name: str):
-    for msg in st.session_state.messages[tab_name]:
-        if msg["role"] != "system":
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
+    # Only the latest window is drawn; older messages sit behind "Load earlier"
+    return chat_view.render_history(tab_name)
 
 
 # -----------------------------
-# MAIN RENDER FUNCTION
+# Stage 1 grading
 # -----------------------------
-def render(client):
-    tab_name = "Identifying the right person"
-    st.header("Role Integration: Balancing Family and Work")
-
-    setup_session_state(tab_name)
-    display_chat_history(tab_name)
-
-    # INTRO → 358
-    if st.session_state.ri_stage == 0:
-        if not any(msg["content"] == msg_357 for msg in st.session_state.messages[tab_name] if msg["role"] == "assistant"):
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_357})
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_358})
-
-        choice = st.multiselect(
-            "Select your roles:",
-            ["Mother", "Wife", "Daughter-in-law", "Businesswoman", "Other"],
-            key="ri_stage0_multi",
+def evaluate_qualities(client, roles: str, qualities: str, model: str, stream=None) -> dict:
+    """Grade the learner's qualities; runs in the job pool, so everything is passed in."""
+    options = request_options("ri_qualities", model)
+
+    # Build LLM JSON feedback
+    def _call():
+        if stream is not None:
+            messages = QUALITIES_PROMPT.messages(roles=roles, qualities=qualities)
+            return stream_json_feedback(client, model, messages, stream, "ri_qualities")
+        response = client.chat.completions.create(
+            messages=QUALITIES_PROMPT.messages(roles=roles, qualities=qualities),
+            stream=False,
+            call_site="ri_qualities",
+            **options,
         )
-        if choice:
-            st.session_state.ri_roles = ", ".join(choice)
-            st.session_state.messages[tab_name].append({"role": "user", "content": st.session_state.ri_roles})
-            st.session_state.ri_stage = 1
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_358A})
-
-    # 358A → qualities
-    elif st.session_state.ri_stage == 1:
-        qualities = st.text_input("Type 3–5 qualities:", key="ri_stage1_input")
-        st.session_state.ri_qualities = qualities
-        if qualities:
-            st.session_state.ri_qualities = qualities
-            st.session_state.messages[tab_name].append({"role": "user", "content": qualities})
-            st.session_state.ri_stage = 3
-    
-            # Build LLM JSON feedback
-            system_prompt_demo = f"""
-You are Zara — a warm, supportive mentor who helps low-income Pakistani women 
-(with limited education and digital exposure) learn how to balance their family 
-and work responsibilities with confidence. You guide them through WhatsApp-style 
-sessions using relatable examples, small practical tips, and encouragement.Dont be very casual no need to greet here.
+        raw_feedback = response.choices[0].message.content.strip()
+        return parse_json("ri_qualities", raw_feedback)
 
-INPUT:
-- Roles: {st.session_state.ri_roles}
-- Qualities: {st.session_state.ri_qualities}
+    # Same roles + qualities (after normalization) hit the shared cache
+    return cached_json_call(options["model"], "ri_qualities", QUALITIES_PROMPT.text, f"{roles}\n{qualities}", _call)
 
-Your task:  
-1. If user gives 3–5 clear qualities/skills, celebrate warmly.  
-   - Reinforce each quality with reasoning or an example.  
-     For example: If they say “trustworthy,” you might add, “Yes, because you can rely on them with money or children without worry.”  
-   - Encourage reflection *inside the feedback itself* without asking them to type again. (e.g., “These qualities show you thought carefully about this person — it’s clear why they’re a strong choice.”)  
 
-2. If user gives fewer than 3, or vague/negative responses (e.g., “just available”), guide gently.  
-   - Appreciate what they shared.  
-   - Suggest simple, concrete qualities they could add (e.g., reliable, caring, experienced).  
-   - Reinforce by explaining why those qualities matter in daily life.  
+# -----------------------------
+# Freeform chat prompt
+# -----------------------------
+def build_chat_messages(history, prompt: str, state: dict = None, client=None, model: str = None):
+    """Messages for a freeform turn; ``history`` already ends with the user's ``prompt``."""
+    system_messages = [{"role": "system", "content": CHAT_PROMPT.prefix}]
 
-3. If user gives unrelated responses, redirect with kindness.  
-    - Acknowledge their input try to make sense of their input
-   - Explain what “qualities or skills” mean with an example.  
-   - Encourage them to think of 3–5 qualities of the person.  
+    # Ground the reply in the few most relevant case notes, if any; it goes late
+    # in the list so the stable prefix stays cacheable
+    reference = build_reference_message(prompt)
 
-NOTE: Always respond in English, WhatsApp-style (short, 2–5 lines). Use simple, relatable examples from daily family and work life. No jargon. No long paragraphs. Be empathetic and encouraging.
+    # Stored history starts with its own copy of the system prompt; the builder skips it
+    llm_messages, _ = build_context(
+        system_messages, history, SCRIPTED_MESSAGES, state=state, client=client, model=model,
+        reference=reference,
+    )
+    return llm_messages
 
-Output ONLY JSON:
-{{"feedback": "<empathetic WhatsApp-style response>", "is_correct": true/false}}
-"""
-            try:
-                response = client.chat.completions.create(
-                    model=st.session_state["openai_model"],
-                    messages=[{"role": "system", "content": system_prompt_demo}],
-                    stream=False,
-                )
-                raw_feedback = response.choices[0].message.content.strip()
-                result = json.loads(raw_feedback)
-                feedback = result.get("feedback", "Thank you for sharing.")
-            except Exception as e:
-                feedback = f"⚠️ Error from LLM: {e}"
-                st.error(feedback)
-
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": feedback})
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_360})
-            st.session_state.ri_stage = 4
-            st.rerun()
-
-    # Freeform chat after 360
-    elif st.session_state.ri_stage >= 4:
-        if prompt := st.chat_input("Chat with Zara (Role Integration)"):
-            st.session_state.messages[tab_name].append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
-                st.markdown(prompt)
-
-            llm_messages = [{"role": "system", "content": SYSTEM_PROMPT}] + st.session_state.messages[tab_name]
-
-            with st.chat_message("assistant"):
+
+# -----------------------------
+# Freeform chat after 360
+# -----------------------------
+def freeform_turn(client, tab_name: str):
+    if prompt := st.chat_input("Chat with Zara (Role Integration)") or take_text(tab_name):
+        st.session_state.messages[tab_name].append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Opt-in semantic cache: replay a stored answer to a near-identical question
+        use_cache = semantic_cache_enabled(tab_name)
+        cached = None
+        if use_cache:
+            conversation = conversation_fingerprint(
+                st.session_state.messages[tab_name], SCRIPTED_MESSAGES, session_context(tab_name)
+            )
+            cached, query_vector, context = lookup_turn(
+                tab_name, SYSTEM_PROMPT, ROLES_FLOW.current(st.session_state).name, conversation, prompt
+            )
+
+        with st.chat_message("assistant"):
+            if cached is not None:
+                response = st.write_stream(simulate_stream(cached))
+            else:
                 try:
+                    llm_messages = build_chat_messages(
+                        st.session_state.messages[tab_name], prompt,
+                        state=session_context(tab_name), client=client, model=st.session_state["openai_model"],
+                    )
+
+                    # Shown while the call waits its turn behind other learners' calls
+                    waiting = st.empty()
+                    if message := wait_message(priority=LOW):
+                        waiting.caption(message)
                     stream = client.chat.completions.create(
-                        model=st.session_state["openai_model"],
                         messages=llm_messages,
                         stream=True,
+                        stream_options={"include_usage": True},
+                        call_site="roles_chat",
+                        **request_options("roles_chat", st.session_state["openai_model"]),
                     )
-                    response = st.write_stream(stream)
+                    waiting.empty()
+                    response = st.write_stream(stream_text(stream))
+                    if use_cache:
+                        get_semantic_cache().store(query_vector, context, response)
                 except Exception as e:
                     response = f"⚠️ Error: {e}"
                     st.error(response)
 
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": response})
+        st.session_state.messages[tab_name].append({"role": "assistant", "content": response})
+
+
+# -----------------------------
+# Lesson flow
+# -----------------------------
+def evaluate_qualities_step(client, qualities: str, model: str, values: dict, stream=None) -> dict:
+    try:
+        return evaluate_qualities(client, values["ri_roles"], qualities, model, stream)
+    except Exception as e:
+        return {"feedback": f"⚠️ Error from LLM: {e}"}
+
+
+ROLES_FLOW = Flow(
+    "roles",
+    [
+        # INTRO → 358
+        Step("roles", say=(msg_357, msg_358), input=MULTISELECT, placeholder="Select your roles:",
+             options=("Mother", "Wife", "Daughter-in-law", "Businesswoman", "Other"), widget_key="ri_stage0_multi",
+             route=False, store="ri_roles", next={DEFAULT: Go("qualities")}),
+        # 358A → qualities
+        Step("qualities", say=(msg_358A,), input=TEXT, placeholder="Type 3–5 qualities:", widget_key="ri_stage1_input",
+             route=False, store="ri_qualities", evaluate="ri_qualities", fallback="Thank you for sharing.",
+             next={DEFAULT: Go("freeform")}),
+        Step("freeform", say=(msg_360,), input=FREEFORM),
+    ],
+    stage_key="ri_stage",
+    emitted_key="ri_emitted",
+    evaluators={"ri_qualities": evaluate_qualities_step},
+    freeform=freeform_turn,
+)
+
+
+# -----------------------------
+# MAIN RENDER FUNCTION
+# -----------------------------
+def render(client):
+    tab_name = "Identifying the right person"
+    st.header("Role Integration: Balancing Family and Work")
+
+    setup_session_state(tab_name)
+    history = display_chat_history(tab_name)
+
+    # Stages, scripted messages and transitions are in ROLES_FLOW
+    render_flow(ROLES_FLOW, client, tab_name, history)
@@ -2,8 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import streamlit as st
-import time
-import json
+
+from core import chat_view
+from core.admission import LOW, wait_message
+from core.context_builder import build_context, conversation_fingerprint, session_context
+from core.flow import DEFAULT, FREEFORM, Flow, Go, Step, render_flow
+from core.intent_router import ANSWER, EXPECT_ANSWER, EXPECT_YES_NO, LABELS, NO, OFF_TOPIC, YES, route
+from core.json_stream import stream_json_feedback
+from core.message_log import MessageLog
+from core.model_profiles import request_options
+from core.prompts import register, stream_text
+from core.response_cache import cached_json_call
+from core.retrieval import build_reference_message
+from core.semantic_cache import (
+    get_semantic_cache,
+    lookup_turn,
+    semantic_cache_enabled,
+    simulate_stream,
+)
+from core.telemetry import parse_json
+from core.voice import take_text
 
 # -----------------------------
 # MODEL + SYSTEM PROMPT
@@ -95,6 +113,13 @@ Respond ONLY in JSON format like this:
 {"feedback": "You linked your success to patience and discipline — that's a stable strength you can trust again and again!", "is_correct": true}  
 """
 
+# Static prefixes (byte-identical every call) with the learner's input in the tail
+CHAT_PROMPT_SOLUTIONS = register("reflection_chat", SYSTEM_PROMPT)
+STAGE_PROMPTS_SOLUTIONS = {
+    "success_reflection": register("success_reflection", SUCCESS_REFLECTION_PROMPT, "User's response: {user_input}"),
+    "attribution_analysis": register("attribution_analysis", ATTRIBUTION_ANALYSIS_PROMPT, "User's response: {user_input}"),
+}
+
 # -----------------------------
 # Pre-scripted conversation messages following the exact flow
 # -----------------------------
@@ -113,6 +138,16 @@ msg_rethink_prompt = """Please think about a possible cause that can be traced b
 
 msg_failure_prompt = """Well done! Now think about a situation in which you experienced failure."""
 
+msg_final_encouragement = """Great work! You're learning to see your successes as coming from your own strengths (like patience, planning, hard work) and your setbacks as temporary challenges, not permanent failures.
+
+This way of thinking will help you balance your different roles with more confidence. Remember: your successes show your real abilities! 💪"""
+
+# Scripted lines carry no information for the freeform model
+SCRIPTED_MESSAGES_SOLUTIONS = frozenset([
+    msg_success_prompt, msg_attribution_prompt, msg_stable_internal_question, msg_perfect_response,
+    msg_rethink_prompt, msg_failure_prompt, msg_final_encouragement,
+])
+
 # -----------------------------
 # Session Setup
 # -----------------------------
@@ -120,9 +155,9 @@ def setup_session_state_solutions(tab_name: str):
     if "messages" not in st.session_state:
         st.session_state.messages = {}
     if tab_name not in st.session_state.messages:
-        st.session_state.messages[tab_name] = [
+        st.session_state.messages[tab_name] = MessageLog([
             {"role": "system", "content": SYSTEM_PROMPT}
-        ]
+        ])
     if "attribution_stage" not in st.session_state:
         st.session_state.attribution_stage = 0
     if "success_shared" not in st.session_state:
@@ -136,26 +171,26 @@ def setup_session_state_solutions(tab_name: str):
 # Show chat history
 # -----------------------------
 def display_chat_history_solutions(tab_name: str):
-    for msg in st.session_state.messages[tab_name]:
-        if msg["role"] != "system":
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
+    # Only the latest window is drawn; older messages sit behind "Load earlier"
+    return chat_view.render_history(tab_name)
 
 # -----------------------------
 # Open-ended LLM chat for random questions
 # -----------------------------
-def handle_open_ended_conversation_solutions(client, tab_name: str, user_input: str):
+def handle_open_ended_conversation_solutions(client, tab_name: str, user_input: str, model: str = None):
     """Handle random questions during training using the open-ended prompt"""
+    model = model or st.session_state["openai_model"]
     try:
         open_ended_messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": CHAT_PROMPT_SOLUTIONS.prefix},
             {"role": "user", "content": user_input}
         ]
         
         response = client.chat.completions.create(
-            model=st.session_state["openai_model"],
             messages=open_ended_messages,
             stream=False,
+            call_site="reflection_open_ended",
+            **request_options("reflection_open_ended", model),
         )
         
         return response.choices[0].message.content.strip()
@@ -168,211 +203,211 @@ def handle_open_ended_conversation_solutions(client, tab_name: str, user_input:
 # -----------------------------
 def is_off_topic_question_solutions(user_input: str) -> bool:
     """Check if the user's input is a random question unrelated to the current stage"""
-    off_topic_keywords = [
-        "what is", "how to", "tell me about", "explain", "why", "when", 
-        "stress management", "money management", "digital literacy", "branding",
-        "marriage", "politics", "religion", "weather", "food", "prayer", "namaz",
-        "health", "doctor", "medicine"
-    ]
-    
-    user_lower = user_input.lower()
-    return any(keyword in user_lower for keyword in off_topic_keywords)
+    return route(user_input, EXPECT_ANSWER).label == OFF_TOPIC
+
+
+INTENT_CLASSIFIER_PROMPT = register("intent", """
+You classify a learner's reply in a short lesson about success and failure attribution.
+The next message says what the lesson asked, then the learner's reply.
+
+Labels:
+- "answer": the learner is answering the lesson question (any story, cause or reflection).
+- "yes" / "no": the learner answers the yes/no question (only when a yes/no was asked).
+- "clarify": the learner asks what the lesson's question means or to hear it again.
+- "off_topic": the learner asks about something unrelated to the lesson.
+- "unclear": you cannot tell.
+
+Respond ONLY in JSON format like this:
+{"label": "answer"}
+""", "The lesson asked: {expected}.\nUser's response: {user_input}")
+
+
+def classify_with_llm_solutions(client, user_input: str, expect: str, model: str = None) -> str:
+    """Ask the LLM to label an input the local router could not decide on."""
+    expected = "a yes/no question" if expect == EXPECT_YES_NO else "for a personal story or cause"
+    options = request_options("intent", model or st.session_state["openai_model"])
+
+    def _call():
+        response = client.chat.completions.create(
+            messages=INTENT_CLASSIFIER_PROMPT.messages(expected=expected, user_input=user_input),
+            stream=False,
+            call_site="intent",
+            **options,
+        )
+        return parse_json("intent", response.choices[0].message.content.strip())
+
+    try:
+        label = cached_json_call(
+            options["model"], f"intent_{expect}", INTENT_CLASSIFIER_PROMPT.text, user_input, _call, required_key="label"
+        )["label"]
+    except Exception:
+        label = None
+    if label not in LABELS:
+        # Keep the lesson moving: treat it as an answer (or "no" at the yes/no stage)
+        label = NO if expect == EXPECT_YES_NO else ANSWER
+    return label
+
+
+def route_stage_input_solutions(client, user_input: str, expect: str = EXPECT_ANSWER, model: str = None) -> str:
+    """Route a stage input locally; only undecidable inputs cost an LLM call."""
+    result = route(user_input, expect)
+    if not result.needs_llm:
+        return result.label
+    return classify_with_llm_solutions(client, user_input, expect, model)
 
 # -----------------------------
 # Evaluate responses using specific prompts
 # -----------------------------
-def evaluate_with_prompt_solutions(client, user_input: str, prompt_type: str):
-    """Evaluate user responses using specific system prompts"""
+def evaluate_with_prompt_solutions(client, user_input: str, prompt_type: str, model: str = None, stream=None):
+    """Evaluate user responses using specific system prompts
+
+    With a ``FeedbackStream`` the reply is streamed and its feedback text pushed as it arrives.
+    """
     
-    if prompt_type == "success_reflection":
-        system_prompt = SUCCESS_REFLECTION_PROMPT
-    elif prompt_type == "attribution_analysis":
-        system_prompt = ATTRIBUTION_ANALYSIS_PROMPT
-    else:
+    prompt = STAGE_PROMPTS_SOLUTIONS.get(prompt_type)
+    if prompt is None:
         return {"feedback": "Thank you for sharing that with me.", "is_correct": True}
     
-    try:
+    model = model or st.session_state["openai_model"]
+    options = request_options(prompt_type, model)
+
+    def _call():
+        if stream is not None:
+            return stream_json_feedback(client, model, prompt.messages(user_input=user_input), stream, prompt_type)
         response = client.chat.completions.create(
-            model=st.session_state["openai_model"],
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"User's response: {user_input}"}
-            ],
+            messages=prompt.messages(user_input=user_input),
             stream=False,
+            call_site=prompt_type,
+            **options,
         )
         raw_feedback = response.choices[0].message.content.strip()
-        result = json.loads(raw_feedback)
-        return result
+        return parse_json(prompt_type, raw_feedback)
+
+    try:
+        # Identical answers (after normalization) are served from the shared cache
+        return cached_json_call(options["model"], prompt_type, prompt.text, user_input, _call)
         
     except Exception as e:
         return {"feedback": "Thank you for sharing that with me.", "is_correct": True}
 
 # -----------------------------
-# MAIN RENDER FUNCTION
+# Freeform chat prompt
 # -----------------------------
-def render_solutions(client):
-    tab_name = "Reflection"
-    st.header("Building Confidence Through Success Attribution")
+def build_chat_messages_solutions(history, prompt: str, state: dict = None, client=None, model: str = None):
+    """Messages for a freeform turn; ``history`` already ends with the user's ``prompt``."""
+    # Use the updated system prompt for open-ended conversation
+    system_messages = [{"role": "system", "content": CHAT_PROMPT_SOLUTIONS.prefix}]
 
-    setup_session_state_solutions(tab_name)
-    display_chat_history_solutions(tab_name)
+    # Ground the reply in the few most relevant case notes, if any; it goes late
+    # in the list so the stable prefix stays cacheable
+    reference = build_reference_message(prompt)
 
-    # tab_name = "Reflection"
+    current_messages, _ = build_context(
+        system_messages, history, SCRIPTED_MESSAGES_SOLUTIONS, state=state, client=client, model=model,
+        reference=reference,
+    )
+    return current_messages
 
-    # if tab_name not in st.session_state["messages"]:
-    #     st.session_state["messages"][tab_name] = [{"role": "system", "content": SYSTEM_PROMPT}]
-
-    # if "reflection_stage" not in st.session_state:
-    #     st.session_state["reflection_stage"] = 0
-
-    # STAGE 0: Ask for success story
-    if st.session_state.attribution_stage == 0:
-        if not any(msg["content"] == msg_success_prompt for msg in st.session_state.messages[tab_name] if msg["role"] == "assistant"):
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_success_prompt})
-            display_chat_history_solutions(tab_name)
-        
-        st.session_state.attribution_stage = 1
-
-    # STAGE 1: Collect success story
-    elif st.session_state.attribution_stage == 1:
-        user_input = st.chat_input("Share a situation where you were successful:")
-        if user_input:
-            # Check if it's an off-topic question
-            if is_off_topic_question_solutions(user_input):
-                open_ended_response = handle_open_ended_conversation_solutions(client, tab_name, user_input)
-                st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": open_ended_response})
-                display_chat_history_solutions(tab_name)
-                return
-            
-            st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-            
-            # Evaluate success story
-            result = evaluate_with_prompt_solutions(client, user_input, "success_reflection")
-            feedback = result.get("feedback", "Thank you for sharing that with me.")
-            
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": feedback})
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_attribution_prompt})
-            st.session_state.attribution_stage = 2
-            
-            display_chat_history_solutions(tab_name)
-
-    # STAGE 2: Ask about attribution causes
-    elif st.session_state.attribution_stage == 2:
-        user_input = st.chat_input("What causes did you attribute your success to?")
-        if user_input:
-            # Check if it's an off-topic question
-            if is_off_topic_question_solutions(user_input):
-                open_ended_response = handle_open_ended_conversation_solutions(client, tab_name, user_input)
-                st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": open_ended_response})
-                display_chat_history_solutions(tab_name)
-                return
-            
-            st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_stable_internal_question})
-            st.session_state.attribution_stage = 3
-            
-            display_chat_history_solutions(tab_name)
-
-    # STAGE 3: Check if attribution is stable and internal
-    elif st.session_state.attribution_stage == 3:
-        user_input = st.chat_input("Was this cause traced back to yourself and stable? (Yes/No)")
-        if user_input:
-            # Check if it's an off-topic question
-            if is_off_topic_question_solutions(user_input):
-                open_ended_response = handle_open_ended_conversation_solutions(client, tab_name, user_input)
-                st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": open_ended_response})
-                display_chat_history_solutions(tab_name)
-                return
-            
-            st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-            
-            # Check if they answered Yes or No
-            if "yes" in user_input.lower() or "haan" in user_input.lower():
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_perfect_response})
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_failure_prompt})
-                st.session_state.attribution_stage = 5  # Skip to failure stage
+# -----------------------------
+# Freeform chat (after the lesson)
+# -----------------------------
+def freeform_turn_solutions(client, tab_name: str):
+    """Open-ended chat about role integration"""
+    if prompt := st.chat_input("Chat with Zara (Role Integration)") or take_text(tab_name):
+        st.session_state.messages[tab_name].append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Opt-in semantic cache: replay a stored answer to a near-identical question
+        use_cache = semantic_cache_enabled(tab_name)
+        cached = None
+        if use_cache:
+            conversation = conversation_fingerprint(
+                st.session_state.messages[tab_name], SCRIPTED_MESSAGES_SOLUTIONS, session_context(tab_name)
+            )
+            cached, query_vector, context = lookup_turn(
+                tab_name, SYSTEM_PROMPT, REFLECTION_FLOW.current(st.session_state).name, conversation, prompt
+            )
+
+        with st.chat_message("assistant"):
+            if cached is not None:
+                response = st.write_stream(simulate_stream(cached))
             else:
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_rethink_prompt})
-                st.session_state.attribution_stage = 4
-            
-            display_chat_history_solutions(tab_name)
-
-    # STAGE 4: Help them think of stable internal causes
-    elif st.session_state.attribution_stage == 4:
-        user_input = st.chat_input("Think of a cause that can be traced back to yourself and is stable:")
-        if user_input:
-            # Check if it's an off-topic question
-            if is_off_topic_question_solutions(user_input):
-                open_ended_response = handle_open_ended_conversation_solutions(client, tab_name, user_input)
-                st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": open_ended_response})
-                display_chat_history_solutions(tab_name)
-                return
-            
-            st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-            
-            # Evaluate their stable internal attribution
-            result = evaluate_with_prompt_solutions(client, user_input, "attribution_analysis")
-            feedback = result.get("feedback", "That's a good way to think about it!")
-            
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": feedback})
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": msg_failure_prompt})
-            st.session_state.attribution_stage = 5
-            
-            display_chat_history_solutions(tab_name)
-
-    # STAGE 5: Ask about failure situation
-    elif st.session_state.attribution_stage == 5:
-        user_input = st.chat_input("Think about a situation where you experienced failure:")
-        if user_input:
-            # Check if it's an off-topic question
-            if is_off_topic_question_solutions(user_input):
-                open_ended_response = handle_open_ended_conversation_solutions(client, tab_name, user_input)
-                st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-                st.session_state.messages[tab_name].append({"role": "assistant", "content": open_ended_response})
-                display_chat_history_solutions(tab_name)
-                return
-            
-            st.session_state.messages[tab_name].append({"role": "user", "content": user_input})
-            
-            # Evaluate failure attribution
-            result = evaluate_with_prompt_solutions(client, user_input, "attribution_analysis")
-            feedback = result.get("feedback", "Thank you for being honest about that experience.")
-            
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": feedback})
-            
-            # Final encouragement message
-            final_message = """Great work! You're learning to see your successes as coming from your own strengths (like patience, planning, hard work) and your setbacks as temporary challenges, not permanent failures.
-
-This way of thinking will help you balance your different roles with more confidence. Remember: your successes show your real abilities! 💪"""
-            
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": final_message})
-            st.session_state.attribution_stage = 6
-            
-            display_chat_history_solutions(tab_name)
-
-    # STAGE 6+: Open-ended chat about role integration
-    elif st.session_state.attribution_stage >= 6:
-        if prompt := st.chat_input("Chat with Zara (Role Integration)"):
-            st.session_state.messages[tab_name].append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
-                st.markdown(prompt)
-            with st.chat_message("assistant"):
                 try:
-                    # Use the updated system prompt for open-ended conversation
-                    current_messages = st.session_state.messages[tab_name].copy()
-                    current_messages[0] = {"role": "system", "content": SYSTEM_PROMPT}
-                    
+                    current_messages = build_chat_messages_solutions(
+                        st.session_state.messages[tab_name], prompt,
+                        state=session_context(tab_name), client=client, model=st.session_state["openai_model"],
+                    )
+
+                    # Shown while the call waits its turn behind other learners' calls
+                    waiting = st.empty()
+                    if message := wait_message(priority=LOW):
+                        waiting.caption(message)
                     stream = client.chat.completions.create(
-                        model=st.session_state["openai_model"],
                         messages=current_messages,
                         stream=True,
+                        stream_options={"include_usage": True},
+                        call_site="reflection_chat",
+                        **request_options("reflection_chat", st.session_state["openai_model"]),
                     )
-                    response = st.write_stream(stream)
+                    waiting.empty()
+                    response = st.write_stream(stream_text(stream))
+                    if use_cache:
+                        get_semantic_cache().store(query_vector, context, response)
                 except Exception as e:
                     response = f"⚠️ Error: {e}"
                     st.error(response)
-            st.session_state.messages[tab_name].append({"role": "assistant", "content": response})
\ No newline at end of file
+        st.session_state.messages[tab_name].append({"role": "assistant", "content": response})
+
+# -----------------------------
+# Lesson flow
+# -----------------------------
+def _stage_evaluator_solutions(prompt_type: str):
+    def evaluate(client, user_input: str, model: str, values: dict, stream=None):
+        return evaluate_with_prompt_solutions(client, user_input, prompt_type, model, stream)
+    return evaluate
+
+
+REFLECTION_FLOW = Flow(
+    "reflection",
+    [
+        Step("success", say=(msg_success_prompt,), placeholder="Share a situation where you were successful:",
+             evaluate="success_reflection", next={DEFAULT: Go("attribution")}),
+        Step("attribution", say=(msg_attribution_prompt,), placeholder="What causes did you attribute your success to?",
+             next={DEFAULT: Go("stable")}),
+        Step("stable", say=(msg_stable_internal_question,),
+             placeholder="Was this cause traced back to yourself and stable? (Yes/No)", expect=EXPECT_YES_NO,
+             next={YES: Go("failure", say=(msg_perfect_response,)), DEFAULT: Go("rethink")}),
+        Step("rethink", say=(msg_rethink_prompt,),
+             placeholder="Think of a cause that can be traced back to yourself and is stable:",
+             evaluate="attribution_analysis", fallback="That's a good way to think about it!",
+             next={DEFAULT: Go("failure")}),
+        Step("failure", say=(msg_failure_prompt,), placeholder="Think about a situation where you experienced failure:",
+             evaluate="attribution_analysis", fallback="Thank you for being honest about that experience.",
+             next={DEFAULT: Go("freeform")}),
+        Step("freeform", say=(msg_final_encouragement,), input=FREEFORM),
+    ],
+    stage_key="attribution_stage",
+    emitted_key="attribution_emitted",
+    evaluators={
+        "success_reflection": _stage_evaluator_solutions("success_reflection"),
+        "attribution_analysis": _stage_evaluator_solutions("attribution_analysis"),
+    },
+    classify=classify_with_llm_solutions,
+    open_ended=handle_open_ended_conversation_solutions,
+    freeform=freeform_turn_solutions,
+    open_ended_fallback="⚠️ I'm having trouble understanding right now. Let's continue with our lesson about balancing your different roles.",
+)
+
+# -----------------------------
+# MAIN RENDER FUNCTION
+# -----------------------------
+def render_solutions(client):
+    tab_name = "Reflection"
+    st.header("Building Confidence Through Success Attribution")
+
+    setup_session_state_solutions(tab_name)
+    history = display_chat_history_solutions(tab_name)
+
+    # Stages, scripted messages and transitions are in REFLECTION_FLOW
+    render_flow(REFLECTION_FLOW, client, tab_name, history)
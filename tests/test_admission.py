@@ -0,0 +1,135 @@
+"""``AdmissionController``: round robin between sessions, priorities, limits and timeouts."""
+
+import threading
+import time
+
+import pytest
+
+from core import admission
+from core.admission import HIGH, LOW, NORMAL, AdmissionController, AdmissionTimeout, TokenBucket
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.002)
+
+
+class Burst:
+    """Queue calls one at a time behind a held slot, then record the order they are admitted in."""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.order = []
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def call(self, sid, name, call_site=None, stream=False):
+        def run():
+            with admission.session(sid):
+                ticket = self.controller.admit(call_site, {"stream": stream})
+            with self._lock:
+                self.order.append(name)
+            self.controller.release(ticket)
+
+        queued = self.controller._waiting
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        wait_until(lambda: self.controller._waiting == queued + 1)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+        return self.order
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(rpm=0, tpm=0, concurrency=1, timeout=5)
+
+
+def test_sessions_take_turns(controller):
+    held = controller.admit()
+    burst = Burst(controller)
+    for name in ("a1", "a2", "a3"):
+        burst.call("a", name)
+    burst.call("b", "b1")
+    burst.call("c", "c1")
+    burst.call("b", "b2")
+    controller.release(held)
+    # A busy session gets one call per round, not its whole backlog first
+    assert burst.join() == ["a1", "b1", "c1", "a2", "b2", "a3"]
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_priorities_go_first(controller):
+    held = controller.admit()
+    burst = Burst(controller)
+    burst.call("a", "chat", stream=True)
+    burst.call("b", "reply")
+    burst.call("c", "grade", call_site="ri_qualities")
+    controller.release(held)
+    assert burst.join() == ["grade", "reply", "chat"]
+
+
+def test_priority_for():
+    assert admission.priority_for("ri_qualities") == HIGH
+    assert admission.priority_for(None) == NORMAL
+    assert admission.priority_for(None, stream=True) == LOW
+
+
+def test_timeout_leaves_the_queue(controller):
+    controller.timeout = 0.05
+    held = controller.admit()
+    with pytest.raises(AdmissionTimeout):
+        controller.admit()
+    stats = controller.stats()
+    assert stats["timeouts"] == 1 and stats["sessions_waiting"] == 0
+    controller.release(held)
+    controller.release(controller.admit())
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_release_is_idempotent(controller):
+    ticket = controller.admit()
+    controller.release(ticket)
+    controller.release(ticket)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_request_bucket_paces_calls():
+    controller = AdmissionController(rpm=2, tpm=0, concurrency=0, timeout=5, period=0.2)
+    started = time.monotonic()
+    for _ in range(4):
+        controller.release(controller.admit())
+    # Two go out at once; the other two wait for the bucket to refill (0.1 s each)
+    assert time.monotonic() - started >= 0.18
+
+
+def test_token_bucket_corrects_charge():
+    controller = AdmissionController(rpm=0, tpm=10_000, concurrency=0, timeout=5)
+    ticket = controller.admit(None, {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 500})
+    assert ticket.tokens == 600
+    assert round(controller.tokens.tokens) == 9400
+    controller.release(ticket, usage={"total_tokens": 150})
+    assert round(controller.tokens.tokens) == 9850
+
+
+def test_bucket_deficit():
+    bucket = TokenBucket(60, period=60)
+    bucket.take(60)
+    assert bucket.deficit(1) == pytest.approx(1.0)
+    assert bucket.deficit(0) == 0.0
+
+
+def test_expected_wait_counts_sessions_ahead(controller):
+    held = controller.admit()
+    burst = Burst(controller)
+    burst.call("a", "a1")
+    burst.call("b", "b1")
+    assert controller.queued("b") and not controller.queued("c")
+    assert controller.expected_wait("a") < controller.expected_wait("b")
+    controller.release(held)
+    burst.join()
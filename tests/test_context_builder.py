@@ -0,0 +1,90 @@
+"""``build_context``: budget trimming and the rolling summary's retries."""
+
+from concurrent.futures import Future
+
+import pytest
+
+from core import context_builder, jobs
+from core.context_builder import build_context, count_message_tokens
+
+SYSTEM = [{"role": "system", "content": "You are Zara."}]
+
+
+def chat(n, words=20):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+            for i in range(n)]
+
+
+def test_fits_without_trimming():
+    history = chat(6)
+    messages, report = build_context(SYSTEM, history, max_tokens=10_000)
+    assert messages == SYSTEM + history
+    assert report.verbatim_turns == 6
+
+
+def test_older_turns_go_before_recent_ones():
+    history = chat(12)
+    messages, _ = build_context(SYSTEM, history, recent_turns=4, max_tokens=count_message_tokens(SYSTEM + history[-5:]))
+    assert messages == SYSTEM + history[-5:]
+
+
+def test_recent_window_is_trimmed_last_and_keeps_the_newest():
+    history = chat(8)
+    messages, report = build_context(SYSTEM, history, recent_turns=8, max_tokens=count_message_tokens(SYSTEM + history[-3:]))
+    assert messages == SYSTEM + history[-3:]
+    assert report.tokens_after <= count_message_tokens(SYSTEM + history[-3:])
+
+    reference = {"role": "system", "content": "Case notes."}
+    messages, _ = build_context(SYSTEM, history, recent_turns=8, max_tokens=1, reference=reference)
+    assert messages == SYSTEM + [reference, history[-1]]
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    calls = []
+
+    def submit(fn, *args):
+        calls.append(args)
+        future = Future()
+        future.set_exception(RuntimeError("summary model down"))
+        return future
+
+    monkeypatch.setattr(jobs, "submit", submit)
+    return calls
+
+
+def test_failed_summary_waits_before_retrying(submitted, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(context_builder.time, "time", lambda: now[0])
+    state = {}
+    history = chat(16)
+    build = lambda: build_context(SYSTEM, history, state=state, client=object(), model="m", recent_turns=4)
+
+    build()                       # submits; the job fails at once
+    build()                       # sees the failure
+    assert len(submitted) == 1 and state["failures"] == 1
+    assert state["retry_after"] == 1000 + context_builder.SUMMARY_RETRY_SECONDS
+    build()
+    assert len(submitted) == 1
+
+    now[0] = state["retry_after"]
+    build()                       # retried
+    build()
+    assert len(submitted) == 2 and state["failures"] == 2
+    assert state["retry_after"] == now[0] + 2 * context_builder.SUMMARY_RETRY_SECONDS
+
+
+def test_summary_replaces_older_turns(monkeypatch):
+    def submit(fn, client, model, previous, turns):
+        future = Future()
+        future.set_result(f"{len(turns)} turns summarized")
+        return future
+
+    monkeypatch.setattr(jobs, "submit", submit)
+    state = {"failures": 1, "retry_after": 0}
+    history = chat(16)
+    build_context(SYSTEM, history, state=state, client=object(), model="m", recent_turns=4)
+    messages, report = build_context(SYSTEM, history, state=state, client=object(), model="m", recent_turns=4)
+    assert messages[1]["content"].endswith("12 turns summarized")
+    assert messages[2:] == history[-4:]
+    assert report.summarized_turns == 12 and "failures" not in state
@@ -0,0 +1,60 @@
+"""Event log: the default backend, LLM call events labelled with their session, and the report."""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from core import admission, event_log
+from core.llm_router import LLMRouter, Provider
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "events"
+    monkeypatch.setattr(event_log, "_writer", event_log.JSONLWriter(str(directory)))
+    monkeypatch.setattr(event_log, "_writer_started", True)
+    yield str(directory)
+    event_log._writer.close()
+
+
+def read(directory):
+    event_log.flush()
+    event_log._writer.close()
+    return list(event_log.iter_events(directory))
+
+
+@pytest.mark.skipif("ZARA_EVENT_LOG" in os.environ, reason="ZARA_EVENT_LOG is set")
+def test_off_by_default():
+    assert event_log.EVENT_LOG_URL == "off"
+    assert event_log.open_writer(event_log.EVENT_LOG_URL) is None
+
+
+class _Completions:
+    def create(self, **kwargs):
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=3), choices=[])
+
+
+def test_llm_events_carry_the_session(log_dir):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
+    router = LLMRouter([Provider("stub", client)], hedging=False)
+    with admission.session("learner-1"):
+        router.create(call_site="ri_qualities", model="m", messages=[{"role": "user", "content": "hi"}])
+    router.create(call_site="ri_qualities", model="m", messages=[{"role": "user", "content": "hi"}])
+    router.close()
+    events = [e for e in read(log_dir) if e["e"] == "llm"]
+    assert [e["s"] for e in events] == ["learner-1", ""]
+    assert events[0]["call_site"] == "ri_qualities" and events[0]["outcome"] == "ok"
+
+
+def test_report_funnel(log_dir):
+    for sid, last in (("a", 2), ("b", 0)):
+        for index in range(last + 1):
+            event_log.emit("stage", sid, flow="demo", step=f"s{index}", index=index)
+            event_log.emit("turn", sid, flow="demo", step=f"s{index}", label="answer", ms=100)
+    event_log.emit("turn", "a", flow="demo", step="s2", label="off_topic", ms=50)
+    read(log_dir)
+    rows = {row["step"]: row for row in event_log.build_report(log_dir).to_dict()["flows"]["demo"]}
+    assert rows["s0"]["sessions"] == 2 and rows["s0"]["stopped_here"] == 1
+    assert rows["s2"]["sessions"] == 1 and rows["s2"]["stopped_here"] == 1
+    assert rows["s2"]["off_topic_rate"] == 0.5
@@ -0,0 +1,116 @@
+"""Headless ``Flow`` runs: enter/begin/apply over a plain dict and list."""
+
+import pytest
+
+from core.flow import DEFAULT, FREEFORM, Flow, Go, Step, clarify_request
+from core.intent_router import ANSWER, CLARIFY, EXPECT_YES_NO, NO, OFF_TOPIC, YES
+
+
+def make_flow(**kwargs):
+    steps = [
+        Step("hello", say=("Welcome.", "What went well today?"), evaluate="grade",
+             fallback="Thanks.", store="success", next={DEFAULT: Go("again")}),
+        Step("again", say=("Was it your own doing?",), expect=EXPECT_YES_NO,
+             next={YES: Go("done", say=("Great.",)), NO: Go("done"), DEFAULT: Go("again")}),
+        Step("done", say=("Tell me anything.",), input=FREEFORM),
+    ]
+    return Flow("demo", steps, "demo_stage", "demo_emitted", evaluators={"grade": None}, **kwargs)
+
+
+def texts(messages):
+    return [m["content"] for m in messages]
+
+
+def test_enter_says_opening_messages_once():
+    flow, session, messages = make_flow(), {}, []
+    assert flow.enter(session, messages)
+    assert texts(messages) == ["Welcome.", "What went well today?"]
+    assert session["demo_stage"] == 0 and session["demo_emitted"] == 0b1
+    # A rerun must not repeat them
+    assert not flow.enter(session, messages)
+    assert len(messages) == 2
+
+
+def test_begin_stores_input_and_routes():
+    flow, session, messages = make_flow(), {}, []
+    flow.enter(session, messages)
+    result = flow.begin(session, messages, "I finished my stall's accounts")
+    assert result.label == ANSWER
+    assert session["success"] == "I finished my stall's accounts"
+    assert messages[-1] == {"role": "user", "content": "I finished my stall's accounts"}
+    assert flow.values(session) == {"success": "I finished my stall's accounts"}
+
+
+def test_apply_gives_feedback_and_follows_default():
+    flow, session, messages = make_flow(), {}, []
+    flow.enter(session, messages)
+    flow.begin(session, messages, "I sold everything")
+    flow.apply(session, messages, ANSWER, evaluation={"feedback": "Well done."})
+    assert texts(messages)[-2:] == ["Well done.", "Was it your own doing?"]
+    assert flow.current(session).name == "again"
+    assert session["demo_emitted"] == 0b11
+    assert not flow.enter(session, messages)
+
+
+def test_apply_falls_back_without_feedback():
+    flow, session, messages = make_flow(), {}, []
+    flow.enter(session, messages)
+    flow.apply(session, messages, ANSWER, evaluation=None)
+    assert texts(messages)[2] == "Thanks."
+
+
+def test_off_topic_detour_stays_on_step():
+    flow, session, messages = make_flow(), {}, []
+    flow.enter(session, messages)
+    flow.apply(session, messages, OFF_TOPIC, open_ended_reply="Cricket is on Sunday.")
+    flow.apply(session, messages, OFF_TOPIC)
+    assert texts(messages)[-2:] == ["Cricket is on Sunday.", "Let's continue with our lesson."]
+    assert session["demo_stage"] == 0
+
+
+def test_labelled_and_default_transitions():
+    flow, session, messages = make_flow(), {"demo_stage": 1, "demo_emitted": 0b11}, []
+    flow.apply(session, messages, "unclear")
+    assert session["demo_stage"] == 1
+    # Re-entering a step through a transition says it again
+    assert texts(messages) == ["Was it your own doing?"]
+    flow.apply(session, messages, YES)
+    assert texts(messages)[-2:] == ["Great.", "Tell me anything."]
+    assert flow.current(session).input == FREEFORM
+    assert session["demo_emitted"] == 0b111
+
+
+@pytest.mark.parametrize("steps, evaluators, error", [
+    ([Step("a", next={DEFAULT: Go("a")}), Step("a", next={DEFAULT: Go("a")})], {}, "duplicate step names"),
+    ([Step("a", evaluate="grade", next={DEFAULT: Go("a")})], {}, "unknown evaluator 'grade'"),
+    ([Step("a", next={DEFAULT: Go("b")})], {}, "unknown target 'b'"),
+    ([Step("a", next={YES: Go("a")})], {}, "needs a '\\*' transition"),
+])
+def test_compile_rejects_bad_tables(steps, evaluators, error):
+    with pytest.raises(ValueError, match=error):
+        Flow("bad", steps, "s", "e", evaluators=evaluators)
+
+
+def test_freeform_step_needs_no_default():
+    Flow("ok", [Step("chat", input=FREEFORM)], "s", "e")
+
+
+def test_streamed_feedback_is_kept_when_the_reply_fails():
+    flow, session, messages = make_flow(), {}, []
+    flow.enter(session, messages)
+    flow.apply(session, messages, ANSWER, evaluation=None, streamed_feedback="Good, you named a clear")
+    assert texts(messages)[2] == "Good, you named a clear"
+
+
+def test_clarify_explains_and_stays_on_step():
+    flow, session, messages = make_flow(), {"demo_stage": 1, "demo_emitted": 0b11}, []
+    flow.apply(session, messages, CLARIFY, open_ended_reply="It means: did you make it happen?")
+    flow.apply(session, messages, CLARIFY)
+    assert texts(messages) == ["It means: did you make it happen?", "Was it your own doing?"]
+    assert session["demo_stage"] == 1
+
+
+def test_clarify_request_quotes_the_question():
+    step = make_flow().steps[1]
+    request = clarify_request(step, "what do you mean?")
+    assert '"Was it your own doing?"' in request and '"what do you mean?"' in request
@@ -0,0 +1,73 @@
+"""``core.ingest`` end to end on generated PDFs and a DOCX, including a file that fails midway."""
+
+import docx
+import pytest
+
+from benchmarks.ingest_bench import write_pdf
+from core import ingest
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "corpus.txt"
+    path.write_text("Custody\n\n* The welfare of the minor is the paramount consideration in custody.\n\n",
+                    encoding="utf-8")
+    return path
+
+
+def run(source, corpus, tmp_path, **kwargs):
+    return ingest.ingest(str(source), str(corpus), workers=2, pages_per_task=2,
+                         manifest_path=str(tmp_path / "manifest.json"), **kwargs)
+
+
+def write_docx(path, paragraphs):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    document.save(path)
+
+
+def test_ingests_pdf_and_docx_once(tmp_path, corpus):
+    source = tmp_path / "judgments"
+    source.mkdir()
+    write_pdf(str(source / "a.pdf"), 0, 5)
+    write_docx(str(source / "b.docx"), [f"Paragraph {n} on maintenance of the wife and the children of the marriage."
+                                        for n in range(70)])
+
+    stats = run(source, corpus, tmp_path)
+    assert stats["failed"] == 0
+    assert stats["pages"] == 5 + 3  # 70 paragraphs are three DOCX pages
+    text = corpus.read_text(encoding="utf-8")
+    assert text.count("Source: a") == 1 and text.count("Source: b") == 1
+    assert "Paragraph 69 on maintenance" in text
+
+    again = run(source, corpus, tmp_path)
+    assert again["skipped"] == 2 and again["passages"] == 0
+    assert corpus.read_text(encoding="utf-8") == text
+
+
+def test_failed_file_is_rolled_back(tmp_path, corpus, monkeypatch):
+    source = tmp_path / "judgments"
+    source.mkdir()
+    write_pdf(str(source / "a.pdf"), 0, 8)
+    before = corpus.read_text(encoding="utf-8")
+
+    extract = ingest.extract_task
+
+    def failing(task):
+        if task[2] >= 4:
+            raise ValueError("broken page")
+        return extract(task)
+
+    # The pool forks, so the workers see the patched function
+    monkeypatch.setattr(ingest, "extract_task", failing)
+    stats = run(source, corpus, tmp_path)
+    assert stats["failed"] == 1 and stats["passages"] == 0
+    assert corpus.read_text(encoding="utf-8") == before
+
+    monkeypatch.setattr(ingest, "extract_task", extract)
+    stats = run(source, corpus, tmp_path)
+    assert stats["failed"] == 0 and stats["skipped"] == 0
+    text = corpus.read_text(encoding="utf-8")
+    assert text.count("Source: a") == 1
+    assert "Document 0, page 7" in text
@@ -0,0 +1,35 @@
+"""The local intent router against the labelled fixtures."""
+
+import pytest
+
+from benchmarks.intent_router_bench import load_fixtures
+from core.intent_router import CLARIFY, EXPECT_ANSWER, EXPECT_YES_NO, UNCLEAR, YES, route
+
+FIXTURES = load_fixtures()
+
+
+@pytest.mark.parametrize("item", FIXTURES, ids=[f"{f['expect']}:{f['text']}" for f in FIXTURES])
+def test_fixture(item):
+    assert route(item["text"], item["expect"]).label == item["label"]
+
+
+@pytest.mark.parametrize("text", ["right now I was busy", "sure I can tell you", "yesterday I was tired",
+                                  "correct me if I am wrong", "jeetna mushkil tha"])
+def test_yes_cues_must_stand_alone(text):
+    assert route(text, EXPECT_YES_NO).label != YES
+
+
+@pytest.mark.parametrize("text", ["right, it was me", "true.", "jee bilkul", "Yes it was my planning"])
+def test_yes_cues(text):
+    assert route(text, EXPECT_YES_NO).label == YES
+
+
+def test_unsure_is_not_no():
+    result = route("no idea", EXPECT_YES_NO)
+    assert result.label == UNCLEAR and result.needs_llm
+
+
+def test_clarification_is_not_off_topic():
+    for expect in (EXPECT_ANSWER, EXPECT_YES_NO):
+        result = route("what do you mean?", expect)
+        assert result.label == CLARIFY and not result.needs_llm
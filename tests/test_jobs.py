@@ -0,0 +1,70 @@
+"""Pending turns across tab switches (``ZARA_JOBS_ON_NAVIGATE``)."""
+
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+import tabs
+from core import jobs
+from core.message_log import MessageLog
+
+
+class _State(dict):
+    """Stands in for ``st.session_state``: item and attribute access."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+@pytest.fixture
+def session(monkeypatch):
+    state = _State(messages={})
+    monkeypatch.setattr(jobs, "st", SimpleNamespace(session_state=state))
+    return state
+
+
+def pending_turn(session, tab, stored=None):
+    messages = session.messages.setdefault(tab, MessageLog([{"role": "assistant", "content": "Your roles?"}]))
+    turn = jobs.PendingTurn(0, "Mother, shopkeeper", "answer", len(messages))
+    messages.append({"role": "user", "content": "Mother, shopkeeper"})
+    if stored:
+        turn.restore = {stored: session.get(stored)}
+        session[stored] = "Mother, shopkeeper"
+    turn.add("evaluation", Future())
+    jobs.start_turn(tab, turn)
+    return turn
+
+
+def test_keep_leaves_other_tabs_running(session, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_ON_NAVIGATE", "keep")
+    pending_turn(session, "Reflection")
+    jobs.on_navigate("Identifying the right person")
+    assert jobs.get_turn("Reflection") is not None
+    assert len(session.messages["Reflection"]) == 2
+
+
+def test_cancel_undoes_the_turn(session, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_ON_NAVIGATE", "cancel")
+    session["ri_roles"] = "Mother"
+    other = pending_turn(session, "Reflection", stored="ri_roles")
+    active = pending_turn(session, "Identifying the right person")
+    jobs.on_navigate("Identifying the right person")
+
+    assert jobs.get_turn("Reflection") is None and other.futures["evaluation"].cancelled()
+    assert [m["content"] for m in session.messages["Reflection"]] == ["Your roles?"]
+    assert session["ri_roles"] == "Mother"
+    assert jobs.get_turn("Identifying the right person") is active
+
+
+def test_cancel_clears_a_value_first_stored_by_the_turn(session, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_ON_NAVIGATE", "cancel")
+    pending_turn(session, "Reflection", stored="success_shared")
+    jobs.on_navigate("Identifying the right person")
+    assert session["success_shared"] is None
+
+
+def test_registry_names_the_session_tab():
+    for label in tabs.labels():
+        spec = tabs.get_spec(label)
+        assert spec.tab == spec.tab.strip()
+    assert tabs.get_spec("Reflection ").tab == "Reflection"
@@ -0,0 +1,80 @@
+"""``FeedbackParser`` fed a reply in arbitrary chunks, and ``FeedbackStream`` hand-off."""
+
+import json
+import threading
+
+import pytest
+
+from core.json_stream import FeedbackParser, FeedbackStream
+
+
+def feed_all(reply: str, size: int):
+    parser = FeedbackParser()
+    text = "".join(parser.feed(reply[i:i + size]) for i in range(0, len(reply), size))
+    return parser, text
+
+
+REPLIES = [
+    {"feedback": "Well done, that is a clear example.", "is_correct": True},
+    {"is_correct": False, "feedback": 'Say "why" \\ and\nhow.'},
+    {"feedback": "Shabash! Aap ne 😊 bohat acha likha — ok", "is_correct": True},
+    {"notes": {"feedback": "not this one"}, "list": ["feedback", 1], "feedback": "this one"},
+]
+
+
+@pytest.mark.parametrize("reply", REPLIES)
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_streams_feedback_in_any_chunking(reply, size):
+    raw = json.dumps(reply, ensure_ascii=size % 2 == 1)  # \u escapes split across chunks too
+    parser, text = feed_all(raw, size)
+    assert text == reply["feedback"]
+    assert parser.closed
+    assert parser.result == reply
+
+
+def test_skips_fence_and_stops_at_close():
+    parser, text = feed_all('```json\n{"feedback": "Good"}\n```', 4)
+    assert text == "Good"
+    assert parser.result == {"feedback": "Good"}
+
+
+def test_unterminated_reply_is_not_closed():
+    parser, text = feed_all('{"feedback": "Half a sent', 5)
+    assert text == "Half a sent"
+    assert not parser.closed and parser.result is None
+
+
+def test_other_field():
+    parser = FeedbackParser(field="reply")
+    assert parser.feed('{"feedback": "no", "reply": "yes"}') == "yes"
+
+
+def test_stream_replays_and_finishes():
+    stream = FeedbackStream()
+    seen = []
+    reader = threading.Thread(target=lambda: seen.extend(stream.deltas()))
+    reader.start()
+    stream.push("Well ")
+    stream.push("")
+    stream.push("done.")
+    stream.finish("ignored: the stream already showed text")
+    reader.join(1)
+    assert seen == ["Well ", "done."]
+    assert list(stream.deltas()) == ["Well ", "done."]
+
+
+def test_finish_sends_unstreamed_feedback_whole():
+    stream = FeedbackStream()
+    stream.finish("Cached reply.")
+    assert list(stream.deltas()) == ["Cached reply."]
+    assert stream.first_visible_at is not None
+
+
+def test_text_is_what_was_shown():
+    stream = FeedbackStream()
+    parser = FeedbackParser()
+    for chunk in ('{"feedback": "Well', ' done', '!", "is_correct": tru'):
+        stream.push(parser.feed(chunk))
+    stream.finish(None)
+    assert stream.text == "Well done!"
+    assert not parser.closed
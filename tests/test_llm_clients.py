@@ -0,0 +1,56 @@
+"""Pool statistics of ``PooledTransport``, counted from httpcore's trace events."""
+
+import threading
+
+import httpx
+import pytest
+
+from core.llm_clients import PooledTransport, build_http_client
+from evaluation.mock_llm_server import MockLLMServer
+
+CHAT = {"model": "mock-model", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def server():
+    with MockLLMServer(latency=0.2, token_delay=0.0) as mock:
+        yield mock
+
+
+def test_reuse_and_release(server):
+    transport = PooledTransport()
+    seen = []
+    with build_http_client(transport) as client:
+        for _ in range(3):
+            client.get(f"{server.base_url}/models", extensions={"trace": lambda name, info: seen.append(name)})
+        stats = transport.stats()
+    assert stats["total_requests"] == 3 and stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert stats["connections_opened"] == 1 and stats["reused_connections"] == 2
+    assert stats["connections"] == stats["idle"] == 1  # kept alive for the next request
+    assert any(name.endswith("connect_tcp.started") for name in seen)  # the caller's own trace still runs
+
+
+def test_requests_wait_for_a_connection(server):
+    transport = PooledTransport(limits=httpx.Limits(max_connections=1))
+    snapshots = []
+    with build_http_client(transport) as client:
+        threads = [threading.Thread(target=client.post, args=(f"{server.base_url}/chat/completions",),
+                                    kwargs={"json": CHAT}) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            snapshots.append(transport.stats())
+            threads[0].join(0.02)
+    assert any(s["waiting"] >= 1 for s in snapshots)
+    stats = transport.stats()
+    assert stats["waiting"] == 0 and stats["in_flight"] == 0 and stats["peak_in_flight"] == 3
+    assert stats["connections_opened"] == 1
+
+
+def test_failed_request_is_not_left_waiting():
+    transport = PooledTransport(retries=0)
+    with build_http_client(transport) as client:
+        with pytest.raises(httpx.ConnectError):
+            client.get("http://127.0.0.1:9/")
+    stats = transport.stats()
+    assert stats["waiting"] == 0 and stats["in_flight"] == 0
@@ -0,0 +1,104 @@
+"""``LLMRouter`` against two local mock servers: hedging, breakers, bounded retries and ordering."""
+
+import os
+import time
+
+import openai
+import pytest
+from openai import OpenAI
+
+from core import llm_router
+from core.llm_router import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LLMRouter, Provider
+from evaluation.mock_llm_server import MockLLMServer
+
+MESSAGES = [{"role": "user", "content": "How do I balance my shop and my children's school runs?"}]
+
+
+@pytest.fixture
+def mocks(monkeypatch):
+    monkeypatch.setattr(llm_router, "BACKOFF_BASE", 0.01)
+    with MockLLMServer(latency=0.02, token_delay=0) as primary, MockLLMServer(latency=0.02, token_delay=0) as backup:
+        yield primary, backup
+
+
+def make_router(mocks, **kwargs):
+    primary, backup = mocks
+    providers = [
+        Provider("openai", OpenAI(api_key="mock", base_url=primary.base_url, max_retries=0)),
+        Provider("groq", OpenAI(api_key="mock", base_url=backup.base_url, max_retries=0), model="backup-model"),
+    ]
+    return LLMRouter(providers, **{"policy": "priority", **kwargs})
+
+
+def ask(router, **kwargs):
+    return router.create(call_site="ri_qualities", model="mock-model", messages=MESSAGES, **kwargs)
+
+
+def served_by(response) -> str:
+    return "groq" if response.model == "backup-model" else "openai"
+
+
+@pytest.mark.skipif("ZARA_ROUTER_POLICY" in os.environ, reason="ZARA_ROUTER_POLICY is set")
+def test_priority_is_the_default():
+    assert LLMRouter([]).policy == "priority"
+
+
+def test_hedges_once_the_primary_is_slower_than_its_p95(mocks):
+    primary, backup = mocks
+    router = make_router(mocks)
+    for _ in range(llm_router.HEDGE_MIN_SAMPLES):
+        assert served_by(ask(router)) == "openai"
+    primary.settings.latency = 2.0
+    started = time.perf_counter()
+    assert served_by(ask(router)) == "groq"
+    assert time.perf_counter() - started < 1.5
+    stats = router.stats()
+    assert stats["groq"]["hedges"] == 1 and stats["groq"]["backup_wins"] == 1
+    router.close()
+
+
+def test_breaker_opens_then_probes_half_open(mocks):
+    primary, backup = mocks
+    router = make_router(mocks, hedging=False)
+    breaker = router.providers[0].breaker = CircuitBreaker(failure_threshold=2, cooldown=0.3)
+    primary.settings.fail_rate = 1.0
+    for _ in range(2):
+        assert served_by(ask(router)) == "groq"  # fails over right away
+    assert breaker.state == OPEN and primary.settings.requests == 2
+
+    assert served_by(ask(router)) == "groq"
+    assert primary.settings.requests == 2  # skipped while open
+
+    time.sleep(0.35)
+    assert breaker.available() and breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.35)
+    primary.settings.fail_rate = 0.0
+    assert served_by(ask(router)) == "openai"  # the probe succeeds
+    assert breaker.state == CLOSED
+    router.close()
+
+
+def test_retries_are_bounded(mocks):
+    primary, backup = mocks
+    primary.settings.fail_rate = backup.settings.fail_rate = 1.0
+    router = make_router(mocks, hedging=False, retries=2)
+    for provider in router.providers:
+        provider.breaker = CircuitBreaker(failure_threshold=100)
+    with pytest.raises(openai.InternalServerError):
+        ask(router)
+    # Each of the 1 + 2 attempts tries both providers once
+    assert primary.settings.requests == backup.settings.requests == 3
+    router.close()
+
+
+def test_latency_policy_keeps_the_primary_ahead_of_an_unsampled_provider(mocks):
+    router = make_router(mocks, policy="latency")
+    router.providers[0].record("full", 2.5)  # a slow reasoning model
+    assert [p.name for p in router._ordered("full")] == ["openai", "groq"]
+    router.providers[1].record("full", 0.5)
+    assert [p.name for p in router._ordered("full")] == ["groq", "openai"]
+    router.close()
@@ -0,0 +1,73 @@
+"""``MessageLog`` behaves like the list of message dicts it replaced."""
+
+import pytest
+
+from core.message_log import MessageLog, intern_text
+
+SYSTEM = {"role": "system", "content": "You are Zara, a patient tutor. " * 50}
+SCRIPTED = "What went well for you this week? (test_message_log)"
+
+
+def transcript():
+    intern_text(SCRIPTED)
+    return [
+        SYSTEM,
+        {"role": "assistant", "content": SCRIPTED},
+        {"role": "user", "content": "I sold all my pickles"},
+        {"role": "assistant", "content": "That is a real success."},
+        {"role": "user", "content": "Thank you"},
+    ]
+
+
+def test_reads_like_a_list():
+    messages = transcript()
+    log = MessageLog(messages)
+    assert len(log) == len(messages)
+    assert list(log) == messages
+    assert list(reversed(log)) == messages[::-1]
+    assert log[2] == messages[2] and log[-1] == messages[-1]
+    assert log[1:3] == messages[1:3] and log[::2] == messages[::2]
+    assert log.role(3) == "assistant" and log.content(2) == "I sold all my pickles"
+    assert list(log.texts()) == [m["content"] for m in messages[1:]]
+
+
+def test_shares_system_and_interned_texts():
+    a, b = MessageLog(transcript()), MessageLog(transcript())
+    # Only the learner's and reply texts are owned by each log
+    assert len(a._own) == len(b._own) == 3
+    assert a._refs[0] == b._refs[0] >= 0
+    assert a._refs[1] == b._refs[1] >= 0
+
+
+@pytest.mark.parametrize("index", [slice(3, None), slice(-2, None), 4, -1, slice(1, 3), 0, slice(0, None, 2)])
+def test_delete_matches_list(index):
+    messages = transcript()
+    log = MessageLog(messages)
+    del messages[index]
+    del log[index]
+    assert list(log) == messages
+    log.append({"role": "user", "content": "again"})
+    assert log[-1] == {"role": "user", "content": "again"}
+    assert len(log) == len(messages) + 1
+
+
+def test_truncating_tail_drops_owned_texts():
+    log = MessageLog(transcript())
+    del log[2:]
+    assert log._own == []
+    log.append({"role": "user", "content": "new"})
+    assert log[2]["content"] == "new"
+
+
+def test_turns_skip_system_and_scripted():
+    log = MessageLog(transcript())
+    view, dropped = log.turns(scripted={SCRIPTED})
+    assert dropped == 1
+    assert [m["content"] for m in view] == ["I sold all my pickles", "That is a real success.", "Thank you"]
+    assert [m["content"] for m in view[-2:]] == ["That is a real success.", "Thank you"]
+    assert len(view[1:]) == 2
+
+
+def test_unknown_role_is_rejected():
+    with pytest.raises(KeyError):
+        MessageLog([{"role": "tool", "content": "x"}])
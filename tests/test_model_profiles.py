@@ -0,0 +1,22 @@
+"""Model profiles: request options are plain request parameters."""
+
+from types import SimpleNamespace
+
+from core import model_profiles
+
+
+class _Completions:
+    """Accepts exactly the parameters the OpenAI client takes at these call sites."""
+
+    def create(self, *, model, messages, stream=False, reasoning_effort=None, max_completion_tokens=None,
+               timeout=None):
+        return SimpleNamespace(model=model, reasoning_effort=reasoning_effort)
+
+
+def test_options_work_on_a_bare_client():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=_Completions()))
+    for call_site in model_profiles.profile_stats():
+        options = model_profiles.request_options(call_site, "session-model")
+        assert "call_site" not in options
+        response = client.chat.completions.create(messages=[], stream=False, **options)
+        assert response.model == (model_profiles.profile_for(call_site).model or "session-model")
@@ -0,0 +1,49 @@
+"""Prompt layout and the prompt-cache view over the router's token counters."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from core import prompts, telemetry
+from core.llm_router import LLMRouter, Provider
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", True)
+    monkeypatch.setattr(telemetry, "_metrics", telemetry._Metrics())
+
+
+def usage(prompt, cached, completion):
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion,
+                           prompt_tokens_details={"cached_tokens": cached}, completion_tokens_details=None)
+
+
+class _Completions:
+    def create(self, stream=False, **kwargs):
+        delta = SimpleNamespace(content="Well done")
+        if not stream:
+            return SimpleNamespace(usage=usage(2000, 1024, 30), choices=[SimpleNamespace(message=delta)])
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None),
+                  SimpleNamespace(choices=[], usage=usage(1500, 0, 40))]
+        return iter(chunks)
+
+
+def test_messages_keep_a_static_prefix():
+    prompt = prompts.Prompt("p", "Grade the answer.", "Answer: {user_input}")
+    assert prompt.messages(user_input="yes") == [
+        {"role": "system", "content": "Grade the answer."}, {"role": "user", "content": "Answer: yes"}]
+
+
+def test_usage_is_counted_once_by_the_router(metrics):
+    router = LLMRouter([Provider("stub", SimpleNamespace(chat=SimpleNamespace(completions=_Completions())))],
+                       hedging=False)
+    router.create(call_site="ri_qualities", model="m", messages=[])
+    router.create(call_site="ri_qualities", model="m", messages=[])
+    text = "".join(prompts.stream_text(router.create(call_site="roles_chat", model="m", messages=[], stream=True)))
+    router.close()
+    assert text == "Well done"
+    stats = prompts.usage_stats()
+    assert stats["ri_qualities"] == {"calls": 2, "prompt_tokens": 4000, "cached_tokens": 2048,
+                                     "completion_tokens": 60, "uncached_tokens": 1952, "cached_ratio": 0.512}
+    assert (stats["roles_chat"]["calls"], stats["roles_chat"]["prompt_tokens"]) == (1, 1500)
@@ -0,0 +1,161 @@
+"""``ResponseCache``: keys, TTL, eviction and coalescing of concurrent misses."""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from core import response_cache
+from core.response_cache import ResponseCache, make_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite3"), max_entries=1000, ttl_seconds=60)
+
+
+def lookup(cache, user_input, compute, **kwargs):
+    return cache.get_or_compute("model", "ri_qualities", "Grade the qualities.", user_input, compute, **kwargs)
+
+
+def test_key_normalizes_input_and_tracks_prompt():
+    assert make_key("m", "p", "prompt", "  Patience,  PLANNING!") == make_key("m", "p", "prompt", "patience, planning")
+    assert make_key("m", "p", "prompt", "yes") != make_key("m", "p", "prompt v2", "yes")
+    assert make_key("m", "p", "prompt", "yes") != make_key("other", "p", "prompt", "yes")
+
+
+def test_hit_after_miss(cache):
+    calls = []
+    for _ in range(3):
+        assert lookup(cache, "Yes.", lambda: calls.append(1) or {"feedback": "ok"}) == {"feedback": "ok"}
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (1, 2, 1)
+
+
+def test_concurrent_misses_share_one_call(cache):
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"feedback": "shared"}
+
+    threads = [threading.Thread(target=lambda: results.append(lookup(cache, "patience", compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while cache.stats()["coalesced"] < 7 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"feedback": "shared"}] * 8
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["in_flight"]) == (1, 7, 0)
+
+
+def test_error_reaches_waiters_and_is_not_stored(cache):
+    release = threading.Event()
+    errors = []
+
+    def compute():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    def call():
+        try:
+            lookup(cache, "planning", compute)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while cache.stats()["coalesced"] < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ["upstream down"] * 3
+    assert cache.stats()["entries"] == 0
+    assert lookup(cache, "planning", lambda: {"feedback": "back"}) == {"feedback": "back"}
+
+
+def test_failed_write_still_answers_waiters(cache, monkeypatch):
+    release = threading.Event()
+    results = []
+
+    def compute():
+        release.wait(5)
+        return {"feedback": "graded"}
+
+    def locked(key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "put", locked)
+    threads = [threading.Thread(target=lambda: results.append(lookup(cache, "caring", compute))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + 5
+    while cache.stats()["coalesced"] < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert results == [{"feedback": "graded"}] * 3
+    stats = cache.stats()
+    assert (stats["write_errors"], stats["entries"], stats["in_flight"]) == (1, 0, 0)
+
+
+def test_failed_read_is_a_miss(cache, monkeypatch):
+    lookup(cache, "yes", lambda: {"feedback": "stored"})
+
+    def locked(key):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "_get", locked)
+    assert lookup(cache, "yes", lambda: {"feedback": "fresh"}) == {"feedback": "fresh"}
+    assert cache.stats()["read_errors"] == 1
+
+
+def test_vetoed_value_is_not_stored(cache):
+    lookup(cache, "x", lambda: {"error": 1}, should_cache=lambda value: "feedback" in value)
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entry_is_recomputed(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    lookup(cache, "yes", lambda: {"feedback": "first"})
+    now[0] += 59
+    assert lookup(cache, "yes", lambda: {"feedback": "second"}) == {"feedback": "first"}
+    now[0] += 2
+    assert lookup(cache, "yes", lambda: {"feedback": "second"}) == {"feedback": "second"}
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "_EVICT_EVERY", 1)
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "r.sqlite3"), max_entries=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        now[0] += 1
+        cache.put(key, key)
+    now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.put("c", "c")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("a", None, "c")
+    assert cache.stats()["evicted"] == 1
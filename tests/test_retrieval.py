@@ -0,0 +1,46 @@
+"""``RetrievalIndex.search`` over float32 and blocked float16 matrices."""
+
+import numpy as np
+import pytest
+
+from core import retrieval
+from core.retrieval import Chunk, RetrievalIndex
+
+
+@pytest.fixture
+def index_of(monkeypatch):
+    rng = np.random.default_rng(3)
+
+    def make(rows, dtype):
+        vectors = rng.standard_normal((rows, 16)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        chunks = [Chunk(i, "Custody", f"case {i}") for i in range(rows)]
+        monkeypatch.setattr(retrieval, "embed_one", lambda query: vectors[int(query)])
+        return RetrievalIndex(chunks, vectors.astype(dtype), mapped=dtype == np.float16)
+
+    return make
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_best_match_first(index_of, monkeypatch, dtype):
+    monkeypatch.setattr(retrieval, "SEARCH_BLOCK_ROWS", 7)
+    index = index_of(50, dtype)
+    results = index.search("23", k=3)
+    assert [chunk.id for chunk, _ in results][0] == 23
+    assert results[0][1] == pytest.approx(1.0, abs=1e-2)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    assert index.search("23", k=3, min_score=0.99) == results[:1]
+
+
+def test_blocks_match_one_product(index_of, monkeypatch):
+    index = index_of(50, np.float16)
+    query = retrieval.embed_one("5")
+    monkeypatch.setattr(retrieval, "SEARCH_BLOCK_ROWS", 8)
+    np.testing.assert_allclose(index._scores(query), index.vectors.astype(np.float32) @ query, rtol=1e-5)
+
+
+def test_empty_index_and_zero_k(index_of):
+    index = index_of(5, np.float32)
+    assert index.search("1", k=0) == []
+    empty = RetrievalIndex([], np.zeros((0, 16), dtype=np.float16), mapped=True)
+    assert empty.search("1", k=3) == []
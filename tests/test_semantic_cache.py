@@ -0,0 +1,68 @@
+"""``SemanticCache``: matching within a context (including the conversation), and bounded context ids."""
+
+import numpy as np
+
+from core.context_builder import conversation_fingerprint
+from core.semantic_cache import SemanticCache, context_key
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_match_needs_same_context():
+    cache = SemanticCache(dim=2, capacity=4, threshold=0.9)
+    here, there = context_key("Tab", "prompt", "chat"), context_key("Tab", "prompt", "other")
+    cache.store(unit(1, 0), here, "answer")
+    assert cache.lookup(unit(1, 0.05), here)[0] == "answer"
+    assert cache.lookup(unit(0, 1), here)[0] is None
+    assert cache.lookup(unit(1, 0), there)[0] is None
+
+
+def test_context_ids_follow_evictions():
+    cache = SemanticCache(dim=2, capacity=3, threshold=0.9)
+    for turn in range(50):
+        cache.store(unit(1, turn), context_key("Tab", "prompt", f"step-{turn}"), f"answer {turn}")
+    assert cache.stats()["contexts"] == 3
+    assert len(cache._context_keys) == len(cache._context_slots) == 3
+    assert cache.lookup(unit(1, 49), context_key("Tab", "prompt", "step-49"))[0] == "answer 49"
+    assert cache.lookup(unit(1, 0), context_key("Tab", "prompt", "step-0"))[0] is None
+
+
+def test_shared_context_survives_partial_eviction():
+    cache = SemanticCache(dim=2, capacity=2, threshold=0.9)
+    shared = context_key("Tab", "prompt", "chat")
+    cache.store(unit(1, 0), shared, "first")
+    cache.store(unit(0, 1), shared, "second")
+    cache.store(unit(1, 1), context_key("Tab", "prompt", "else"), "third")
+    assert cache.stats()["contexts"] == 2
+    assert cache.lookup(unit(0, 1), shared)[0] == "second"
+
+
+def conversation(*turns):
+    history = [{"role": "system", "content": "prompt"}]
+    for user, reply in turns:
+        history += [{"role": "user", "content": user}, {"role": "assistant", "content": reply}]
+    return history + [{"role": "user", "content": "How do I find time for my shop?"}]
+
+
+def test_different_histories_do_not_share_answers():
+    cache = SemanticCache(dim=2, capacity=4, threshold=0.9)
+    asma = conversation(("I sell stitched suits from home", "That is a good base, Asma."))
+    bilqis = conversation(("I run a tuition centre", "Teaching is a great skill, Bilqis."))
+    context = {name: context_key("Tab", "prompt", "chat", conversation_fingerprint(history))
+               for name, history in (("asma", asma), ("bilqis", bilqis))}
+    cache.store(unit(1, 0), context["asma"], "Keep Friday mornings for the suits, Asma.")
+    assert cache.lookup(unit(1, 0), context["bilqis"])[0] is None
+    assert cache.lookup(unit(1, 0), context["asma"])[0] == "Keep Friday mornings for the suits, Asma."
+
+
+def test_fingerprint_follows_the_summary_not_the_new_question():
+    history = conversation(("I sell suits", "Good."), ("My son helps", "Lovely."))
+    other_question = history[:-1] + [{"role": "user", "content": "Something else entirely"}]
+    assert conversation_fingerprint(history) == conversation_fingerprint(other_question)
+    summarized = {"summary": "Sells suits; her son helps.", "upto": 2}
+    assert conversation_fingerprint(history, state=summarized) != conversation_fingerprint(history)
+    assert conversation_fingerprint(history, state=summarized) != conversation_fingerprint(
+        history, state={**summarized, "summary": "Runs a tuition centre."})
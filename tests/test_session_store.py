@@ -0,0 +1,131 @@
+"""Session store backends and signed session ids."""
+
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from core import session_store
+from core.message_log import MessageLog
+from core.session_store import MemorySessionStore, SQLiteSessionStore, sign_sid, verify_sid
+
+
+def said(*texts):
+    return [{"role": "user" if i % 2 else "assistant", "content": text} for i, text in enumerate(texts)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+def test_append_truncate_and_state(store):
+    assert store.load("s1") is None
+    store.append_messages("s1", "Tab", said("Hello", "hi"))
+    store.append_messages("s1", "Tab", said("How was it?", "good", "Why?"))
+    store.truncate_messages("s1", "Tab", 4)
+    store.append_messages("s1", "Tab", said("Tell me more"))
+    store.set_state("s1", {"ri_stage": 2, "ri_roles": ["Mother"]})
+    store.set_state("s1", {"ri_stage": 3})
+
+    loaded = store.load("s1")
+    assert [m["content"] for m in loaded["messages"]["Tab"]] == ["Hello", "hi", "How was it?", "good", "Tell me more"]
+    assert loaded["state"] == {"ri_stage": 3, "ri_roles": ["Mother"]}
+    assert store.load("s2") is None
+
+
+def test_sqlite_keeps_length_and_rolls_back(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    store.append_messages("s", "Tab", said("a", "b", "c"))
+    store.truncate_messages("s", "Tab", 1)
+    assert store._db.execute("SELECT length FROM session_tabs").fetchone() == (1,)
+    # A failed append leaves neither rows nor a changed length behind
+    with pytest.raises(sqlite3.IntegrityError):
+        store._db.execute("INSERT INTO session_messages VALUES ('s', 'Tab', 1, 'user', 'x')")
+        store.append_messages("s", "Tab", said("e"))
+    store._db.execute("DELETE FROM session_messages WHERE idx = 1")
+    store.append_messages("s", "Tab", said("f"))
+    assert [m["content"] for m in store.load("s")["messages"]["Tab"]] == ["a", "f"]
+    assert store._db.execute("SELECT length FROM session_tabs").fetchone() == (2,)
+
+
+def test_sqlite_upgrades_an_older_store(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE session_messages (sid TEXT NOT NULL, tab TEXT NOT NULL, idx INTEGER NOT NULL,"
+               " role TEXT NOT NULL, content TEXT NOT NULL, PRIMARY KEY (sid, tab, idx))")
+    db.executemany("INSERT INTO session_messages VALUES ('s', 'Tab', ?, 'user', ?)", [(0, "a"), (1, "b")])
+    db.commit()
+    db.close()
+    store = SQLiteSessionStore(path)
+    store.append_messages("s", "Tab", said("c"))
+    assert [m["content"] for m in store.load("s")["messages"]["Tab"]] == ["a", "b", "c"]
+
+
+class _State(dict):
+    """Stands in for ``st.session_state``: item and attribute access."""
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+def run_session(monkeypatch, store, token=None):
+    """A fresh browser session over ``store`` (``token`` is its ``?sid=``)."""
+    state = _State(messages={})
+    monkeypatch.setattr(session_store, "st", SimpleNamespace(session_state=state, query_params={"sid": token}))
+    monkeypatch.setattr(session_store, "_store", store)
+    return state
+
+
+def test_system_prompt_is_not_stored(monkeypatch):
+    monkeypatch.setattr(session_store, "_secret", b"test secret")
+    store = MemorySessionStore()
+    state = run_session(monkeypatch, store)
+    sid = session_store.restore_session()
+    state.messages["Tab"] = MessageLog([{"role": "system", "content": "Old prompt"}] + said("Hello", "hi"))
+    session_store.persist_session()
+    assert [m["role"] for m in store.load(sid)["messages"]["Tab"]] == ["assistant", "user"]
+    state.messages["Tab"].append({"role": "assistant", "content": "How was it?"})
+    session_store.persist_session()
+    assert [m["content"] for m in store.load(sid)["messages"]["Tab"]] == ["Hello", "hi", "How was it?"]
+
+    # Resumed with the tab's current prompt in front
+    state = run_session(monkeypatch, store, sign_sid(sid))
+    session_store.restore_session({"Tab": "New prompt"}.get)
+    assert list(state.messages["Tab"]) == [{"role": "system", "content": "New prompt"}] + said("Hello", "hi", "How was it?")
+    del state.messages["Tab"][3:]
+    session_store.persist_session()
+    assert [m["content"] for m in store.load(sid)["messages"]["Tab"]] == ["Hello", "hi"]
+
+
+def test_stored_prompts_are_dropped_on_resume(monkeypatch):
+    monkeypatch.setattr(session_store, "_secret", b"test secret")
+    store = MemorySessionStore()
+    store.append_messages("s", "Tab", [{"role": "system", "content": "Old prompt"}] + said("Hello"))
+    state = run_session(monkeypatch, store, sign_sid("s"))
+    session_store.restore_session({"Tab": "New prompt"}.get)
+    assert [m["content"] for m in state.messages["Tab"]] == ["New prompt", "Hello"]
+    assert store.load("s")["messages"]["Tab"] == said("Hello")
+    state.messages["Tab"].append({"role": "user", "content": "hi"})
+    session_store.persist_session()
+    assert store.load("s")["messages"]["Tab"] == said("Hello", "hi")
+
+
+def test_signed_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, "_secret", b"test secret")
+    token = sign_sid("abc123")
+    assert token.startswith("abc123.") and verify_sid(token) == "abc123"
+    assert verify_sid("abc123") is None
+    assert verify_sid(None) is None
+    assert verify_sid("abc124" + token[6:]) is None
+    assert verify_sid(token[:-1] + ("0" if token[-1] != "0" else "1")) is None
+    monkeypatch.setattr(session_store, "_secret", b"another secret")
+    assert verify_sid(token) is None
+
+
+def test_secret_file_is_created_once(tmp_path):
+    path = str(tmp_path / "cache" / "session_secret")
+    first = session_store._load_or_create_secret(path)
+    assert len(first) == 64
+    assert session_store._load_or_create_secret(path) == first
@@ -0,0 +1,196 @@
+"""Voice: utterance cutting, incremental transcription, and admission / telemetry for speech to text."""
+
+import os
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+from core import admission, telemetry, voice
+
+
+SPEECH = b"\x01" * voice.FRAME_BYTES
+SILENCE = b"\x00" * voice.FRAME_BYTES
+
+
+class ScriptedVAD:
+    """Speech when a frame starts with a non-zero byte."""
+
+    def is_speech(self, frame: bytes) -> bool:
+        return frame[0] != 0
+
+
+def make_cutter():
+    # In frames of 20 ms: a segment closes after 5 silent frames, the utterance
+    # after 10; 3 speech frames make an utterance; a segment holds at most 20
+    return voice.UtteranceCutter(ScriptedVAD(), segment_pause_ms=100, end_pause_ms=200, min_speech_ms=60,
+                                 max_segment_ms=400)
+
+
+def run(cutter, *script):
+    """Feed ``(frame, count)`` pairs; events as ``(kind, frames or value, frame index)``."""
+    events = []
+    index = 0
+    for frame, count in script:
+        for _ in range(count):
+            for kind, value in cutter.feed(frame, now=float(index)):
+                events.append((kind, len(value) // voice.FRAME_BYTES if kind == "segment" else value, index))
+            index += 1
+    return events
+
+
+def test_cutter_closes_segments_at_short_pauses_and_the_utterance_at_a_long_one():
+    events = run(make_cutter(), (SILENCE, 2), (SPEECH, 10), (SILENCE, 5), (SPEECH, 6), (SILENCE, 10))
+    assert events == [
+        ("segment", 2 + 10 + 5, 16),  # with the pre-roll, closed at the 5th silent frame
+        ("segment", 6 + 5, 27),
+        ("end", 22.0, 32),            # the time of the last speech frame
+    ]
+
+
+def test_short_noise_is_discarded():
+    cutter = make_cutter()
+    assert [kind for kind, _, _ in run(cutter, (SPEECH, 2), (SILENCE, 10))] == ["segment", "discard"]
+    assert not cutter.in_utterance
+
+
+def test_long_speech_is_split_at_the_segment_limit():
+    events = run(make_cutter(), (SPEECH, 45), (SILENCE, 10))
+    assert [(kind, frames) for kind, frames, _ in events] == [
+        ("segment", 20), ("segment", 20), ("segment", 5 + 5), ("end", 44.0)]
+
+
+def test_session_joins_segment_texts_into_one_utterance(monkeypatch):
+    monkeypatch.setattr(voice, "record_voice_latency", lambda utterance: None)
+    calls = []
+
+    def submit(fn, pcm):
+        future = Future()
+        future.set_result(fn(pcm))
+        calls.append(len(pcm) // voice.FRAME_BYTES)
+        return future
+
+    monkeypatch.setattr(voice.jobs, "submit", submit)
+    session = voice.VoiceSession(voice.StubTranscriber(["I sell suits", "from home"]), cutter=make_cutter())
+    for frame, count in ((SPEECH, 10), (SILENCE, 5), (SPEECH, 6), (SILENCE, 10)):
+        session.feed(frame * count)
+    assert calls == [15, 11]  # each segment sent as soon as it closed
+    utterance = session.pop()
+    assert (utterance.text, utterance.segments) == ("I sell suits from home", 2)
+    assert session.pop() is None
+
+
+def test_session_waits_for_the_last_segment_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(voice, "record_voice_latency", lambda utterance: None)
+    futures = []
+
+    def submit(fn, pcm):
+        futures.append(Future())
+        return futures[-1]
+
+    monkeypatch.setattr(voice.jobs, "submit", submit)
+    session = voice.VoiceSession(voice.StubTranscriber(), cutter=make_cutter())
+    for frame, count in ((SPEECH, 10), (SILENCE, 5), (SPEECH, 6), (SILENCE, 10)):
+        session.feed(frame * count)
+    assert len(futures) == 2 and not session.ready()
+    futures[1].set_result("from home")  # the later segment finishes first
+    assert not session.ready()
+    futures[0].set_result("I sell suits")
+    assert session.pop().text == "I sell suits from home"
+
+
+def test_whole_utterance_mode_sends_one_request(monkeypatch):
+    monkeypatch.setattr(voice, "record_voice_latency", lambda utterance: None)
+    sent = []
+
+    def submit(fn, pcm):
+        sent.append(len(pcm) // voice.FRAME_BYTES)
+        future = Future()
+        future.set_result(fn(pcm))
+        return future
+
+    monkeypatch.setattr(voice.jobs, "submit", submit)
+    session = voice.VoiceSession(voice.StubTranscriber(["all of it"]), cutter=make_cutter(), incremental=False)
+    for frame, count in ((SPEECH, 10), (SILENCE, 5), (SPEECH, 6), (SILENCE, 10)):
+        session.feed(frame * count)
+    assert sent == [15 + 11]
+    assert session.pop().text == "all of it"
+
+
+class _Transcriptions:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return SimpleNamespace(text=" hello there ")
+
+
+class _Controller:
+    def __init__(self):
+        self.admitted = []
+        self.released = []
+
+    def admit(self, call_site=None, kwargs=None):
+        ticket = (call_site, admission.current_session(), admission.priority_for(call_site))
+        self.admitted.append(ticket)
+        return ticket
+
+    def release(self, ticket, usage=None):
+        self.released.append(ticket)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    started = []
+    start_call = telemetry.start_call
+
+    def record(call_site, model, session=""):
+        call = start_call(call_site, model, session)
+        started.append(call)
+        return call
+
+    monkeypatch.setattr(telemetry, "start_call", record)
+    return started
+
+
+def transcriber(controller, fail=False):
+    client = SimpleNamespace(audio=SimpleNamespace(transcriptions=_Transcriptions(fail)))
+    router = SimpleNamespace(providers=[SimpleNamespace(name="openai", client=client)], admission=controller)
+    return voice.make_transcriber(router, "openai"), client.audio.transcriptions
+
+
+def test_transcription_is_admitted_and_recorded(calls):
+    controller = _Controller()
+    stt, upstream = transcriber(controller)
+    with admission.session("learner-1"):
+        assert stt.transcribe(b"\0" * 3200) == "hello there"
+    assert controller.admitted == controller.released == [("voice_transcription", "learner-1", admission.HIGH)]
+    assert upstream.requests[0]["timeout"] == voice.profile_for("voice_transcription").timeout
+    assert [(c.call_site, c.session, c.provider, c._done) for c in calls] == [
+        ("voice_transcription", "learner-1", "openai", True)]
+
+
+def test_failed_transcription_releases_its_ticket(calls):
+    controller = _Controller()
+    stt, _ = transcriber(controller, fail=True)
+    with pytest.raises(ConnectionError):
+        stt.transcribe(b"\0" * 3200)
+    assert len(controller.released) == 1 and calls[0]._done
+
+
+def test_audio_thread_submits_under_the_creating_session(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(voice.jobs, "submit", lambda fn, pcm: submitted.append(admission.current_session()))
+    with admission.session("learner-2"):
+        session = voice.VoiceSession(voice.StubTranscriber())
+    session._handle("segment", b"\0" * voice.FRAME_BYTES)
+    assert submitted == ["learner-2"]
+
+
+@pytest.mark.skipif("ZARA_VOICE" in os.environ, reason="ZARA_VOICE is set")
+def test_off_by_default():
+    assert not voice.VOICE_ENABLED and not voice.voice_available()